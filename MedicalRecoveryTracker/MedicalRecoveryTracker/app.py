@@ -7,6 +7,11 @@ from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_login import LoginManager
 
+import instrumentation
+import page_cache
+import db_routing
+from db_routing import RoutingSession, engine_options, replica_binds
+
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -15,18 +20,18 @@ class Base(DeclarativeBase):
     pass
 
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 # create the app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET")
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)  # needed for url_for to generate with https
+instrumentation.init_app(app)  # per-request DB/template/model timings for /metrics
 
 # configure the database
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(app.config["SQLALCHEMY_DATABASE_URI"], "primary")
+# GET requests read from DATABASE_REPLICA_URL when it is set
+app.config["SQLALCHEMY_BINDS"] = replica_binds()
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Initialize login manager
@@ -34,15 +39,21 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+page_cache.init_app(app)  # {% cache %} template fragments
+db_routing.init_app(app)  # keep clients that just wrote on the primary
+
 # initialize the app with the extension
 db.init_app(app)
 
 with app.app_context():
     # Import models
     import models  # noqa: F401
+    from migrations import ensure_indexes, ensure_columns
     db.create_all()
+    ensure_columns(db.engine, db.metadata)
+    ensure_indexes(db.engine, db.metadata)
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from models import UserSnapshot
+    return UserSnapshot.load(int(user_id))
@@ -0,0 +1,265 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from werkzeug.datastructures import MultiDict
+
+from app import app
+from forms import AnonymousSymptomForm
+from gemini_client import MODEL_AVAILABLE, GENERATION_CONFIG, PLAN_SCHEMA, InvalidResponseError, gemini_client, validate
+from structured_output import Schema
+from ai_helper import ANONYMOUS_RECOVERY_PROMPT, anonymous_recovery_fallback, generate_anonymous_recovery
+from rate_limiter import RateLimitExceeded
+from resilience import CircuitOpenError
+from instrumentation import timed
+
+# Batch limits: records per request, records packed into one prompt, concurrent model calls per batch
+BATCH_MAX_RECORDS = int(os.environ.get("BATCH_MAX_RECORDS", 500))
+BATCH_PACK_SIZE = int(os.environ.get("BATCH_PACK_SIZE", 4))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", 4))
+
+# Partner API keys allowed to call the batch endpoint, comma separated; the endpoint is disabled when unset
+CLINIC_API_KEYS = {key.strip() for key in os.environ.get("CLINIC_API_KEYS", "").split(",") if key.strip()}
+
+# Output budget of a packed call grows with the number of records, up to the model's limit
+MAX_PACKED_OUTPUT_TOKENS = 8192
+
+ANONYMOUS_BATCH_PROMPT = """
+As a medical AI assistant, generate recovery suggestions for each of the following {count} patients.
+Each patient is independent: base each patient's suggestions only on that patient's information.
+
+{patients}
+
+Generate practical recovery suggestions without requiring medical supervision.
+
+Return the response in the following JSON format, with exactly one entry in "results" per patient, in the same order:
+{{
+    "results": [
+        {{
+            "patient": patient number,
+            "title": "Recovery Suggestions Title",
+            "description": "Overall description of the suggestions",
+            "recommendations": [
+                {{
+                    "title": "Recommendation Title",
+                    "description": "Detailed explanation",
+                    "type": "self-care, lifestyle, or home-remedy",
+                    "priority": priority level (1-3, where 1 is highest priority)
+                }}
+            ]
+        }}
+    ]
+}}
+
+Provide at least 4-5 recommendations per patient. Focus on evidence-based approaches that can be done safely at home.
+Do not suggest specific medications by name. Include clear warnings about when to seek professional medical help.
+
+Important: Format the response as valid JSON."""
+
+BATCH_SCHEMA = Schema({"results": list})
+
+
+def parse_record(raw):
+    """
+    Validate one batch record with the same rules as the anonymous symptom form.
+    Returns (record, error); record is a dict of cleaned fields.
+    """
+    if not isinstance(raw, dict):
+        return None, 'Each record must be a JSON object.'
+
+    formdata = MultiDict({key: '' if value is None else str(value)
+                          for key, value in raw.items()
+                          if key in ('symptom', 'severity', 'description', 'age', 'gender')})
+    form = AnonymousSymptomForm(formdata=formdata, meta={'csrf': False})
+
+    if not form.validate():
+        errors = '; '.join(f"{name}: {', '.join(messages)}" for name, messages in form.errors.items())
+        return None, errors
+
+    return {
+        'symptom': form.symptom.data.strip(),
+        'severity': form.severity.data,
+        'description': (form.description.data or '').strip(),
+        'age': form.age.data,
+        'gender': form.gender.data or None
+    }, None
+
+
+def prompt_fields(record):
+    """
+    Template fields of ANONYMOUS_RECOVERY_PROMPT for a record, as generate_anonymous_recovery fills them
+    """
+    return {
+        'symptom': record['symptom'],
+        'severity': record['severity'],
+        'description': record['description'] or 'Not provided',
+        'age': record['age'] or 'Not provided',
+        'gender': record['gender'] or 'Not provided'
+    }
+
+
+def dedupe_key(record):
+    return (record['symptom'].casefold(), record['severity'], ' '.join(record['description'].split()).casefold(),
+            record['age'], record['gender'])
+
+
+def describe_patients(records):
+    return '\n\n'.join(
+        f"Patient {number}:\n"
+        f"Symptom: {fields['symptom']}\n"
+        f"Severity (1-10): {fields['severity']}\n"
+        f"Description: {fields['description']}\n"
+        f"Age: {fields['age']}\n"
+        f"Gender: {fields['gender']}"
+        for number, fields in enumerate(map(prompt_fields, records), start=1)
+    )
+
+
+def generate_anonymous_batch(raw_records, client_id=None):
+    """
+    Generate anonymous recovery suggestions for a list of records, yielding one
+    result dict per record (in completion order) followed by a summary.
+
+    Identical records are generated once. Records missing from the response cache
+    are packed BATCH_PACK_SIZE to a prompt; packs run BATCH_CONCURRENCY at a time,
+    and records a packed response does not cover are retried one by one.
+    """
+    summary = {'records': len(raw_records), 'unique': 0, 'succeeded': 0, 'failed': 0, 'model_calls': 0}
+    groups = {}  # dedupe key -> (record, indices of identical records)
+
+    def outcome(index, **fields):
+        raw = raw_records[index]
+        line = {'index': index, 'id': raw.get('id') if isinstance(raw, dict) else None}
+        line.update(fields)
+        summary['succeeded' if fields['status'] == 'ok' else 'failed'] += 1
+        return line
+
+    def emit(key, result=None, source=None, error=None, retry_after=None):
+        for position, index in enumerate(groups[key][1]):
+            if error is None:
+                yield outcome(index, status='ok', source=source, deduplicated=position > 0, result=result)
+            else:
+                yield outcome(index, status='error', error=error, retry_after=retry_after)
+
+    for index, raw in enumerate(raw_records):
+        record, error = parse_record(raw)
+        if error:
+            yield outcome(index, status='error', error=error)
+            continue
+        groups.setdefault(dedupe_key(record), (record, []))[1].append(index)
+
+    summary['unique'] = len(groups)
+
+    # Serve whatever is already cached before spending model calls
+    pending = []
+    for key, (record, _) in groups.items():
+        if not MODEL_AVAILABLE:
+            yield from emit(key, anonymous_recovery_fallback(record['symptom']), source='fallback')
+            continue
+
+        cached = gemini_client.cached(ANONYMOUS_RECOVERY_PROMPT, **prompt_fields(record))
+        if cached is not None:
+            yield from emit(key, cached, source='cache')
+        else:
+            pending.append(key)
+
+    if not pending:
+        yield {'summary': summary}
+        return
+
+    pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix="batch-generation")
+    try:
+        size = max(1, BATCH_PACK_SIZE)
+        futures = set()
+        for start in range(0, len(pending), size):
+            pack = [(key, groups[key][0]) for key in pending[start:start + size]]
+            futures.add(pool.submit(_generate_pack if len(pack) > 1 else _generate_single, pack, client_id))
+
+        while futures:
+            # Calls run on the pool, so the request's model time is the time spent waiting here
+            with timed("llm"):
+                done, futures = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                calls, outcomes, leftovers = future.result()
+                summary['model_calls'] += calls
+
+                for key, fields in outcomes:
+                    yield from emit(key, **fields)
+
+                # Fan out records the packed response did not cover
+                for item in leftovers:
+                    futures.add(pool.submit(_generate_single, [item], client_id))
+    finally:
+        # Stop queued work if the client disconnects; running calls finish in the background
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    yield {'summary': summary}
+
+
+def _generate_pack(pack, client_id):
+    """
+    Generate suggestions for several records with one prompt.
+    Returns (model calls, [(key, outcome)], leftover (key, record) items to retry individually).
+    """
+    records = [record for _, record in pack]
+    max_output_tokens = min(MAX_PACKED_OUTPUT_TOKENS, GENERATION_CONFIG["max_output_tokens"] * len(pack))
+
+    with app.app_context():
+        try:
+            response = gemini_client.generate_structured(
+                ANONYMOUS_BATCH_PROMPT,
+                schema=BATCH_SCHEMA,
+                rate_key=client_id,
+                generation_config={"max_output_tokens": max_output_tokens},
+                count=len(pack),
+                patients=describe_patients(records))
+        except CircuitOpenError:
+            logging.warning("Gemini circuit breaker is open, returning fallback recovery suggestions")
+            return 0, [(key, {'result': anonymous_recovery_fallback(record['symptom']), 'source': 'fallback'})
+                       for key, record in pack], []
+        except RateLimitExceeded as e:
+            return 0, [(key, {'error': str(e), 'retry_after': e.retry_after}) for key, _ in pack], []
+        except Exception as e:
+            logging.error(f"Packed generation of {len(pack)} records failed, retrying individually: {str(e)}")
+            return 1, [], pack
+
+        results = response['results']
+        by_number = {item.get('patient'): item for item in results if isinstance(item, dict)}
+
+        outcomes, leftovers = [], []
+        for number, (key, record) in enumerate(pack, start=1):
+            # Prefer the patient number the model echoed back, then the position
+            item = by_number.get(number)
+            if item is None and len(results) == len(pack) and isinstance(results[number - 1], dict):
+                item = results[number - 1]
+
+            try:
+                if item is None:
+                    raise InvalidResponseError(f"No result for patient {number}")
+                result = {k: v for k, v in item.items() if k != 'patient'}
+                validate(result, PLAN_SCHEMA)
+            except InvalidResponseError:
+                leftovers.append((key, record))
+                continue
+
+            # Later single requests for the same input hit the cache
+            gemini_client.store(ANONYMOUS_RECOVERY_PROMPT, result, **prompt_fields(record))
+            outcomes.append((key, {'result': result, 'source': 'packed'}))
+
+        return 1, outcomes, leftovers
+
+
+def _generate_single(pack, client_id):
+    """
+    Generate suggestions for one record through the regular anonymous path
+    """
+    (key, record), = pack
+
+    with app.app_context():
+        try:
+            result = generate_anonymous_recovery(client_id=client_id, **record)
+            return 1, [(key, {'result': result, 'source': 'single'})], []
+        except RateLimitExceeded as e:
+            return 0, [(key, {'error': str(e), 'retry_after': e.retry_after})], []
+        except Exception as e:
+            return 1, [(key, {'error': str(e)})], []
@@ -0,0 +1,10 @@
+"""
+Reproducible benchmarks for the route and AI parsing hot paths.
+
+    python -m benchmarks run --output results.json [--sizes 10,1000,100000] [--database-url URL]
+    python -m benchmarks compare baseline.json results.json [--threshold 0.10]
+
+Run from the application directory. Each size is a synthetic user with that
+many journal entries, seeded from a fixed random seed into a temporary SQLite
+database unless --database-url points at another (e.g. PostgreSQL) database.
+"""
@@ -0,0 +1,154 @@
+import os
+import sys
+import json
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Seed the database and time the benchmarks')
+    run.add_argument('--output', '-o', required=True, help='Where to write the JSON results')
+    run.add_argument('--sizes', default='10,1000,100000', help='Comma-separated journal entry counts')
+    run.add_argument('--database-url', help='Database to seed (default: temporary SQLite file)')
+    run.add_argument('--seed', type=int, default=0, help='Seed for the synthetic data')
+    run.add_argument('--min-time', type=float, default=1.0, help='Minimum seconds spent on each benchmark')
+    run.add_argument('--min-repeats', type=int, default=5, help='Minimum timed repetitions of each benchmark')
+
+    compare = commands.add_parser('compare', help='Flag regressions between two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--threshold', type=float, default=0.10, help='Relative median slowdown treated as a regression')
+    compare.add_argument('--noise-floor', type=float, default=0.05, help='Absolute differences (ms) always ignored')
+
+    concurrency = commands.add_parser('concurrency', help='Compare concurrent throughput of the gunicorn worker classes')
+    concurrency.add_argument('--modes', default='sync,gthread,gevent', help='Comma-separated worker classes')
+    concurrency.add_argument('--requests', type=int, default=200, help='Model-bound requests per mode')
+    concurrency.add_argument('--concurrency', type=int, default=100, help='Requests in flight at once')
+    concurrency.add_argument('--latency-ms', type=int, default=200, help='Fixed latency of the fake model')
+    concurrency.add_argument('--workers', type=int, default=1, help='Gunicorn worker processes')
+    concurrency.add_argument('--output', '-o', help='Where to write the JSON results')
+
+    return parser.parse_args()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    # The app reads its configuration at import time
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'benchmarks.db')
+    os.environ.setdefault('SESSION_SECRET', 'benchmarks')
+    os.environ.setdefault('OPENAI_API_KEY', 'unused-by-benchmarks')
+
+    import main  # noqa: F401
+    from app import app, db
+    from benchmarks.suite import Timer, parsing_benchmarks, size_benchmarks
+
+    app.config['WTF_CSRF_ENABLED'] = False
+    timer = Timer(min_time=args.min_time, min_repeats=args.min_repeats)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    results = {}
+    for name, result in parsing_benchmarks(timer).items():
+        results[name] = result
+        print(f"{name:<45} {result['median_ms']:>10.3f} ms")
+
+    for size in sizes:
+        for name, result in size_benchmarks(timer, size, args.seed).items():
+            key = f"{name}@{size}"
+            results[key] = result
+            print(f"{key:<45} {result['median_ms']:>10.3f} ms")
+
+    with app.app_context():
+        dialect = db.engine.dialect.name
+
+    output = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': dialect,
+            'sizes': sizes,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(output, f, indent=2)
+
+    print(f"\nWrote {len(results)} results to {args.output}")
+    return 0
+
+
+def compare(args):
+    from benchmarks.compare import compare as compare_results, print_comparison
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    if baseline['meta'].get('database') != current['meta'].get('database'):
+        print(f"Warning: comparing {baseline['meta'].get('database')} results with {current['meta'].get('database')} results")
+
+    rows = compare_results(baseline, current, args.threshold, args.noise_floor)
+    print_comparison(rows)
+
+    regressions = [row for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+def concurrency(args):
+    from benchmarks.concurrency import measure_mode, mode_available
+
+    results = {}
+    for mode in [mode.strip() for mode in args.modes.split(',') if mode.strip()]:
+        if not mode_available(mode):
+            print(f"{mode:<10} skipped (install the gevent extra)")
+            continue
+        result = results[mode] = measure_mode(mode, args.requests, args.concurrency, args.latency_ms, args.workers)
+        if 'error' in result:
+            print(f"{mode:<10} failed: {result['error']}")
+            continue
+        print(f"{mode:<10} {result['rps']:>8.1f} req/s  p50 {result['p50_ms']:>8.0f} ms  "
+              f"p95 {result['p95_ms']:>8.0f} ms  errors {result['errors']}")
+
+    if args.output:
+        output = {
+            'meta': {
+                'created_at': datetime.now().isoformat(timespec='seconds'),
+                'git_revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'requests': args.requests,
+                'concurrency': args.concurrency,
+                'latency_ms': args.latency_ms,
+                'workers': args.workers,
+            },
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+    return 1 if any('error' in result for result in results.values()) else 0
+
+
+COMMANDS = {'run': run, 'compare': compare, 'concurrency': concurrency}
+
+if __name__ == '__main__':
+    arguments = parse_args()
+    sys.exit(COMMANDS[arguments.command](arguments))
@@ -0,0 +1,45 @@
+def compare(baseline, current, threshold=0.10, noise_floor_ms=0.05):
+    """
+    Compare the median timings of two result files.
+    Returns rows of (name, baseline ms, current ms, change, status) where status is
+    'regression', 'improvement', 'ok', 'new' or 'removed'.
+    """
+    rows = []
+    old_results = baseline['results']
+    new_results = current['results']
+
+    for name in sorted(set(old_results) | set(new_results)):
+        old = old_results.get(name)
+        new = new_results.get(name)
+        if old is None:
+            rows.append((name, None, new['median_ms'], None, 'new'))
+            continue
+        if new is None:
+            rows.append((name, old['median_ms'], None, None, 'removed'))
+            continue
+
+        old_ms, new_ms = old['median_ms'], new['median_ms']
+        change = (new_ms - old_ms) / old_ms if old_ms else 0.0
+
+        status = 'ok'
+        # Differences below the noise floor are timer jitter, whatever the ratio
+        if abs(new_ms - old_ms) >= noise_floor_ms:
+            if change > threshold:
+                status = 'regression'
+            elif change < -threshold:
+                status = 'improvement'
+
+        rows.append((name, old_ms, new_ms, change, status))
+
+    return rows
+
+
+def print_comparison(rows):
+    width = max([len(row[0]) for row in rows] + [9])
+    print(f"{'benchmark':<{width}} {'baseline':>11} {'current':>11} {'change':>8}  status")
+    for name, old_ms, new_ms, change, status in rows:
+        old_text = f"{old_ms:.3f}ms" if old_ms is not None else '-'
+        new_text = f"{new_ms:.3f}ms" if new_ms is not None else '-'
+        change_text = f"{change:+.1%}" if change is not None else '-'
+        marker = '  <-- REGRESSION' if status == 'regression' else ''
+        print(f"{name:<{width}} {old_text:>11} {new_text:>11} {change_text:>8}  {status}{marker}")
@@ -0,0 +1,153 @@
+"""
+Concurrent throughput of a model-bound route under each gunicorn worker class.
+
+For every mode a gunicorn server is started on the fake model with a fixed
+latency, and `concurrency` clients keep posting single-record anonymous batches
+(each with a distinct symptom, so none is served from the response cache) until
+`requests` have completed. With a fixed model latency, throughput is bounded by
+how many model waits one worker process can hold at once.
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+import http.client
+from concurrent.futures import ThreadPoolExecutor
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_KEY = 'benchmarks'
+
+# Worker class settings per mode, read by gunicorn.conf.py
+MODES = {
+    'sync': {'GUNICORN_WORKER_CLASS': 'sync'},
+    'gthread': {'GUNICORN_WORKER_CLASS': 'gthread', 'GUNICORN_THREADS': '8'},
+    'gevent': {'GUNICORN_WORKER_CLASS': 'gevent', 'GUNICORN_WORKER_CONNECTIONS': '1000'},
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def mode_available(mode):
+    if mode != 'gevent':
+        return True
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode, port, workers, latency_ms, concurrency):
+    directory = tempfile.mkdtemp(prefix=f'benchmarks-{mode}-')
+    env = dict(os.environ, **MODES[mode])
+    env.update({
+        'DATABASE_URL': 'sqlite:///' + os.path.join(directory, 'app.db'),
+        'AI_RATE_LIMIT_DB': os.path.join(directory, 'rate_limits.db'),
+        'SESSION_SECRET': 'benchmarks',
+        'OPENAI_API_KEY': 'unused-by-benchmarks',
+        'AI_BACKEND': 'fake',
+        'FAKE_LLM_LATENCY': f'fixed:{latency_ms}',
+        'CLINIC_API_KEYS': API_KEY,
+        # Measure the server, not the model quota
+        'AI_RPM': '1000000',
+        'AI_USER_RPM': '1000000',
+        'AI_TPM': '1000000000',
+        'AI_MAX_CONCURRENT': str(concurrency),
+        'AI_MAX_WAITERS': str(concurrency),
+    })
+    command = [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+               '--bind', f'127.0.0.1:{port}', '--workers', str(workers), '--log-level', 'warning', 'main:app']
+    log_path = os.path.join(directory, 'gunicorn.log')
+    with open(log_path, 'wb') as log:
+        server = subprocess.Popen(command, cwd=APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=log)
+
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn ({mode}) exited with status {server.returncode}: {last_error(log_path)}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            connection.request('GET', '/')
+            connection.getresponse().read()
+            connection.close()
+            return server
+        except OSError:
+            time.sleep(0.2)
+
+    server.terminate()
+    server.wait(timeout=30)
+    raise RuntimeError(f"gunicorn ({mode}) did not start within 60 seconds: {last_error(log_path)}")
+
+
+def last_error(log_path):
+    """
+    The last exception gunicorn wrote to stderr, else its last line of output
+    """
+    with open(log_path, errors='replace') as f:
+        lines = [line.strip() for line in f if line.strip()]
+    errors = [line for line in lines if re.match(r'^[\w.]+(Error|Exception): ', line)]
+    if errors:
+        return errors[-1]
+    return lines[-1] if lines else 'no output'
+
+
+def post_record(port, number):
+    body = json.dumps([{'symptom': f'Benchmark symptom {number}', 'severity': 5}])
+    start = time.perf_counter()
+    try:
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        connection.request('POST', '/api/anonymous-symptom/batch', body,
+                           {'Content-Type': 'application/json', 'X-API-Key': API_KEY})
+        response = connection.getresponse()
+        lines = [json.loads(line) for line in response.read().splitlines() if line.strip()]
+        connection.close()
+        ok = response.status == 200 and any(line.get('status') == 'ok' for line in lines)
+    except (OSError, ValueError):
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+def measure_mode(mode, requests=200, concurrency=100, latency_ms=200, workers=1):
+    """
+    Throughput and latency of `requests` model-bound calls sent `concurrency` at a time,
+    or the reason the server could not be started
+    """
+    port = free_port()
+    try:
+        server = start_server(mode, port, workers, latency_ms, concurrency)
+    except RuntimeError as e:
+        return {'requests': requests, 'error': str(e)}
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            outcomes = list(pool.map(lambda number: post_record(port, number), range(requests)))
+        elapsed = time.perf_counter() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    latencies = sorted(latency for latency, _ in outcomes)
+    return {
+        'requests': requests,
+        'errors': sum(1 for _, ok in outcomes if not ok),
+        'elapsed_s': elapsed,
+        'rps': requests / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+    }
@@ -0,0 +1,70 @@
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from app import db
+from models import User, MedicalJournal, AthleticActivity, FoodAllergy, RecoveryPlan
+
+SYMPTOMS = ['Headache', 'Back pain', 'Fatigue', 'Knee pain', 'Nausea', 'Insomnia', 'Sore throat', 'Dizziness']
+PLAN_TYPES = ['general', 'nutrition', 'sports']
+PASSWORD = 'benchmark-password'
+
+# Rows per INSERT statement when seeding journal entries
+CHUNK_SIZE = 5000
+
+
+def email_for(size):
+    return f"bench-{size}@example.com"
+
+
+def seed_user(size, seed=0):
+    """
+    Create (or reuse) a user with `size` journal entries spread over the past two years,
+    plus activities, allergies and plans. The same size and seed always produce the same data.
+    """
+    user = User.query.filter_by(email=email_for(size)).first()
+    if user is not None:
+        return user
+
+    rng = random.Random(f"{seed}:{size}")
+    today = date.today()
+
+    user = User(email=email_for(size), first_name='Bench', last_name=str(size), age=40, gender='other',
+                weight=72.5, height=178)
+    user.set_password(PASSWORD)
+    db.session.add(user)
+    db.session.flush()
+
+    rows = []
+    for _ in range(size):
+        rows.append({
+            'user_id': user.id,
+            'symptom': rng.choice(SYMPTOMS),
+            'description': 'Synthetic benchmark entry ' * rng.randint(0, 6),
+            'severity': rng.randint(1, 10),
+            'date_experienced': today - timedelta(days=rng.randint(0, 730)),
+            'created_at': datetime.utcnow(),
+        })
+        if len(rows) == CHUNK_SIZE:
+            db.session.execute(insert(MedicalJournal), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(MedicalJournal), rows)
+
+    db.session.add(AthleticActivity(user_id=user.id, name='Running', frequency='3 times a week', intensity='moderate'))
+    db.session.add(FoodAllergy(user_id=user.id, food_item='Peanuts', severity='mild'))
+
+    # A plan per 100 entries, at least a few and at most 50
+    RecoveryPlan.insert_many([{
+        'user_id': user.id,
+        'title': f'Plan {number}',
+        'description': 'Synthetic benchmark plan ' * 5,
+        'plan_type': PLAN_TYPES[number % len(PLAN_TYPES)],
+        'created_at': datetime.utcnow() - timedelta(hours=number),
+        'recommendations': [{'title': f'Step {priority}', 'description': 'Synthetic recommendation ' * 4,
+                             'type': 'lifestyle', 'priority': priority % 3 + 1} for priority in range(5)]
+    } for number in range(min(50, max(3, size // 100)))])
+
+    db.session.commit()
+    return user
@@ -0,0 +1,154 @@
+import json
+import time
+import random
+import statistics
+
+from sqlalchemy.orm import selectinload
+
+from app import app, db
+from models import User, MedicalJournal, RecoveryPlan
+from gemini_client import extract_json, validate, PLAN_SCHEMA
+from stream_parser import RecommendationStreamParser
+from journal_stats import chart_cache
+from report_builder import report_payload
+from benchmarks.seed import seed_user, email_for, PASSWORD
+
+
+class Timer:
+    """
+    Runs a callable repeatedly until both min_repeats and min_time are reached
+    """
+
+    def __init__(self, min_time=1.0, min_repeats=5, max_repeats=1000, warmup=1):
+        self.min_time = min_time
+        self.min_repeats = min_repeats
+        self.max_repeats = max_repeats
+        self.warmup = warmup
+
+    def measure(self, func):
+        for _ in range(self.warmup):
+            func()
+
+        samples = []
+        started = time.perf_counter()
+        while len(samples) < self.max_repeats and (
+                len(samples) < self.min_repeats or time.perf_counter() - started < self.min_time):
+            start = time.perf_counter()
+            func()
+            samples.append(time.perf_counter() - start)
+
+        samples.sort()
+        return {
+            'repeats': len(samples),
+            'min_ms': samples[0] * 1000,
+            'median_ms': statistics.median(samples) * 1000,
+            'mean_ms': statistics.fmean(samples) * 1000,
+            'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+            'stdev_ms': (statistics.stdev(samples) if len(samples) > 1 else 0.0) * 1000,
+        }
+
+
+def sample_response(seed=0, recommendations=6, fenced=True):
+    """
+    A model response shaped like the plan prompts ask for
+    """
+    rng = random.Random(seed)
+    document = {
+        'title': 'Recovery Plan for Knee Pain',
+        'description': 'Suggestions to reduce pain and restore mobility. ' * 3,
+        'recommendations': [{
+            'title': f'Recommendation {i}',
+            'description': 'Detailed explanation of what to do and why it helps. ' * rng.randint(2, 6),
+            'type': rng.choice(['lifestyle', 'therapy', 'self-care']),
+            'priority': rng.randint(1, 3)
+        } for i in range(recommendations)]
+    }
+    text = json.dumps(document, indent=2)
+    return f"```json\n{text}\n```" if fenced else text
+
+
+def parsing_benchmarks(timer):
+    """
+    Benchmarks that do not touch the database
+    """
+    fenced = sample_response()
+    plain = sample_response(fenced=False)
+    chunks = [plain[i:i + 64] for i in range(0, len(plain), 64)]
+
+    def parse_stream():
+        parser = RecommendationStreamParser()
+        for chunk in chunks:
+            for _ in parser.feed(chunk):
+                pass
+
+    return {
+        'extract_json[fenced]': timer.measure(lambda: validate(extract_json(fenced), PLAN_SCHEMA)),
+        'extract_json[plain]': timer.measure(lambda: validate(extract_json(plain), PLAN_SCHEMA)),
+        'stream_parser[64-char chunks]': timer.measure(parse_stream),
+    }
+
+
+def size_benchmarks(timer, size, seed=0):
+    """
+    Route and serialization benchmarks for a user with `size` journal entries
+    """
+    with app.app_context():
+        user = seed_user(size, seed)
+        user_id = user.id
+
+    client = app.test_client()
+    response = client.post('/login', data={'email': email_for(size), 'password': PASSWORD})
+    assert response.status_code == 302, f"Benchmark login failed with {response.status_code}"
+
+    def get(path, clear_chart_cache=False):
+        def request():
+            if clear_chart_cache:
+                chart_cache.clear()
+            response = client.get(path)
+            assert response.status_code == 200, f"{path} returned {response.status_code}"
+        return request
+
+    results = {
+        'journal_data[daily,cold]': timer.measure(get('/journal/data', clear_chart_cache=True)),
+        'journal_data[weekly,cold]': timer.measure(get('/journal/data?resolution=weekly', clear_chart_cache=True)),
+        'journal_data[daily,cached]': timer.measure(get('/journal/data')),
+        'dashboard': timer.measure(get('/dashboard')),
+        'reports': timer.measure(get('/reports')),
+    }
+
+    with app.app_context():
+        # Report payloads cover at most the 1000 most recent entries, as a user would select
+        journal_ids = db.session.execute(
+            db.select(MedicalJournal.id).where(MedicalJournal.user_id == user_id)
+            .order_by(MedicalJournal.date_experienced.desc()).limit(1000)).scalars().all()
+        plan_ids = db.session.execute(
+            db.select(RecoveryPlan.id).where(RecoveryPlan.user_id == user_id)).scalars().all()
+
+        def build_payload():
+            # What building /reports/<id>.json costs (it replaced get_report_data)
+            db.session.expunge_all()
+            user = db.session.get(User, user_id)
+            journals = MedicalJournal.query.filter(MedicalJournal.id.in_(journal_ids)).order_by(
+                MedicalJournal.date_experienced.desc(), MedicalJournal.id.desc())
+            plans = RecoveryPlan.query.options(selectinload(RecoveryPlan.recommendations)).filter(
+                RecoveryPlan.id.in_(plan_ids)).all()
+            report = _PayloadReport(title='Benchmark report', generated_date='2024-01-01')
+            return report_payload(report, user, journals, plans)
+
+        results['report_payload'] = timer.measure(build_payload)
+
+        entries = MedicalJournal.query.filter_by(user_id=user_id).limit(1000).all()
+        results['MedicalJournal.serialize'] = timer.measure(lambda: [entry.serialize() for entry in entries])
+        results['MedicalJournal.serialize']['items'] = len(entries)
+
+    return results
+
+
+class _PayloadReport:
+    """
+    Stand-in for a Report row; report_payload only reads the title and date
+    """
+
+    def __init__(self, title, generated_date):
+        self.title = title
+        self.generated_date = generated_date
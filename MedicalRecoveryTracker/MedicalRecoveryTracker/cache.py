@@ -0,0 +1,252 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, update, func
+
+
+def make_key(prompt, model_name, generation_config):
+    """
+    Build a content-addressed cache key from the normalized prompt, model name
+    and generation config
+    """
+    # Collapse indentation and whitespace differences so equivalent prompts share a key
+    normalized_prompt = re.sub(r'\s+', ' ', prompt).strip().casefold()
+    payload = json.dumps({
+        'prompt': normalized_prompt,
+        'model': model_name,
+        'config': generation_config or {}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class MemoryBackend:
+    """
+    In-process LRU cache with per-entry expiry
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+
+            # Mark as most recently used
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+
+            # Evict least recently used entries
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class DatabaseBackend:
+    """
+    Cache stored in the ai_response_cache table so that all gunicorn workers
+    share the same entries. Works with both SQLite and PostgreSQL.
+    """
+
+    # Only check the table size every N writes to keep inserts cheap
+    PRUNE_INTERVAL = 100
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._writes = 0
+
+    @property
+    def _table(self):
+        from models import AIResponseCache
+        return AIResponseCache.__table__
+
+    @property
+    def _engine(self):
+        from app import db
+        return db.engine
+
+    def get(self, key):
+        table = self._table
+        now = datetime.utcnow()
+
+        # Use a dedicated connection so cache traffic never joins the request's transaction
+        with self._engine.begin() as conn:
+            row = conn.execute(
+                select(table.c.value, table.c.expires_at).where(table.c.key == key)
+            ).first()
+            if row is None:
+                return None
+
+            if row.expires_at is not None and row.expires_at < now:
+                conn.execute(delete(table).where(table.c.key == key))
+                return None
+
+            # Track access time for LRU eviction
+            conn.execute(
+                update(table).where(table.c.key == key).values(
+                    last_accessed_at=now, hits=table.c.hits + 1)
+            )
+
+        return json.loads(row.value)
+
+    def set(self, key, value, ttl=None):
+        table = self._table
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=ttl) if ttl else None
+
+        with self._engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key == key))
+            conn.execute(table.insert().values(
+                key=key,
+                value=json.dumps(value),
+                created_at=now,
+                expires_at=expires_at,
+                last_accessed_at=now,
+                hits=0
+            ))
+
+        self._writes += 1
+        if self._writes % self.PRUNE_INTERVAL == 0:
+            self.prune()
+
+    def delete(self, key):
+        table = self._table
+        with self._engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.key == key))
+
+    def clear(self):
+        with self._engine.begin() as conn:
+            conn.execute(delete(self._table))
+
+    def prune(self):
+        """
+        Remove expired entries and evict the least recently used ones beyond max_entries
+        """
+        table = self._table
+        with self._engine.begin() as conn:
+            conn.execute(delete(table).where(table.c.expires_at < datetime.utcnow()))
+
+            total = conn.execute(select(func.count()).select_from(table)).scalar()
+            overflow = total - self.max_entries
+            if overflow > 0:
+                oldest = select(table.c.key).order_by(
+                    table.c.last_accessed_at.asc()).limit(overflow)
+                conn.execute(delete(table).where(table.c.key.in_(oldest)))
+
+
+class ResponseCache:
+    """
+    Cache for parsed AI responses with hit/miss counters. Backend failures are
+    logged and treated as misses so the cache can never break generation.
+    """
+
+    def __init__(self, backend, ttl=3600):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, prompt, model_name, generation_config):
+        key = make_key(prompt, model_name, generation_config)
+        try:
+            value = self.backend.get(key)
+        except Exception as e:
+            logging.error(f"Response cache lookup failed: {str(e)}")
+            value = None
+
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        return value
+
+    def set(self, prompt, model_name, generation_config, value):
+        key = make_key(prompt, model_name, generation_config)
+        try:
+            self.backend.set(key, value, self.ttl)
+        except Exception as e:
+            logging.error(f"Response cache write failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'backend': type(self.backend).__name__,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class NullBackend:
+    """
+    Backend that stores nothing, used when caching is disabled
+    """
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+def create_response_cache():
+    """
+    Build the response cache from environment settings:
+    AI_CACHE_BACKEND (memory, database or none), AI_CACHE_TTL and AI_CACHE_MAX_ENTRIES
+    """
+    backend_name = os.environ.get("AI_CACHE_BACKEND", "memory").lower()
+    ttl = int(os.environ.get("AI_CACHE_TTL", 3600))
+    max_entries = int(os.environ.get("AI_CACHE_MAX_ENTRIES", 1024))
+
+    if backend_name == "database":
+        backend = DatabaseBackend(max_entries=max_entries)
+    elif backend_name == "none":
+        backend = NullBackend()
+    else:
+        backend = MemoryBackend(max_entries=max_entries)
+
+    return ResponseCache(backend, ttl=ttl)
+
+
+response_cache = create_response_cache()
@@ -0,0 +1,129 @@
+"""
+Read/write splitting and connection pool settings.
+
+With DATABASE_REPLICA_URL set, SELECTs issued while handling a GET or HEAD request
+go to the "replica" bind; writes, flushes, background jobs and every other method
+use the primary. A request that writes reads from the primary for the rest of the
+request, and a client that just sent a mutation keeps reading from the primary for
+DATABASE_REPLICA_STICKY seconds so it does not see replication lag on the redirect.
+"""
+import os
+import time
+
+from flask import g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Select
+
+from instrumentation import Histogram, METRICS
+
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+DATABASE_REPLICA_STICKY = float(os.environ.get("DATABASE_REPLICA_STICKY", 10))
+
+REPLICA_BIND = "replica"
+READ_METHODS = ("GET", "HEAD")
+
+# Per-process pool defaults as (pool_size, max_overflow, pool_timeout) for each gunicorn
+# worker class: sync workers serve one request at a time next to the background job pool,
+# gthread workers one per thread, gevent workers share the pool between many greenlets
+POOL_DEFAULTS = {
+    "sync": (5, 5, 30),
+    "gthread": (10, 10, 30),
+    "gevent": (20, 30, 10),
+}
+DB_WORKER_MODEL = os.environ.get("DB_WORKER_MODEL", "sync")
+_pool_size, _max_overflow, _pool_timeout = POOL_DEFAULTS.get(DB_WORKER_MODEL, POOL_DEFAULTS["sync"])
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", _pool_size))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", _max_overflow))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", _pool_timeout))
+
+pool_wait = Histogram("meditrack_db_pool_wait_seconds",
+                      "Time spent waiting for a pooled connection, including opening new ones", ("bind",))
+METRICS.append(pool_wait)
+
+
+class TimedQueuePool(QueuePool):
+    """
+    QueuePool that records how long each checkout waited
+    """
+
+    # Log as a stock QueuePool, under the "sqlalchemy" logger that SQLAlchemy keeps at WARN
+    _sqla_logger_namespace = "sqlalchemy.pool.impl.QueuePool"
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            pool_wait.observe((self.logging_name or "primary",), time.perf_counter() - start)
+
+
+def engine_options(url, name):
+    """
+    Engine options for the bind called `name`. In-memory SQLite keeps its single shared connection.
+    """
+    options = {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+    }
+    if url is None:
+        return options
+
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return options
+
+    options.update({
+        "poolclass": TimedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_logging_name": name,
+    })
+    return options
+
+
+def replica_binds():
+    """
+    SQLALCHEMY_BINDS entry for the read replica, empty when none is configured
+    """
+    if not DATABASE_REPLICA_URL:
+        return {}
+    return {REPLICA_BIND: {"url": DATABASE_REPLICA_URL, **engine_options(DATABASE_REPLICA_URL, REPLICA_BIND)}}
+
+
+def reads_from_replica():
+    """
+    Whether SELECTs on the current thread may go to the replica
+    """
+    if not has_request_context() or request.method not in READ_METHODS:
+        return False
+    if g.get("use_primary"):
+        return False
+    return session.get("_primary_until", 0) < time.time()
+
+
+class RoutingSession(Session):
+    """
+    Session sending read-only statements of read requests to the replica bind
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and REPLICA_BIND in self._db.engines and has_request_context():
+            if not self._flushing and isinstance(clause, Select) and reads_from_replica():
+                return self._db.engines[REPLICA_BIND]
+            if not isinstance(clause, Select):
+                # Read this request's own writes from the primary
+                g.use_primary = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _stick_to_primary(response):
+    if DATABASE_REPLICA_URL and request.method not in READ_METHODS:
+        session["_primary_until"] = time.time() + DATABASE_REPLICA_STICKY
+    return response
+
+
+def init_app(app):
+    app.after_request(_stick_to_primary)
@@ -0,0 +1,57 @@
+import threading
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+
+class QueryLog:
+    """
+    SQL statements executed while a capture_queries() block was active
+    """
+
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def __iter__(self):
+        return iter(self.statements)
+
+    def __len__(self):
+        return len(self.statements)
+
+
+@contextmanager
+def capture_queries(engine, all_threads=False):
+    """
+    Record (statement, parameters) for every query run on the engine inside the block.
+    Only queries from the calling thread are recorded unless all_threads is set.
+    """
+    log = QueryLog()
+    thread_id = threading.get_ident()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if all_threads or threading.get_ident() == thread_id:
+            log.statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield log
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@contextmanager
+def assert_max_queries(engine, limit):
+    """
+    Fail with AssertionError if the block runs more than `limit` queries on the engine.
+    Used to guard eager-loading paths against N+1 regressions.
+    """
+    with capture_queries(engine) as log:
+        yield log
+
+    if log.count > limit:
+        statements = "\n".join(statement for statement, _ in log.statements)
+        raise AssertionError(f"Expected at most {limit} queries, {log.count} were executed:\n{statements}")
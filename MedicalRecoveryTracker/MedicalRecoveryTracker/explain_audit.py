@@ -0,0 +1,213 @@
+"""
+Query plan audit for the per-user access patterns in routes.py.
+
+Seeds a database with synthetic users, drives every read route through the
+test client while recording the SQL it issues, then runs EXPLAIN on each
+distinct SELECT and fails if any of them falls back to a sequential scan.
+
+Usage:
+    python explain_audit.py [--database-url URL] [--users N] [--entries N]
+
+Without --database-url a temporary SQLite file is used. With PostgreSQL the
+planner runs with enable_seqscan off, so a sequential scan in the plan means
+no index can serve the query at all.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, datetime, timedelta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Database to seed and audit (default: temporary SQLite file)')
+    parser.add_argument('--users', type=int, default=20, help='Number of synthetic users')
+    parser.add_argument('--entries', type=int, default=500, help='Journal entries per user')
+    parser.add_argument('--plans', type=int, default=40, help='Recovery plans per user')
+    return parser.parse_args()
+
+
+def seed(db, models, users, entries, plans):
+    """
+    Create users with journal entries, activities, allergies and plans; returns the audited user's credentials
+    """
+    symptoms = ['Headache', 'Back pain', 'Fatigue', 'Knee pain', 'Nausea', 'Insomnia']
+    plan_types = ['general', 'nutrition', 'sports']
+    today = date.today()
+    password = 'audit-password'
+
+    for n in range(users):
+        user = models.User(email=f'audit-{n}@example.com', first_name='Audit', last_name=str(n), age=30)
+        user.set_password(password)
+        db.session.add(user)
+        db.session.flush()
+
+        db.session.add_all([
+            models.MedicalJournal(user_id=user.id,
+                                  symptom=random.choice(symptoms),
+                                  description='Synthetic entry',
+                                  severity=random.randint(1, 10),
+                                  date_experienced=today - timedelta(days=i // 2))
+            for i in range(entries)
+        ])
+        db.session.add(models.AthleticActivity(user_id=user.id, name='Running', intensity='moderate'))
+        db.session.add(models.FoodAllergy(user_id=user.id, food_item='Peanuts', severity='mild'))
+
+        for p in range(plans):
+            plan = models.RecoveryPlan(user_id=user.id, title=f'Plan {p}', description='Synthetic plan',
+                                       plan_type=plan_types[p % len(plan_types)])
+            plan.created_at = datetime.utcnow() - timedelta(hours=p)
+            db.session.add(plan)
+            db.session.flush()
+            db.session.add_all([
+                models.Recommendation(recovery_plan_id=plan.id, title=f'Step {r}', priority=r % 3 + 1)
+                for r in range(5)
+            ])
+
+    db.session.commit()
+    return 'audit-0@example.com', password
+
+
+def exercise_routes(client, db, models):
+    """
+    Call every read route once (and a second keyset page where there is one)
+    """
+    user = models.User.query.filter_by(email='audit-0@example.com').first()
+    plan = models.RecoveryPlan.query.filter_by(user_id=user.id).first()
+    journal_ids = [str(j.id) for j in models.MedicalJournal.query.filter_by(user_id=user.id).limit(20)]
+    plan_ids = [str(p.id) for p in models.RecoveryPlan.query.filter_by(user_id=user.id).limit(10)]
+
+    requests = [
+        ('GET', '/dashboard', None),
+        ('GET', '/profile', None),
+        ('GET', '/journal', None),
+        ('GET', '/journal/data', None),
+        ('GET', '/journal/data?resolution=weekly', None),
+        ('GET', '/journal/data?resolution=monthly', None),
+        ('GET', '/journal/trends', None),
+        ('GET', '/preventative_actions', None),
+        ('GET', f'/view_plan/{plan.id}', None),
+        ('GET', '/nutrition', None),
+        ('GET', '/sports_recovery', None),
+        ('GET', '/reports', None),
+        ('GET', '/api/journal', None),
+        ('GET', '/api/plans', None),
+        ('GET', '/api/plans?plan_type=sports', None),
+    ]
+
+    # Follow the first cursor of each paginated listing
+    for path, key in (('/api/journal', 'cursor'), ('/api/plans', 'cursor')):
+        next_cursor = client.get(path).get_json().get('next_cursor')
+        if next_cursor:
+            requests.append(('GET', f'{path}?{key}={next_cursor}', None))
+
+    for method, path, data in requests:
+        response = client.open(path, method=method, data=data)
+        yield method, path, response.status_code
+
+    # Reports are built by a worker thread; wait for it so its queries are audited too
+    response = client.post('/generate_report', data={'journal_ids': journal_ids, 'plan_ids': plan_ids, 'report_title': 'Audit'})
+    yield 'POST', '/generate_report', response.status_code
+
+    report = response.get_json()
+    status = report['report']['status']
+    while status in ('pending', 'running'):
+        time.sleep(0.1)
+        status = client.get(report['status_url']).get_json()['status']
+
+    for path in (report['pdf_url'], report['data_url']):
+        yield 'GET', path, client.get(path).status_code
+
+
+def explain(engine, statement, parameters):
+    """
+    Return the plan lines for a statement
+    """
+    raw = engine.raw_connection()
+    try:
+        cursor = raw.cursor()
+        if engine.dialect.name == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + statement, parameters)
+            return [row[0] for row in cursor.fetchall()]
+
+        cursor.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [row[3] for row in cursor.fetchall()]
+    finally:
+        raw.rollback()
+        raw.close()
+
+
+def is_sequential_scan(engine, line):
+    if engine.dialect.name == 'postgresql':
+        return 'Seq Scan on' in line
+
+    # SQLite: "SCAN table" is a full table scan; "SCAN table USING INDEX" walks an index
+    detail = line.strip()
+    return (detail.startswith('SCAN ')
+            and 'USING' not in detail
+            and not detail.startswith('SCAN CONSTANT ROW')
+            and not detail.startswith('SCAN ('))
+
+
+def main():
+    args = parse_args()
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'explain_audit.db')
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('SESSION_SECRET', 'explain-audit')
+    os.environ.setdefault('OPENAI_API_KEY', 'unused-by-audit')
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import main as application  # noqa: F401
+    import models
+    from app import app, db
+    from db_utils import capture_queries
+
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        print(f'Seeding {args.users} users x {args.entries} journal entries into {db.engine.url!r}')
+        email, password = seed(db, models, args.users, args.entries, args.plans)
+        if db.engine.dialect.name == 'postgresql':
+            with db.engine.begin() as conn:
+                conn.exec_driver_sql('ANALYZE')
+
+    client = app.test_client()
+    client.post('/login', data={'email': email, 'password': password})
+
+    statements = {}
+    with app.app_context():
+        with capture_queries(db.engine, all_threads=True) as log:
+            for method, path, status in exercise_routes(client, db, models):
+                print(f'{method} {path} -> {status}')
+                for statement, parameters in log.statements:
+                    if statement.lstrip().upper().startswith('SELECT'):
+                        statements.setdefault(statement, (path, parameters))
+                log.statements.clear()
+
+        failures = []
+        for statement, (path, parameters) in statements.items():
+            plan = explain(db.engine, statement, parameters)
+            if any(is_sequential_scan(db.engine, line) for line in plan):
+                failures.append((path, statement, plan))
+
+    print(f'\nAudited {len(statements)} distinct queries')
+    for path, statement, plan in failures:
+        print(f'\nSEQUENTIAL SCAN in query from {path}:\n{statement}')
+        for line in plan:
+            print(f'    {line}')
+
+    if failures:
+        print(f'\n{len(failures)} queries fall back to a sequential scan')
+        return 1
+
+    print('All queries use an index')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
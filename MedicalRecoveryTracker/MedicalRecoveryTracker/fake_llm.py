@@ -0,0 +1,203 @@
+"""
+Local, deterministic stand-in for google.generativeai.GenerativeModel.
+
+Selected with AI_BACKEND=fake. Responses are plan documents derived from a
+hash of the prompt, so the same prompt always gets the same answer, while
+latency, errors and broken output are drawn from configurable distributions:
+
+    FAKE_LLM_LATENCY         lognormal:MEDIAN_MS,SIGMA | normal:MEAN_MS,STDDEV_MS |
+                             uniform:MIN_MS,MAX_MS | fixed:MS      (default lognormal:800,0.4)
+    FAKE_LLM_ERROR_RATE      share of calls failing with 503 / 429 / deadline errors (default 0)
+    FAKE_LLM_MALFORMED_RATE  share of responses cut off mid-document (default 0)
+    FAKE_LLM_MARKDOWN_RATE   share of responses wrapped in ```json fences (default 0.5)
+    FAKE_LLM_SEED            seed for the latency and failure draws (default 0)
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from types import SimpleNamespace
+
+from google.api_core import exceptions as google_exceptions
+
+RECOMMENDATION_TYPES = {
+    'nutrition': ['nutrition'],
+    'sports': ['sports'],
+    'anonymous': ['self-care', 'lifestyle', 'home-remedy'],
+    'general': ['lifestyle', 'therapy', 'medication'],
+}
+
+ACTIONS = ['Rest', 'Hydration', 'Stretching', 'Heat Therapy', 'Cold Therapy', 'Sleep Routine',
+           'Gentle Walking', 'Balanced Meals', 'Breathing Exercises', 'Posture Check', 'Follow-up Visit']
+
+CHARS_PER_TOKEN = 4
+STREAM_CHUNK_CHARS = 64
+
+
+def parse_latency(spec):
+    """
+    Turn a FAKE_LLM_LATENCY spec into a function rng -> seconds
+    """
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v.strip()]
+
+    if kind == 'fixed':
+        return lambda rng: values[0] / 1000
+    if kind == 'uniform':
+        return lambda rng: rng.uniform(values[0], values[1]) / 1000
+    if kind == 'normal':
+        return lambda rng: max(0.0, rng.gauss(values[0], values[1])) / 1000
+    if kind == 'lognormal':
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(0, sigma) * median / 1000
+
+    raise ValueError(f"Unknown FAKE_LLM_LATENCY distribution: {spec}")
+
+
+class FakeBehaviour:
+    """
+    Shared, seeded source of latencies and failures for every fake model
+    """
+
+    def __init__(self, latency='lognormal:800,0.4', error_rate=0.0, malformed_rate=0.0, markdown_rate=0.5, seed=0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.markdown_rate = markdown_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """
+        Return (latency seconds, error or None, malformed, markdown) for one call
+        """
+        with self._lock:
+            latency = self.latency(self._rng)
+            error = None
+            if self._rng.random() < self.error_rate:
+                error = self._rng.choice([
+                    google_exceptions.ServiceUnavailable('Fake backend overloaded'),
+                    google_exceptions.ResourceExhausted('Fake backend quota exceeded'),
+                    google_exceptions.DeadlineExceeded('Fake backend timed out'),
+                ])
+            malformed = self._rng.random() < self.malformed_rate
+            markdown = self._rng.random() < self.markdown_rate
+        return latency, error, malformed, markdown
+
+
+def behaviour_from_env():
+    return FakeBehaviour(
+        latency=os.environ.get("FAKE_LLM_LATENCY", "lognormal:800,0.4"),
+        error_rate=float(os.environ.get("FAKE_LLM_ERROR_RATE", 0)),
+        malformed_rate=float(os.environ.get("FAKE_LLM_MALFORMED_RATE", 0)),
+        markdown_rate=float(os.environ.get("FAKE_LLM_MARKDOWN_RATE", 0.5)),
+        seed=int(os.environ.get("FAKE_LLM_SEED", 0)),
+    )
+
+
+behaviour = behaviour_from_env()
+
+
+def fake_plan(prompt, rng, subject=None):
+    """
+    Plan document shaped like the ones the prompts ask for
+    """
+    lowered = prompt.lower()
+    if 'nutrition' in lowered:
+        kind = 'nutrition'
+    elif 'sports' in lowered:
+        kind = 'sports'
+    elif 'recovery suggestions' in lowered:
+        kind = 'anonymous'
+    else:
+        kind = 'general'
+
+    subject = subject or 'your symptoms'
+    actions = rng.sample(ACTIONS, 5)
+    return {
+        'title': f"{actions[0]} Plan for {subject}",
+        'description': f"Suggestions to help with {subject}. Seek medical help if symptoms worsen.",
+        'recommendations': [{
+            'title': action,
+            'description': f"{action} can help with {subject}. Stop and consult a professional if it makes things worse.",
+            'type': rng.choice(RECOMMENDATION_TYPES[kind]),
+            'priority': rng.randint(1, 3)
+        } for action in actions]
+    }
+
+
+def fake_document(prompt):
+    """
+    Deterministic response body for a prompt: one plan, or one per patient for packed prompts
+    """
+    rng = random.Random(hashlib.sha256(prompt.encode('utf-8')).digest())
+    symptoms = re.findall(r'^Symptom: (.+)$', prompt, re.MULTILINE)
+
+    patients = re.findall(r'^Patient (\d+):', prompt, re.MULTILINE)
+    if patients and '"results"' in prompt:
+        return {'results': [dict(fake_plan(prompt, rng, symptom), patient=int(number))
+                            for number, symptom in zip(patients, symptoms)]}
+
+    return fake_plan(prompt, rng, symptoms[0] if symptoms else None)
+
+
+def _usage(prompt, text):
+    prompt_tokens = len(prompt) // CHARS_PER_TOKEN
+    output_tokens = len(text) // CHARS_PER_TOKEN
+    return SimpleNamespace(prompt_token_count=prompt_tokens,
+                           candidates_token_count=output_tokens,
+                           total_token_count=prompt_tokens + output_tokens)
+
+
+class FakeGenerativeModel:
+    """
+    Drop-in for genai.GenerativeModel as used by gemini_client
+    """
+
+    def __init__(self, model_name=None, generation_config=None, safety_settings=None, behaviour=behaviour):
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.behaviour = behaviour
+
+    def generate_content(self, prompt, stream=False, generation_config=None, request_options=None):
+        latency, error, malformed, markdown = self.behaviour.draw()
+        timeout = (request_options or {}).get("timeout")
+
+        text = json.dumps(fake_document(prompt), indent=2)
+        if malformed:
+            text = text[:len(text) // 2]
+        # JSON mode responses are never wrapped in markdown
+        config = generation_config or self.generation_config
+        if markdown and config.get("response_mime_type") != "application/json":
+            text = f"```json\n{text}\n```"
+
+        if stream:
+            return self._stream(prompt, text, latency, error, timeout)
+
+        self._wait(latency, timeout)
+        if error:
+            raise error
+        return SimpleNamespace(text=text, parts=[text], usage_metadata=_usage(prompt, text))
+
+    def _wait(self, latency, timeout):
+        if timeout and latency > timeout:
+            time.sleep(timeout)
+            raise google_exceptions.DeadlineExceeded(f"Fake backend exceeded the {timeout}s timeout")
+        time.sleep(latency)
+
+    def _stream(self, prompt, text, latency, error, timeout):
+        # A quarter of the latency goes to the first chunk, the rest is spread over the others
+        chunks = [text[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+        self._wait(latency / 4, timeout)
+        if error:
+            raise error
+
+        delay = latency * 3 / 4 / max(1, len(chunks))
+        for index, chunk in enumerate(chunks):
+            if index:
+                time.sleep(delay)
+            usage = _usage(prompt, text) if index == len(chunks) - 1 else None
+            yield SimpleNamespace(text=chunk, parts=[chunk], usage_metadata=usage)
@@ -0,0 +1,320 @@
+import os
+import time
+import logging
+import threading
+
+import google.generativeai as genai
+from cache import response_cache
+from stream_parser import RecommendationStreamParser
+from rate_limiter import rate_limiter, estimate_tokens
+from resilience import resilient_caller, is_retryable
+from instrumentation import timed
+from structured_output import InvalidResponseError, Schema, extract_json, validate  # noqa: F401
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("socket")
+
+
+# Configure Google GenerativeAI; gRPC calls do not yield to other greenlets, so gevent workers use REST
+GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
+genai.configure(api_key=GOOGLE_API_KEY, transport="rest" if _gevent_patched() else None)
+
+# Model backend: "gemini", or "fake" for the local stand-in in fake_llm (load tests, offline development)
+AI_BACKEND = os.environ.get("AI_BACKEND", "gemini")
+
+# Without a model the generators serve their fallback plans
+MODEL_AVAILABLE = bool(GOOGLE_API_KEY) or AI_BACKEND == "fake"
+
+# Default model and request timeout (seconds) shared by every generator
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-flash")
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", 30))
+
+GENERATION_CONFIG = {
+    "temperature": 0.3,
+    "top_p": 0.9,
+    "top_k": 32,
+    "max_output_tokens": 2048,
+}
+
+# Ask for raw JSON instead of prose or markdown; disable for models without JSON mode
+if os.environ.get("GEMINI_JSON_MODE", "1") == "1":
+    GENERATION_CONFIG["response_mime_type"] = "application/json"
+
+SAFETY_SETTINGS = [
+    {
+        "category": "HARM_CATEGORY_HARASSMENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_HATE_SPEECH",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+    {
+        "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+        "threshold": "BLOCK_ONLY_HIGH"
+    },
+]
+
+# Structure shared by every plan the generators ask for
+PLAN_SCHEMA = Schema({
+    "title": str,
+    "description": str,
+    "recommendations": [{
+        "title": str,
+        "description": str,
+        "priority": int,
+        "type?": str,
+    }],
+})
+
+
+class CallStats:
+    """
+    Running latency and token totals for one model
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.prompt_tokens = 0
+        self.output_tokens = 0
+
+    def serialize(self):
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'avg_latency_ms': round(self.total_latency / self.calls * 1000, 1) if self.calls else 0.0,
+            'max_latency_ms': round(self.max_latency * 1000, 1),
+            'prompt_tokens': self.prompt_tokens,
+            'output_tokens': self.output_tokens
+        }
+
+
+class GeminiClient:
+    """
+    Process-wide Gemini client. Model handles are built once per model name
+    and reused by every request.
+    """
+
+    def __init__(self, generation_config=None, safety_settings=None, timeout=GEMINI_TIMEOUT):
+        self.generation_config = generation_config or GENERATION_CONFIG
+        self.safety_settings = safety_settings or SAFETY_SETTINGS
+        self.timeout = timeout
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def get_model(self, model_name=None):
+        model_name = model_name or GEMINI_MODEL
+        model = self._models.get(model_name)
+        if model is None:
+            with self._lock:
+                model = self._models.get(model_name)
+                if model is None:
+                    if AI_BACKEND == "fake":
+                        from fake_llm import FakeGenerativeModel as model_class
+                    else:
+                        model_class = genai.GenerativeModel
+                    model = model_class(
+                        model_name=model_name,
+                        generation_config=self.generation_config,
+                        safety_settings=self.safety_settings
+                    )
+                    self._models[model_name] = model
+        return model
+
+    def generate_structured(self, prompt_template, schema=PLAN_SCHEMA, model_name=None, timeout=None,
+                            use_cache=True, rate_key=None, generation_config=None, **fields):
+        """
+        Fill in the prompt template, call the model and return the parsed, validated JSON response.
+        rate_key identifies the caller for the per-user rate limit; generation_config overrides
+        entries of the client's configuration for this call only.
+        """
+        model_name = model_name or GEMINI_MODEL
+        prompt = prompt_template.format(**fields) if fields else prompt_template
+        config = dict(self.generation_config, **generation_config) if generation_config else self.generation_config
+
+        # Serve repeated prompts from the response cache
+        if use_cache:
+            cached_result = response_cache.get(prompt, model_name, config)
+            if cached_result is not None:
+                return cached_result
+
+        model = self.get_model(model_name)
+        estimated_tokens = estimate_tokens(prompt, config.get("max_output_tokens", 0))
+
+        def attempt():
+            # Wait for quota (or shed the request) before anything is sent
+            with rate_limiter.slot(model_name, estimated_tokens, rate_key):
+                start = time.perf_counter()
+                try:
+                    response = model.generate_content(
+                        prompt,
+                        generation_config=config,
+                        request_options={"timeout": timeout or self.timeout}
+                    )
+                    text = response.text
+                except Exception:
+                    self._record(model_name, time.perf_counter() - start, error=True)
+                    raise
+
+            usage = getattr(response, "usage_metadata", None)
+            self._record(model_name, time.perf_counter() - start, usage)
+            rate_limiter.settle(model_name, estimated_tokens, getattr(usage, "total_token_count", 0))
+            return text
+
+        # Retries, hedging and the circuit breaker wrap every attempt
+        with timed("llm"):
+            text = resilient_caller.call(attempt)
+
+        result = extract_json(text)
+        if schema:
+            validate(result, schema)
+
+        if use_cache:
+            response_cache.set(prompt, model_name, config, result)
+        return result
+
+    def cached(self, prompt_template, model_name=None, **fields):
+        """
+        Cached result of generate_structured for these arguments, or None
+        """
+        prompt = prompt_template.format(**fields) if fields else prompt_template
+        return response_cache.get(prompt, model_name or GEMINI_MODEL, self.generation_config)
+
+    def store(self, prompt_template, result, model_name=None, **fields):
+        """
+        Cache a result obtained some other way (e.g. from a packed prompt) as if
+        generate_structured had produced it for these arguments
+        """
+        prompt = prompt_template.format(**fields) if fields else prompt_template
+        response_cache.set(prompt, model_name or GEMINI_MODEL, self.generation_config, result)
+
+    def stream_structured(self, prompt_template, schema=PLAN_SCHEMA, model_name=None, timeout=None,
+                          use_cache=True, rate_key=None, **fields):
+        """
+        Stream a plan document from the model, yielding ('field', name, value) and
+        ('recommendation', index, item) events as soon as each one is complete,
+        followed by ('done', result) with the full validated document
+        """
+        model_name = model_name or GEMINI_MODEL
+        prompt = prompt_template.format(**fields) if fields else prompt_template
+
+        if use_cache:
+            cached_result = response_cache.get(prompt, model_name, self.generation_config)
+            if cached_result is not None:
+                yield from result_events(cached_result)
+                return
+
+        model = self.get_model(model_name)
+        parser = RecommendationStreamParser()
+        usage = None
+        estimated_tokens = estimate_tokens(prompt, self.generation_config.get("max_output_tokens", 0))
+
+        # Partial output may already be on its way to the client, so streams
+        # are not retried, but they still respect and feed the circuit breaker
+        breaker = resilient_caller.breaker
+        breaker.before_call()
+
+        start = None
+        try:
+            # Model time for streams includes the time the client takes to read each event
+            with timed("llm"), rate_limiter.slot(model_name, estimated_tokens, rate_key):
+                start = time.perf_counter()
+                response = model.generate_content(
+                    prompt,
+                    stream=True,
+                    request_options={"timeout": timeout or self.timeout}
+                )
+                for chunk in response:
+                    usage = getattr(chunk, "usage_metadata", None) or usage
+                    # Chunks carrying only finish metadata have no text parts
+                    if chunk.parts:
+                        yield from parser.feed(chunk.text)
+        except GeneratorExit:
+            # The client went away mid-stream
+            breaker.release()
+            raise
+        except Exception as e:
+            if start is None:
+                # Shed by the rate limiter before reaching the model; give back a half-open trial
+                breaker.release()
+                raise
+            self._record(model_name, time.perf_counter() - start, error=True)
+            if is_retryable(e):
+                breaker.record_failure()
+            else:
+                breaker.release()
+            raise
+
+        breaker.record_success()
+        self._record(model_name, time.perf_counter() - start, usage)
+        rate_limiter.settle(model_name, estimated_tokens, getattr(usage, "total_token_count", 0))
+
+        result = extract_json(parser.text)
+        if schema:
+            validate(result, schema)
+
+        if use_cache:
+            response_cache.set(prompt, model_name, self.generation_config, result)
+        yield ('done', result)
+
+    def _record(self, model_name, latency, usage=None, error=False):
+        prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+        output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+
+        with self._lock:
+            stats = self._stats.setdefault(model_name, CallStats())
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.total_latency += latency
+            stats.max_latency = max(stats.max_latency, latency)
+            stats.prompt_tokens += prompt_tokens
+            stats.output_tokens += output_tokens
+
+        logging.debug(f"Gemini call to {model_name}: {latency * 1000:.0f} ms, "
+                      f"{prompt_tokens} prompt tokens, {output_tokens} output tokens")
+
+    def stats(self):
+        with self._lock:
+            return {name: stats.serialize() for name, stats in self._stats.items()}
+
+
+def result_events(result):
+    """
+    Replay a complete document as the events stream_structured would produce
+    """
+    for key, value in result.items():
+        if isinstance(value, str):
+            yield ('field', key, value)
+    for index, item in enumerate(result.get("recommendations", [])):
+        yield ('recommendation', index, item)
+    yield ('done', result)
+
+
+gemini_client = GeminiClient()
+
+
+def generate_structured(prompt_template, schema=PLAN_SCHEMA, **kwargs):
+    """
+    Shortcut for gemini_client.generate_structured
+    """
+    return gemini_client.generate_structured(prompt_template, schema, **kwargs)
+
+
+def stream_structured(prompt_template, schema=PLAN_SCHEMA, **kwargs):
+    """
+    Shortcut for gemini_client.stream_structured
+    """
+    return gemini_client.stream_structured(prompt_template, schema, **kwargs)
@@ -0,0 +1,37 @@
+"""
+Gunicorn settings; command-line flags still take precedence.
+
+GUNICORN_WORKER_CLASS=gevent serves every request on a greenlet, so one worker
+process holds hundreds of concurrent model waits instead of one per thread.
+It needs the optional gevent dependencies (pip install ".[gevent]"):
+
+    GUNICORN_WORKER_CLASS=gevent gunicorn --bind 0.0.0.0:5000 main:app
+
+The worker model also picks the defaults of the database pool (DB_WORKER_MODEL)
+and of the background generation pool.
+"""
+import os
+
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "sync")
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+
+if worker_class == "gevent":
+    os.environ.setdefault("DB_WORKER_MODEL", "gevent")
+    # Generation jobs and batch calls run on greenlets, which cost almost nothing while they wait
+    os.environ.setdefault("AI_JOB_WORKERS", "100")
+    os.environ.setdefault("BATCH_CONCURRENCY", "32")
+elif worker_class == "gthread" or threads > 1:
+    os.environ.setdefault("DB_WORKER_MODEL", "gthread")
+
+
+def post_fork(server, worker):
+    if worker_class == "gevent" and os.environ.get("DATABASE_URL", "").startswith("postgres"):
+        # Let PostgreSQL queries yield to other greenlets instead of blocking the worker
+        try:
+            from psycogreen.gevent import patch_psycopg
+        except ImportError:
+            server.log.warning("psycogreen is not installed; PostgreSQL queries will block gevent workers")
+        else:
+            patch_psycopg()
@@ -0,0 +1,323 @@
+import os
+import sys
+import time
+import logging
+import tempfile
+import threading
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Requests slower than this (milliseconds) have their sampled stacks written out; unset disables the profiler
+PROFILE_SLOW_REQUEST_MS = os.environ.get("PROFILE_SLOW_REQUEST_MS")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "meditrack_profiles"))
+
+# Optional bearer token required by /metrics
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+class RequestTimings:
+    """
+    Time spent by one request in the database, in templates and waiting on the model
+    """
+
+    def __init__(self):
+        self.endpoint = None
+        self.db = 0.0
+        self.queries = 0
+        self.template = 0.0
+        self.llm = 0.0
+        self._template_starts = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, seconds):
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + seconds)
+            if kind == 'db':
+                self.queries += 1
+
+
+_local = threading.local()
+
+
+def current_timings():
+    return getattr(_local, 'timings', None)
+
+
+def record(kind, seconds):
+    """
+    Add time ('db', 'template' or 'llm') to the request running on this thread, if any
+    """
+    timings = current_timings()
+    if timings is not None:
+        timings.add(kind, seconds)
+
+
+@contextmanager
+def timed(kind):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(kind, time.perf_counter() - start)
+
+
+class Histogram:
+    """
+    Prometheus-style cumulative histogram keyed by a tuple of label values
+    """
+
+    def __init__(self, name, help_text, label_names, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # Per-bucket counts (the last is +Inf), sum, count
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self._series.items()}
+
+        for labels, (counts, total, count) in sorted(series.items()):
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + "," if label_text else ""
+            cumulative = 0
+            for bound, bucket_count in zip(list(self.buckets) + ["+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {count}")
+        return "\n".join(lines)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+request_duration = Histogram("meditrack_request_duration_seconds", "Wall time of each request",
+                             ("endpoint", "method", "status"))
+db_duration = Histogram("meditrack_request_db_seconds", "Time each request spent executing SQL", ("endpoint",))
+db_queries = Histogram("meditrack_request_db_queries", "SQL statements executed by each request", ("endpoint",),
+                       buckets=QUERY_BUCKETS)
+template_duration = Histogram("meditrack_request_template_seconds", "Time each request spent rendering templates",
+                              ("endpoint",))
+llm_duration = Histogram("meditrack_request_llm_seconds", "Time each request spent waiting on the model",
+                         ("endpoint",))
+
+METRICS = [request_duration, db_duration, db_queries, template_duration, llm_duration]
+
+
+def render_metrics():
+    """
+    All histograms in the Prometheus text exposition format. Each worker process
+    keeps its own counts.
+    """
+    return "\n\n".join(metric.render() for metric in METRICS) + "\n"
+
+
+class StackSampler:
+    """
+    Samples the Python stacks of threads currently serving a request and keeps
+    collapsed ("frame;frame;frame") stack counts for each of them
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self._lock:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+                self._thread.start()
+        return samples
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[_collapse(frame)] += 1
+
+
+def _collapse(frame):
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+def write_profile(samples, endpoint, elapsed):
+    """
+    Write collapsed stacks in the format flamegraph.pl and speedscope read
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{endpoint or 'unmatched'}-{elapsed * 1000:.0f}ms.folded"
+    path = os.path.join(PROFILE_DIR, filename)
+    with open(path, "w") as f:
+        for stack, count in samples.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+class InstrumentationMiddleware:
+    """
+    WSGI middleware recording per-request wall, database, template and model time.
+    Streaming responses are measured until the server closes the response iterable.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.slow_threshold = float(PROFILE_SLOW_REQUEST_MS) / 1000 if PROFILE_SLOW_REQUEST_MS else None
+        self.sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000) if self.slow_threshold is not None else None
+
+    def __call__(self, environ, start_response):
+        timings = RequestTimings()
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        status = []
+
+        def instrumented_start_response(status_line, headers, exc_info=None):
+            status[:] = [status_line.split(" ", 1)[0]]
+            return start_response(status_line, headers, exc_info)
+
+        _local.timings = timings
+        if self.sampler:
+            self.sampler.start(thread_id)
+        try:
+            response = self.wsgi_app(environ, instrumented_start_response)
+        except Exception:
+            self._finish(environ, timings, start, status or ["500"], thread_id)
+            raise
+        return ClosingIterator(response, lambda: self._finish(environ, timings, start, status, thread_id))
+
+    def _finish(self, environ, timings, start, status, thread_id):
+        elapsed = time.perf_counter() - start
+        if current_timings() is timings:
+            _local.timings = None
+        samples = self.sampler.stop(thread_id) if self.sampler else None
+
+        endpoint = timings.endpoint or "unmatched"
+        request_duration.observe((endpoint, environ.get("REQUEST_METHOD", ""), status[0] if status else ""), elapsed)
+        db_duration.observe((endpoint,), timings.db)
+        db_queries.observe((endpoint,), timings.queries)
+        template_duration.observe((endpoint,), timings.template)
+        llm_duration.observe((endpoint,), timings.llm)
+
+        if samples and elapsed >= self.slow_threshold:
+            try:
+                path = write_profile(samples, timings.endpoint, elapsed)
+                logging.warning(f"Slow request {environ.get('REQUEST_METHOD')} {environ.get('PATH_INFO')}: "
+                                f"{elapsed * 1000:.0f} ms (db {timings.db * 1000:.0f} ms in {timings.queries} queries, "
+                                f"templates {timings.template * 1000:.0f} ms, model {timings.llm * 1000:.0f} ms), "
+                                f"profile written to {path}")
+            except OSError as e:
+                logging.error(f"Error writing request profile: {str(e)}")
+
+
+class ClosingIterator:
+    """
+    Response iterable that runs a callback once the server closes it
+    """
+
+    def __init__(self, response, callback):
+        self._response = response
+        self._callback = callback
+        self._closed = False
+
+    def __iter__(self):
+        return iter(self._response)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            if hasattr(self._response, "close"):
+                self._response.close()
+        finally:
+            self._callback()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    record("db", time.perf_counter() - conn.info["query_start"].pop())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get("query_start") if exception_context.connection else None
+    if starts:
+        record("db", time.perf_counter() - starts.pop())
+
+
+def _before_render_template(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None:
+        timings._template_starts.append(time.perf_counter())
+
+
+def _template_rendered(sender, template, context, **extra):
+    timings = current_timings()
+    if timings is not None and timings._template_starts:
+        timings.add("template", time.perf_counter() - timings._template_starts.pop())
+
+
+def _remember_endpoint():
+    timings = current_timings()
+    if timings is not None:
+        timings.endpoint = request.endpoint
+
+
+def init_app(app):
+    """
+    Wrap the app's WSGI callable and hook SQLAlchemy, Jinja and routing
+    """
+    app.wsgi_app = InstrumentationMiddleware(app.wsgi_app)
+    app.before_request(_remember_endpoint)
+
+    # Every engine, including ones created after this runs
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+    before_render_template.connect(_before_render_template, app)
+    template_rendered.connect(_template_rendered, app)
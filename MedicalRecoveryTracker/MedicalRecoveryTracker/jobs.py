@@ -0,0 +1,226 @@
+import os
+import json
+import uuid
+import logging
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import update
+
+from app import app, db
+from models import User, MedicalJournal, AthleticActivity, FoodAllergy, RecoveryPlan, GenerationJob
+from ai_helper import (generate_recovery_plan, generate_nutrition_plan, generate_sports_recovery_plan,
+                       RECOVERY_PLAN_FALLBACK, NUTRITION_PLAN_FALLBACK, SPORTS_RECOVERY_PLAN_FALLBACK)
+from plan_library import find_template, record_plan, normalize
+
+# Bounded worker pool for AI generation so slow model calls never hold request workers
+AI_JOB_WORKERS = int(os.environ.get("AI_JOB_WORKERS", 4))
+executor = ThreadPoolExecutor(max_workers=AI_JOB_WORKERS, thread_name_prefix="generation-job")
+
+# A job still 'running' this long after it was claimed lost its worker (e.g. the process was killed)
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 600))
+
+# job_type -> handler(job, user, payload) returning the ID of the created RecoveryPlan
+JOB_HANDLERS = {}
+
+
+def job_handler(job_type):
+    """
+    Register a function as the handler for a job type
+    """
+    def decorator(func):
+        JOB_HANDLERS[job_type] = func
+        return func
+    return decorator
+
+
+def enqueue_job(user_id, job_type, payload):
+    """
+    Persist a new generation job and hand it to the worker pool
+    """
+    if job_type not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    job = GenerationJob(
+        id=uuid.uuid4().hex,
+        user_id=user_id,
+        job_type=job_type,
+        status='pending',
+        payload=json.dumps(payload))
+
+    db.session.add(job)
+    db.session.commit()
+
+    executor.submit(run_job, job.id)
+    return job
+
+
+def run_job(job_id):
+    """
+    Execute a pending job inside its own application context
+    """
+    with app.app_context():
+        try:
+            # Atomically claim the job so it only runs once across workers
+            claimed = db.session.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id, GenerationJob.status == 'pending')
+                .values(status='running', updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+
+            if not claimed:
+                return
+
+            job = db.session.get(GenerationJob, job_id)
+            user = db.session.get(User, job.user_id)
+
+            try:
+                handler = JOB_HANDLERS[job.job_type]
+                plan_id = handler(job, user, json.loads(job.payload or '{}'))
+
+                # Handlers may close the session while they wait on the model
+                job = db.session.get(GenerationJob, job_id)
+                job.recovery_plan_id = plan_id
+                job.status = 'completed'
+                db.session.commit()
+            except Exception as e:
+                logging.error(f"Generation job {job_id} failed: {str(e)}")
+                db.session.rollback()
+
+                job = db.session.get(GenerationJob, job_id)
+                job.status = 'failed'
+                job.error = str(e)
+                db.session.commit()
+        finally:
+            db.session.remove()
+
+
+def release_stale_jobs(job_id=None):
+    """
+    Put jobs left 'running' by a dead worker back to 'pending', optionally only
+    the given job, returning how many were released
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=JOB_STALE_SECONDS)
+    query = (update(GenerationJob)
+             .where(GenerationJob.status == 'running', GenerationJob.updated_at < cutoff)
+             .values(status='pending', updated_at=datetime.utcnow()))
+    if job_id is not None:
+        query = query.where(GenerationJob.id == job_id)
+
+    released = db.session.execute(query).rowcount
+    db.session.commit()
+    return released
+
+
+def requeue_if_stale(job):
+    """
+    Re-submit a job whose worker died mid-run, returning whether it was re-queued
+    """
+    if job.status != 'running' or not release_stale_jobs(job.id):
+        return False
+
+    db.session.refresh(job)
+    executor.submit(run_job, job.id)
+    return True
+
+
+def resume_pending_jobs():
+    """
+    Re-submit jobs that were still pending when the process last stopped, and
+    jobs whose worker died while running them
+    """
+    release_stale_jobs()
+
+    pending_ids = db.session.execute(
+        db.select(GenerationJob.id).where(GenerationJob.status == 'pending')
+    ).scalars().all()
+
+    for job_id in pending_ids:
+        executor.submit(run_job, job_id)
+
+    return len(pending_ids)
+
+
+def _save_plan(user_id, plan_data, plan_type, recommendation_type=None):
+    """
+    Store a generated plan and its recommendations, returning the plan ID
+    """
+    plan_id, = RecoveryPlan.insert_many([dict(plan_data, user_id=user_id, plan_type=plan_type,
+                                              recommendation_type=recommendation_type)])
+    db.session.commit()
+    return plan_id
+
+
+def _selected_entries(user, payload):
+    return MedicalJournal.query.filter(
+        MedicalJournal.id.in_(payload.get('symptom_ids', [])),
+        MedicalJournal.user_id == user.id).all()
+
+
+def _library_or_generated_plan(user, plan_type, entries, generate, fallback, error_message,
+                               recommendation_type=None, context=(), required=()):
+    """
+    Save a plan from a close enough vetted template, or generate one and offer it to the library
+    """
+    plan_data = find_template(plan_type, entries, context, required)
+    if plan_data is not None:
+        return _save_plan(user.id, plan_data, plan_type, recommendation_type)
+
+    # Give the connection back to the pool while waiting on the model; loaded objects stay readable
+    db.session.close()
+
+    plan_data = generate()
+    if not plan_data:
+        raise RuntimeError(error_message)
+
+    plan_id = _save_plan(user.id, plan_data, plan_type, recommendation_type)
+    # Fallback plans are not model output, so they stay out of the library
+    if plan_data != fallback:
+        record_plan(plan_type, entries, plan_data, plan_id, context, required)
+    return plan_id
+
+
+@job_handler('general')
+def run_recovery_plan_job(job, user, payload):
+    entries = _selected_entries(user, payload)
+
+    return _library_or_generated_plan(
+        user, 'general', entries,
+        lambda: generate_recovery_plan(user, entries),
+        RECOVERY_PLAN_FALLBACK, 'Failed to generate recovery plan. Please try again.')
+
+
+@job_handler('nutrition')
+def run_nutrition_plan_job(job, user, payload):
+    entries = _selected_entries(user, payload)
+    allergies = FoodAllergy.query.filter_by(user_id=user.id).all()
+
+    # Allergies must match exactly: a template written for other allergies could recommend an allergen
+    return _library_or_generated_plan(
+        user, 'nutrition', entries,
+        lambda: generate_nutrition_plan(user, entries, allergies),
+        NUTRITION_PLAN_FALLBACK, 'Failed to generate nutrition plan. Please try again.',
+        recommendation_type='nutrition',
+        required=sorted({f"allergy:{normalize(allergy.food_item)}" for allergy in allergies}))
+
+
+@job_handler('sports')
+def run_sports_plan_job(job, user, payload):
+    entries = _selected_entries(user, payload)
+    activities = AthleticActivity.query.filter(
+        AthleticActivity.id.in_(payload.get('activity_ids', [])),
+        AthleticActivity.user_id == user.id).all()
+
+    return _library_or_generated_plan(
+        user, 'sports', entries,
+        lambda: generate_sports_recovery_plan(user, entries, activities),
+        SPORTS_RECOVERY_PLAN_FALLBACK, 'Failed to generate sports recovery plan. Please try again.',
+        recommendation_type='sports',
+        context=sorted({f"activity:{normalize(activity.name)}" for activity in activities}))
+
+
+with app.app_context():
+    resumed = resume_pending_jobs()
+    if resumed:
+        logging.info(f"Resumed {resumed} pending generation jobs")
@@ -0,0 +1,93 @@
+from sqlalchemy import func, select
+
+from app import db
+from cache import MemoryBackend
+from models import MedicalJournal, DataVersion
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
+
+CHART_COLORS = ['#4e73df', '#1cc88a', '#36b9cc', '#f6c23e', '#e74a3b']
+
+# Chart payloads per (user, journal version, filters); a new version makes old entries unreachable
+chart_cache = MemoryBackend(max_entries=2048)
+
+
+def date_bucket(column, resolution):
+    """
+    SQL expression turning a date column into a YYYY-MM-DD bucket label (weeks start on Monday)
+    """
+    if db.engine.dialect.name == 'postgresql':
+        if resolution == 'daily':
+            return func.to_char(column, 'YYYY-MM-DD')
+        unit = 'week' if resolution == 'weekly' else 'month'
+        return func.to_char(func.date_trunc(unit, column), 'YYYY-MM-DD')
+
+    # SQLite
+    if resolution == 'weekly':
+        return func.date(column, 'weekday 0', '-6 days')
+    if resolution == 'monthly':
+        return func.strftime('%Y-%m-01', column)
+    return func.date(column)
+
+
+def journal_chart_data(user_id, start=None, end=None, resolution='daily'):
+    """
+    Chart.js payload of average severity per symptom and period, aggregated in a single query
+    and cached until the user's journal changes
+    """
+    journal_version, _ = DataVersion.for_user(user_id)
+    key = (user_id, journal_version, start, end, resolution)
+
+    data = chart_cache.get(key)
+    if data is None:
+        data = _build_chart_data(user_id, start, end, resolution)
+        chart_cache.set(key, data)
+    return data
+
+
+def _build_chart_data(user_id, start, end, resolution):
+    bucket = date_bucket(MedicalJournal.date_experienced, resolution).label('bucket')
+
+    query = select(
+        MedicalJournal.symptom,
+        bucket,
+        func.avg(MedicalJournal.severity).label('severity'),
+        func.count(MedicalJournal.id).label('entries')
+    ).where(MedicalJournal.user_id == user_id)
+
+    if start:
+        query = query.where(MedicalJournal.date_experienced >= start)
+    if end:
+        query = query.where(MedicalJournal.date_experienced <= end)
+
+    query = query.group_by(MedicalJournal.symptom, bucket).order_by(bucket, MedicalJournal.symptom)
+
+    datasets = {}
+    labels = set()
+
+    for symptom, date_str, severity, entries in db.session.execute(query):
+        dataset = datasets.get(symptom)
+        if dataset is None:
+            color = CHART_COLORS[len(datasets) % len(CHART_COLORS)]
+            dataset = datasets[symptom] = {
+                'label': symptom,
+                'data': [],
+                'backgroundColor': color,
+                'borderColor': color,
+                'borderWidth': 2,
+                'fill': False,
+                'tension': 0.3,
+                'dates': [],
+                'counts': []
+            }
+
+        dataset['dates'].append(date_str)
+        dataset['data'].append(round(float(severity), 2))
+        dataset['counts'].append(entries)
+        labels.add(date_str)
+
+    return {
+        'labels': sorted(labels),
+        'datasets': list(datasets.values()),
+        'resolution': resolution
+    }
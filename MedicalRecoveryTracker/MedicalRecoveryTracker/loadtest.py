@@ -0,0 +1,401 @@
+"""
+Load-test driver for a running MediTrack server.
+
+Each virtual user registers, logs in, seeds a few journal entries and then
+keeps picking weighted actions that cover every route in routes.py, until the
+test duration is over. Latency is recorded per route and reported as
+p50/p95/p99 alongside throughput and error counts.
+
+Start the server against the fake model so no Gemini quota is used, e.g.:
+
+    AI_BACKEND=fake FAKE_LLM_LATENCY=lognormal:800,0.4 CLINIC_API_KEYS=loadtest \\
+        gunicorn --bind 127.0.0.1:5000 --workers 4 main:app
+
+    python loadtest.py --url http://127.0.0.1:5000 --users 25 --duration 60 --api-key loadtest
+
+Only the standard library is used: requests run on keep-alive http.client
+connections, one per virtual user, driven from asyncio worker threads.
+"""
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import http.client
+from http.cookies import SimpleCookie
+from urllib.parse import urlsplit, urlencode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+SYMPTOMS = ['Headache', 'Back pain', 'Fatigue', 'Knee pain', 'Nausea', 'Insomnia', 'Sore throat']
+
+
+class Stats:
+    """
+    Latencies and outcomes per route label
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.shed = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def record(self, label, latency, status):
+        self.latencies.setdefault(label, []).append(latency)
+        if status in (429, 503):
+            self.shed[label] = self.shed.get(label, 0) + 1
+        elif status is None or status >= 500:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def summary(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        rows = {label: summarize(values, elapsed, self.errors.get(label, 0), self.shed.get(label, 0))
+                for label, values in sorted(self.latencies.items())}
+        everything = [v for values in self.latencies.values() for v in values]
+        rows['TOTAL'] = summarize(everything, elapsed, sum(self.errors.values()), sum(self.shed.values()))
+        return {'elapsed': elapsed, 'routes': rows}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(values, elapsed, errors, shed):
+    ordered = sorted(values)
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'shed': shed,
+        'rps': len(ordered) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(ordered, 0.50) * 1000,
+        'p95_ms': percentile(ordered, 0.95) * 1000,
+        'p99_ms': percentile(ordered, 0.99) * 1000,
+        'max_ms': (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+class VirtualUser:
+    """
+    One browser-like client: a keep-alive connection, a cookie jar and a CSRF token
+    """
+
+    def __init__(self, base_url, stats, api_key=None):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.netloc = parts.netloc
+        self.stats = stats
+        self.api_key = api_key
+        self.cookies = {}
+        self.last_headers = {}
+        self.csrf_token = None
+        self.connection = None
+        self.email = f"loadtest-{uuid.uuid4().hex[:12]}@example.com"
+        self.password = 'loadtest-password'
+        self.rng = random.Random()
+
+    # HTTP
+
+    def _connect(self):
+        connection_class = http.client.HTTPSConnection if self.scheme == 'https' else http.client.HTTPConnection
+        self.connection = connection_class(self.netloc, timeout=120)
+
+    def request(self, label, method, path, form=None, json_body=None, headers=None):
+        """
+        Send one request and record its latency under label; returns (status, body)
+        """
+        headers = dict(headers or {})
+        body = None
+        if form is not None:
+            body = urlencode(form, doseq=True)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        elif json_body is not None:
+            body = json.dumps(json_body)
+            headers['Content-Type'] = 'application/json'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+
+        start = time.perf_counter()
+        status, data = None, b''
+        try:
+            if self.connection is None:
+                self._connect()
+            self.connection.request(method, path, body=body, headers=headers)
+            response = self.connection.getresponse()
+            data = response.read()
+            status = response.status
+            self.last_headers = response.headers
+
+            for header in response.headers.get_all('Set-Cookie') or []:
+                cookie = SimpleCookie(header)
+                for name, morsel in cookie.items():
+                    if morsel['expires'] and 'Thu, 01 Jan 1970' in morsel['expires']:
+                        self.cookies.pop(name, None)
+                    else:
+                        self.cookies[name] = morsel.value
+        except (OSError, http.client.HTTPException):
+            # Start a fresh connection next time
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = None
+        finally:
+            self.stats.record(label, time.perf_counter() - start, status)
+
+        return status, data
+
+    def get(self, label, path, **kwargs):
+        return self.request(label, 'GET', path, **kwargs)
+
+    def post(self, label, path, form=None, **kwargs):
+        if form is not None and self.csrf_token:
+            form = dict(form, csrf_token=self.csrf_token)
+        return self.request(label, 'POST', path, form=form, **kwargs)
+
+    def get_json(self, label, path):
+        status, body = self.get(label, path, headers={'Accept': 'application/json'})
+        try:
+            return status, json.loads(body)
+        except ValueError:
+            return status, {}
+
+    def refresh_csrf(self, label, path):
+        status, body = self.get(label, path)
+        match = CSRF_PATTERN.search(body.decode('utf-8', errors='replace'))
+        if match:
+            self.csrf_token = match.group(1)
+        return status
+
+    def poll(self, label, path, timeout=60):
+        """
+        Poll a job or report status URL until it settles
+        """
+        deadline = time.monotonic() + timeout
+        data = {}
+        while time.monotonic() < deadline:
+            _, data = self.get_json(label, path)
+            if data.get('status') not in ('pending', 'running'):
+                break
+            time.sleep(0.5)
+        return data
+
+    # Setup
+
+    def sign_up(self):
+        self.refresh_csrf('GET /register', '/register')
+        self.post('POST /register', '/register', form={
+            'email': self.email, 'password': self.password, 'confirm_password': self.password})
+        self.refresh_csrf('GET /login', '/login')
+        self.post('POST /login', '/login', form={'email': self.email, 'password': self.password})
+        self.refresh_csrf('GET /journal', '/journal')
+
+        self.post('POST /profile', '/profile', form={
+            'first_name': 'Load', 'last_name': 'Test', 'age': 35, 'gender': 'other', 'weight': 70, 'height': 175})
+        self.post('POST /add_activity', '/add_activity', form={'name': 'Running', 'frequency': '3 times a week', 'intensity': 'moderate'})
+        self.post('POST /add_allergy', '/add_allergy', form={'food_item': 'Peanuts', 'severity': 'mild'})
+        for _ in range(5):
+            self.add_journal_entry()
+
+    # Actions
+
+    def add_journal_entry(self):
+        self.post('POST /journal', '/journal', form={
+            'symptom': self.rng.choice(SYMPTOMS),
+            'severity': self.rng.randint(1, 10),
+            'date_experienced': (date.today() - timedelta(days=self.rng.randint(0, 90))).isoformat(),
+            'description': 'Recorded by the load test'})
+
+    def journal_ids(self):
+        _, data = self.get_json('GET /api/journal', '/api/journal')
+        return [item['id'] for item in data.get('items', [])]
+
+    def plan_ids(self):
+        _, data = self.get_json('GET /api/plans', '/api/plans')
+        return [item['id'] for item in data.get('items', [])]
+
+    def browse(self):
+        path = self.rng.choice(['/', '/dashboard', '/profile', '/journal', '/preventative_actions',
+                                '/nutrition', '/sports_recovery', '/reports'])
+        self.get(f'GET {path}', path)
+
+    def chart(self):
+        resolution = self.rng.choice(['daily', 'weekly', 'monthly'])
+        self.get('GET /journal/data', f'/journal/data?resolution={resolution}')
+
+    def trends(self):
+        self.get_json('GET /journal/trends', '/journal/trends')
+
+    def page_listings(self):
+        _, data = self.get_json('GET /api/journal', '/api/journal?per_page=5')
+        if data.get('next_cursor'):
+            self.get_json('GET /api/journal', f"/api/journal?per_page=5&cursor={data['next_cursor']}")
+        self.get_json('GET /api/plans', f"/api/plans?plan_type={self.rng.choice(['general', 'nutrition', 'sports'])}")
+
+    def edit_journal(self):
+        self.add_journal_entry()
+        ids = self.journal_ids()
+        if len(ids) > 5:
+            self.post('POST /journal/delete/<id>', f'/journal/delete/{ids[0]}', form={})
+
+    def edit_profile_lists(self):
+        self.post('POST /add_activity', '/add_activity', form={'name': 'Cycling', 'intensity': 'low'})
+        self.post('POST /add_allergy', '/add_allergy', form={'food_item': 'Shellfish', 'severity': 'moderate'})
+
+        _, body = self.get('GET /profile', '/profile')
+        page = body.decode('utf-8', errors='replace')
+        activities = re.findall(r'/delete_activity/(\d+)', page)
+        allergies = re.findall(r'/delete_allergy/(\d+)', page)
+        if len(activities) > 1:
+            self.post('POST /delete_activity/<id>', f'/delete_activity/{activities[-1]}', form={})
+        if len(allergies) > 1:
+            self.post('POST /delete_allergy/<id>', f'/delete_allergy/{allergies[-1]}', form={})
+
+    def generate_plan(self):
+        endpoint, label = self.rng.choice([
+            ('/generate_recovery_plan', 'POST /generate_recovery_plan'),
+            ('/generate_nutrition_plan', 'POST /generate_nutrition_plan'),
+            ('/generate_sports_plan', 'POST /generate_sports_plan'),
+        ])
+        form = {'symptom_ids': self.journal_ids()[:3]}
+        if endpoint == '/generate_sports_plan':
+            _, body = self.get('GET /sports_recovery', '/sports_recovery')
+            form['activity_ids'] = re.findall(r'name="activity_ids" value="(\d+)"', body.decode('utf-8', errors='replace'))[:1]
+
+        status, body = self.post(label, endpoint, form=form, headers={'X-Requested-With': 'XMLHttpRequest'})
+        if status == 202:
+            job = self.poll('GET /jobs/<id>', json.loads(body)['status_url'])
+            if job.get('plan_url'):
+                self.get('GET /view_plan/<id>', job['plan_url'])
+
+    def view_plan(self):
+        ids = self.plan_ids()
+        if ids:
+            self.get('GET /view_plan/<id>', f'/view_plan/{self.rng.choice(ids)}')
+
+    def report(self):
+        form = {'journal_ids': self.journal_ids()[:10], 'plan_ids': self.plan_ids()[:3], 'report_title': 'Load test report'}
+        status, body = self.post('POST /generate_report', '/generate_report', form=form)
+        if status != 200:
+            return
+        data = json.loads(body)
+        if not data.get('success'):
+            return
+
+        self.poll('GET /reports/<id>/status', data['status_url'])
+        self.get('GET /reports/<id>.pdf', data['pdf_url'])
+        etag = self.last_headers.get('ETag')
+        self.get('GET /reports/<id>.json', data['data_url'])
+
+        # Repeat downloads: revalidation from the browser cache and a resumed range
+        if etag:
+            self.get('GET /reports/<id>.pdf (revalidate)', data['pdf_url'], headers={'If-None-Match': etag})
+        self.get('GET /reports/<id>.pdf (range)', data['pdf_url'], headers={'Range': 'bytes=0-1023'})
+
+    def anonymous(self):
+        self.refresh_csrf('GET /anonymous-symptom', '/anonymous-symptom')
+        form = {'symptom': self.rng.choice(SYMPTOMS), 'severity': self.rng.randint(1, 10), 'description': 'Load test'}
+        if self.rng.random() < 0.5:
+            self.post('POST /anonymous-symptom', '/anonymous-symptom', form=form)
+        else:
+            self.post('POST /anonymous-symptom/stream', '/anonymous-symptom/stream', form=form)
+        self.refresh_csrf('GET /journal', '/journal')
+
+    def batch(self):
+        if not self.api_key:
+            return
+        records = [{'id': i, 'symptom': self.rng.choice(SYMPTOMS), 'severity': self.rng.randint(1, 10)} for i in range(20)]
+        self.request('POST /api/anonymous-symptom/batch', 'POST', '/api/anonymous-symptom/batch',
+                     json_body={'records': records}, headers={'X-API-Key': self.api_key})
+
+    def sign_out(self):
+        self.get('GET /logout', '/logout')
+
+
+# (action, weight): cheap reads dominate, as in normal use
+ACTIONS = [
+    (VirtualUser.browse, 30),
+    (VirtualUser.chart, 10),
+    (VirtualUser.trends, 5),
+    (VirtualUser.page_listings, 10),
+    (VirtualUser.view_plan, 8),
+    (VirtualUser.edit_journal, 8),
+    (VirtualUser.edit_profile_lists, 3),
+    (VirtualUser.generate_plan, 5),
+    (VirtualUser.report, 4),
+    (VirtualUser.anonymous, 5),
+    (VirtualUser.batch, 1),
+]
+
+
+async def run_user(user, deadline, think_time):
+    loop = asyncio.get_running_loop()
+    actions, weights = zip(*ACTIONS)
+
+    await loop.run_in_executor(None, user.sign_up)
+    while loop.time() < deadline:
+        action = user.rng.choices(actions, weights)[0]
+        await loop.run_in_executor(None, action, user)
+        if think_time:
+            await asyncio.sleep(user.rng.expovariate(1 / think_time))
+    await loop.run_in_executor(None, user.sign_out)
+
+
+async def run(args):
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=args.users))
+
+    stats = Stats()
+    deadline = loop.time() + args.duration
+    users = [VirtualUser(args.url, stats, args.api_key) for _ in range(args.users)]
+
+    tasks = []
+    for user in users:
+        tasks.append(asyncio.create_task(run_user(user, deadline, args.think_time)))
+        # Ramp up gradually instead of registering everyone at once
+        await asyncio.sleep(args.ramp_up / max(1, args.users))
+
+    await asyncio.gather(*tasks)
+    stats.finished = time.perf_counter()
+    return stats.summary()
+
+
+def print_report(summary):
+    print(f"\nElapsed {summary['elapsed']:.1f}s\n")
+    header = f"{'route':<44} {'reqs':>7} {'err':>5} {'shed':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}"
+    print(header)
+    print('-' * len(header))
+    for label, row in summary['routes'].items():
+        print(f"{label:<44} {row['requests']:>7} {row['errors']:>5} {row['shed']:>5} {row['rps']:>8.2f} "
+              f"{row['p50_ms']:>8.0f} {row['p95_ms']:>8.0f} {row['p99_ms']:>8.0f} {row['max_ms']:>8.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='Base URL of the running server')
+    parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=60, help='Test duration in seconds')
+    parser.add_argument('--ramp-up', type=float, default=5, help='Seconds over which users are started')
+    parser.add_argument('--think-time', type=float, default=0.5, help='Mean pause between actions in seconds (0 for none)')
+    parser.add_argument('--api-key', help='Clinic API key, enables the batch endpoint')
+    parser.add_argument('--json', help='Also write the summary to this file')
+    args = parser.parse_args()
+
+    summary = asyncio.run(run(args))
+    print_report(summary)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    return 1 if summary['routes']['TOTAL']['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
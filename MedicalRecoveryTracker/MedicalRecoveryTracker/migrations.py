@@ -0,0 +1,70 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+
+def ensure_indexes(engine, metadata):
+    """
+    Create any index declared on the models that is missing from an existing table.
+    db.create_all() only creates indexes together with new tables, so this brings
+    databases created before an index was added up to date. Safe to run on every start.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                created.append(index.name)
+
+    if created:
+        logging.info(f"Created missing indexes: {', '.join(created)}")
+    return created
+
+
+def ensure_columns(engine, metadata):
+    """
+    Add columns declared on the models that are missing from an existing table.
+    Only columns that are nullable or have a server default can be added to tables
+    that already hold rows; anything else is logged and left for a manual migration.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+
+    for table in metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+
+            if not column.nullable and column.server_default is None:
+                logging.error(f"Cannot add column {table.name}.{column.name} automatically: NOT NULL without a server default")
+                continue
+
+            ddl = (f"ALTER TABLE {preparer.format_table(table)} "
+                   f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}")
+            if column.server_default is not None:
+                default = column.server_default.arg
+                default = default.text if hasattr(default, 'text') else "'" + str(default).replace("'", "''") + "'"
+                ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+
+            with engine.begin() as connection:
+                connection.execute(text(ddl))
+            added.append(f"{table.name}.{column.name}")
+
+    if added:
+        logging.info(f"Added missing columns: {', '.join(added)}")
+    return added
@@ -1,5 +1,11 @@
+import os
+
 from app import db
+from cache import MemoryBackend
+from sqlalchemy import update, insert
+from sqlalchemy.dialects import postgresql, sqlite
 from flask_login import UserMixin
+import json
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
@@ -39,8 +45,70 @@ class User(UserMixin, db.Model):
         return None
 
 
+# Per-worker cache of the logged-in users' snapshots, and how long (seconds) one is trusted
+USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 4096))
+USER_CACHE_TTL = float(os.environ.get("USER_CACHE_TTL", 60))
+
+user_snapshots = MemoryBackend(USER_CACHE_SIZE)
+
+
+class UserSnapshot:
+    """
+    Read-only copy of a user's profile columns, used as current_user so that
+    authenticated requests do not load a User row. Code that changes the user
+    loads the User itself and calls UserSnapshot.forget() afterwards.
+    """
+    __slots__ = ('id', 'email', 'first_name', 'last_name', 'age', 'gender', 'weight', 'height')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
+
+    def __init__(self, id, email, first_name, last_name, age, gender, weight, height):
+        self.id = id
+        self.email = email
+        self.first_name = first_name
+        self.last_name = last_name
+        self.age = age
+        self.gender = gender
+        self.weight = weight
+        self.height = height
+
+    def get_id(self):
+        return str(self.id)
+
+    calculate_bmi = User.calculate_bmi
+
+    @classmethod
+    def load(cls, user_id):
+        """
+        The cached snapshot of a user, read from the database on a miss; None if the user does not exist
+        """
+        snapshot = user_snapshots.get(user_id)
+        if snapshot is None:
+            row = db.session.execute(
+                db.select(*(getattr(User, column) for column in cls.__slots__)).where(User.id == user_id)
+            ).first()
+            if row is None:
+                return None
+            snapshot = cls(*row)
+            user_snapshots.set(user_id, snapshot, ttl=USER_CACHE_TTL)
+        return snapshot
+
+    @staticmethod
+    def forget(user_id):
+        """
+        Drop this worker's snapshot after the user's profile changed
+        """
+        user_snapshots.delete(user_id)
+
+
 class MedicalJournal(db.Model):
     __tablename__ = 'medical_journals'
+    __table_args__ = (
+        # Journal listings and keyset pages: WHERE user_id ORDER BY date_experienced DESC, id DESC
+        db.Index('ix_medical_journals_user_date', 'user_id', db.text('date_experienced DESC'), db.text('id DESC')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -63,6 +131,9 @@ class MedicalJournal(db.Model):
 
 class AthleticActivity(db.Model):
     __tablename__ = 'athletic_activities'
+    __table_args__ = (
+        db.Index('ix_athletic_activities_user', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -75,6 +146,9 @@ class AthleticActivity(db.Model):
 
 class FoodAllergy(db.Model):
     __tablename__ = 'food_allergies'
+    __table_args__ = (
+        db.Index('ix_food_allergies_user', 'user_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -86,6 +160,11 @@ class FoodAllergy(db.Model):
 
 class RecoveryPlan(db.Model):
     __tablename__ = 'recovery_plans'
+    __table_args__ = (
+        # Plan listings by type and the all-plans listing in reports, newest first
+        db.Index('ix_recovery_plans_user_type_created', 'user_id', 'plan_type', db.text('created_at DESC'), db.text('id DESC')),
+        db.Index('ix_recovery_plans_user_created', 'user_id', db.text('created_at DESC'), db.text('id DESC')),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -96,7 +175,8 @@ class RecoveryPlan(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
-    recommendations = db.relationship('Recommendation', backref='recovery_plan', lazy=True, cascade="all, delete-orphan")
+    recommendations = db.relationship('Recommendation', backref='recovery_plan', lazy=True, cascade="all, delete-orphan",
+                                      order_by='(Recommendation.priority, Recommendation.id)')
     def __init__(
         self,
         user_id: int,
@@ -111,9 +191,62 @@ class RecoveryPlan(db.Model):
         self.plan_type = plan_type
         self.ai_generated = ai_generated
 
+    @classmethod
+    def insert_many(cls, plans, chunk_size=1000):
+        """
+        Insert plans and their recommendations in the current transaction with one
+        INSERT ... RETURNING per chunk of plans and one executemany per chunk of
+        recommendations. Each plan is a dict with user_id, title, description,
+        plan_type, optional ai_generated, created_at (e.g. for imported history) and
+        recommendation_type (overriding each item's "type"), and a list of
+        recommendation dicts as the model returns them.
+        Returns the new plan IDs in input order.
+        """
+        # PostgreSQL returns IDs in parameter order within batched statements. SQLite
+        # cannot, but as a single writer it numbers the rows of one INSERT in order.
+        sqlite = db.engine.dialect.name == 'sqlite'
+        # Every row needs the same columns in a batched INSERT, so the default is filled in here
+        now = datetime.utcnow()
+
+        plan_ids = []
+        for start in range(0, len(plans), chunk_size):
+            chunk = plans[start:start + chunk_size]
+            ids = db.session.execute(
+                insert(cls).returning(cls.id, sort_by_parameter_order=not sqlite),
+                [{
+                    'user_id': plan['user_id'],
+                    'title': plan['title'],
+                    'description': plan.get('description', ''),
+                    'plan_type': plan.get('plan_type', 'general'),
+                    'ai_generated': plan.get('ai_generated', True),
+                    'created_at': plan.get('created_at') or now,
+                } for plan in chunk]
+            ).scalars().all()
+            if sqlite:
+                ids = sorted(ids)
+
+            recommendations = [{
+                'recovery_plan_id': plan_id,
+                'title': rec['title'],
+                'description': rec.get('description', ''),
+                'recommendation_type': plan.get('recommendation_type') or rec.get('type', ''),
+                'priority': rec.get('priority', 1),
+            } for plan_id, plan in zip(ids, chunk) for rec in plan.get('recommendations', [])]
+            if recommendations:
+                db.session.execute(insert(Recommendation), recommendations)
+
+            plan_ids.extend(ids)
+
+        for user_id in {plan['user_id'] for plan in plans}:
+            DataVersion.bump(user_id, plans=True)
+        return plan_ids
+
 
 class Recommendation(db.Model):
     __tablename__ = 'recommendations'
+    __table_args__ = (
+        db.Index('ix_recommendations_plan_priority', 'recovery_plan_id', 'priority'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     recovery_plan_id = db.Column(db.Integer, db.ForeignKey('recovery_plans.id'), nullable=False)
@@ -135,3 +268,158 @@ class Recommendation(db.Model):
         self.description = description
         self.recommendation_type = recommendation_type
         self.priority = priority
+
+
+class AIResponseCache(db.Model):
+    __tablename__ = 'ai_response_cache'
+
+    key = db.Column(db.String(64), primary_key=True)  # sha256 of prompt, model and config
+    value = db.Column(db.Text, nullable=False)  # parsed JSON response
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, index=True)
+    last_accessed_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    hits = db.Column(db.Integer, default=0)
+
+
+class GenerationJob(db.Model):
+    __tablename__ = 'generation_jobs'
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    job_type = db.Column(db.String(50), nullable=False)  # e.g., "general", "sports", "nutrition"
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, completed, failed
+    payload = db.Column(db.Text)  # JSON-encoded job input
+    recovery_plan_id = db.Column(db.Integer, db.ForeignKey('recovery_plans.id', ondelete='SET NULL'))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'status': self.status,
+            'recovery_plan_id': self.recovery_plan_id,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
+class Report(db.Model):
+    __tablename__ = 'reports'
+    __table_args__ = (
+        # One report per distinct content; repeat requests reuse the built artifact
+        db.UniqueConstraint('user_id', 'content_key', name='uq_reports_user_content'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)  # uuid4 hex
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    content_key = db.Column(db.String(64), nullable=False)  # sha256 of user, selected IDs, data versions and title
+    title = db.Column(db.String(200), nullable=False)
+    journal_ids = db.Column(db.Text)  # JSON-encoded list of selected journal IDs
+    plan_ids = db.Column(db.Text)  # JSON-encoded list of selected plan IDs
+    generated_date = db.Column(db.String(10), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending, running, completed, failed
+    pdf_size = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'title': self.title,
+            'status': self.status,
+            'generated_date': self.generated_date,
+            'pdf_size': self.pdf_size,
+            'error': self.error,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'updated_at': self.updated_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
+class PlanTemplate(db.Model):
+    __tablename__ = 'plan_templates'
+    __table_args__ = (
+        # One template per plan type and symptom signature; repeat generations bump `sources`
+        db.UniqueConstraint('plan_type', 'feature_key', name='uq_plan_templates_type_features'),
+        db.Index('ix_plan_templates_type_vetted', 'plan_type', 'vetted'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    plan_type = db.Column(db.String(50), nullable=False)
+    feature_key = db.Column(db.String(64), nullable=False)  # sha256 of the sorted features
+    features = db.Column(db.Text, nullable=False)  # JSON-encoded sorted list of symptom/severity/context features
+    required = db.Column(db.Text)  # JSON-encoded features a request must share exactly (e.g. food allergies)
+    title = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text)
+    recommendations = db.Column(db.Text, nullable=False)  # JSON-encoded list of recommendation dicts
+    source_plan_id = db.Column(db.Integer, db.ForeignKey('recovery_plans.id', ondelete='SET NULL'))
+    sources = db.Column(db.Integer, nullable=False, default=1)  # generations that produced this signature
+    vetted = db.Column(db.Boolean, nullable=False, default=False)  # only vetted templates are served
+    uses = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime)
+
+    def serialize(self):
+        return {
+            'id': self.id,
+            'plan_type': self.plan_type,
+            'title': self.title,
+            'features': json.loads(self.features),
+            'sources': self.sources,
+            'vetted': self.vetted,
+            'uses': self.uses,
+            'created_at': self.created_at.strftime('%Y-%m-%d %H:%M:%S')
+        }
+
+
+# INSERT constructs with ON CONFLICT support, per dialect
+UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+class DataVersion(db.Model):
+    __tablename__ = 'data_versions'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    journal_version = db.Column(db.Integer, nullable=False, default=0)  # bumped when journal entries change
+    plan_version = db.Column(db.Integer, nullable=False, default=0)  # bumped when recovery plans change
+    profile_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')  # bumped when activities or allergies change
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Return the user's (journal_version, plan_version), (0, 0) if nothing has changed yet"""
+        return cls.versions(user_id)[:2]
+
+    @classmethod
+    def versions(cls, user_id):
+        """Return the user's (journal_version, plan_version, profile_version)"""
+        version = db.session.get(cls, user_id)
+        if version is None:
+            return (0, 0, 0)
+        return (version.journal_version, version.plan_version, version.profile_version)
+
+    @classmethod
+    def bump(cls, user_id, journal=False, plans=False, profile=False):
+        """Invalidate cached data derived from the user's journal, plans and/or profile, as part of the current transaction"""
+        values = {}
+        if journal:
+            values['journal_version'] = cls.journal_version + 1
+        if plans:
+            values['plan_version'] = cls.plan_version + 1
+        if profile:
+            values['profile_version'] = cls.profile_version + 1
+        if not values:
+            return
+
+        # One upsert, so two first writes for the same user cannot both try to insert the row
+        upsert = UPSERT_INSERTS[db.engine.dialect.name](cls).values(
+            user_id=user_id,
+            journal_version=int(journal),
+            plan_version=int(plans),
+            profile_version=int(profile))
+        db.session.execute(upsert.on_conflict_do_update(index_elements=[cls.user_id], set_=values))
@@ -0,0 +1,153 @@
+"""
+Rendered HTML caching for the signed-in pages.
+
+Pages decorated with cached_page get an ETag derived from the user, their data
+versions (see models.DataVersion) and the deployed templates, so a repeat visit
+with nothing changed is answered with 304 or a stored copy without running the
+view. Inside templates, {% cache name, key... %}...{% endcache %} stores a
+rendered block under its name and keys, e.g. static copy under its name alone
+and per-user lists under the user and the version of the data they show:
+
+    {% cache 'dashboard-symptoms', current_user.id, data_versions.journal %}
+"""
+import os
+import hashlib
+import functools
+from collections import namedtuple
+
+from flask import g, request, session, make_response, current_app
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+
+from cache import MemoryBackend
+
+PAGE_CACHE_ENABLED = os.environ.get("PAGE_CACHE_ENABLED", "1") == "1"
+
+# Entries kept in this process and seconds before they expire
+PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 1024))
+PAGE_CACHE_TTL = float(os.environ.get("PAGE_CACHE_TTL", 600))
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", 4096))
+
+page_cache = MemoryBackend(PAGE_CACHE_SIZE)
+fragment_cache = MemoryBackend(FRAGMENT_CACHE_SIZE)
+
+# User fields rendered by the cached pages (name in the navigation, BMI and profile prompt on the dashboard)
+USER_FIELDS = ('id', 'email', 'first_name', 'last_name', 'age', 'gender', 'weight', 'height')
+
+_template_version = None
+
+
+Versions = namedtuple('Versions', ['journal', 'plans', 'profile'])
+
+
+def current_versions():
+    """
+    Data versions of the signed-in user, read once per request
+    """
+    if 'data_versions' not in g:
+        from models import DataVersion
+        user_id = current_user.id if current_user.is_authenticated else None
+        g.data_versions = Versions(*DataVersion.versions(user_id)) if user_id is not None else Versions(0, 0, 0)
+    return g.data_versions
+
+
+data_versions = LocalProxy(current_versions)
+
+
+def template_version(app):
+    """
+    Hash of the template files' names, sizes and modification times, so a deploy
+    that changes a template changes every ETag and fragment key
+    """
+    global _template_version
+    if _template_version is not None and not app.jinja_env.auto_reload:
+        return _template_version
+
+    digest = hashlib.sha256()
+    root = os.path.join(app.root_path, app.template_folder)
+    for directory, _, files in sorted(os.walk(root)):
+        for name in sorted(files):
+            stat = os.stat(os.path.join(directory, name))
+            digest.update(f"{os.path.relpath(os.path.join(directory, name), root)}:{stat.st_size}:{stat.st_mtime_ns};".encode('utf-8'))
+    _template_version = digest.hexdigest()[:16]
+    return _template_version
+
+
+class FragmentCacheExtension(Extension):
+    """
+    {% cache name, key... %}body{% endcache %}: render body once per distinct name and keys
+    """
+
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', [nodes.List(parts)]), [], [], body).set_lineno(lineno)
+
+    def _render(self, parts, caller):
+        if not PAGE_CACHE_ENABLED:
+            return caller()
+
+        key = (template_version(current_app),) + tuple(parts)
+        html = fragment_cache.get(key)
+        if html is None:
+            html = caller()
+            fragment_cache.set(key, html, ttl=PAGE_CACHE_TTL)
+        return Markup(html)
+
+
+def page_etag():
+    """
+    ETag of the current page for the signed-in user: changes whenever anything it renders may have
+    """
+    user = tuple(getattr(current_user, field) for field in USER_FIELDS)
+    payload = repr((request.endpoint, request.full_path, user, tuple(current_versions()), template_version(current_app)))
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+def cached_page(view):
+    """
+    Serve a signed-in page with an ETag: 304 when the browser's copy is current,
+    the stored copy when this process rendered it already, otherwise run the view
+    and keep its successful responses. Requests carrying flashed messages
+    always render, since the messages are shown once.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not PAGE_CACHE_ENABLED or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        etag = page_etag()
+        if etag in request.if_none_match:
+            return _conditional(make_response('', 304), etag)
+
+        cached = page_cache.get(etag)
+        if cached is not None:
+            body, mimetype = cached
+            return _conditional(make_response(body, 200, {'Content-Type': mimetype}), etag)
+
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough:
+            page_cache.set(etag, (response.get_data(), response.content_type), ttl=PAGE_CACHE_TTL)
+            _conditional(response, etag)
+        return response
+    return wrapper
+
+
+def _conditional(response, etag):
+    response.set_etag(etag)
+    # Personal pages: browsers may keep a copy but must revalidate it on every visit
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def init_app(app):
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.context_processor(lambda: {'data_versions': data_versions})
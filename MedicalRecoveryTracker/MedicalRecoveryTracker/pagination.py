@@ -0,0 +1,84 @@
+import json
+import base64
+from datetime import date, datetime
+
+from sqlalchemy import and_, or_
+
+PER_PAGE = 20
+MAX_PER_PAGE = 100
+
+
+class Page:
+    """
+    One page of a keyset-paginated listing. Iterates over its items so
+    templates can use it like the list it replaces.
+    """
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def encode_cursor(sort_value, row_id):
+    """
+    Opaque, URL-safe cursor pointing just past the given row
+    """
+    payload = json.dumps([sort_value.isoformat(), row_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, sort_column):
+    """
+    Decode a cursor into (sort_value, row_id), raising ValueError if it is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+
+        # Only what encode_cursor produces: [ISO date string, integer ID]
+        if not (isinstance(payload, list) and len(payload) == 2):
+            raise ValueError('Cursor is not a [sort value, ID] pair')
+        sort_value, row_id = payload
+        if not isinstance(sort_value, str) or not isinstance(row_id, int) or isinstance(row_id, bool):
+            raise ValueError('Cursor holds values of the wrong types')
+
+        if sort_column.type.python_type is datetime:
+            return datetime.fromisoformat(sort_value), row_id
+        return date.fromisoformat(sort_value), row_id
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError('Invalid page cursor') from e
+
+
+def keyset_paginate(query, sort_column, id_column, cursor=None, per_page=PER_PAGE):
+    """
+    Return a Page of query results ordered newest first by (sort_column, id_column),
+    seeking past the cursor instead of using OFFSET so every page costs the same
+    """
+    per_page = max(1, min(per_page, MAX_PER_PAGE))
+
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor, sort_column)
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        ))
+
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return Page(rows, next_cursor)
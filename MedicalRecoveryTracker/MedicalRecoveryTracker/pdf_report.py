@@ -0,0 +1,454 @@
+import zlib
+
+# A4 portrait in millimetres, matching the layout of the old jsPDF report
+PAGE_WIDTH = 210
+PAGE_HEIGHT = 297
+MM = 72 / 25.4  # PDF points per millimetre
+
+LEFT = 20
+RIGHT = 190
+CENTER = 105
+BOTTOM = 270  # last baseline before the footer area
+FOOTER_Y = 287
+
+# Column widths (mm) of the wrapped journal table cells
+JOURNAL_SYMPTOM_WIDTH = 66
+JOURNAL_DESCRIPTION_WIDTH = 50
+
+PRIMARY = (30, 136, 229)
+DARK = (60, 60, 60)
+MUTED = (100, 100, 100)
+HEADER_GREY = (80, 80, 80)
+RULE = (200, 200, 200)
+LIGHT_RULE = (230, 230, 230)
+
+# Fixed object numbers; pages and their content streams are numbered from FIRST_PAGE_OBJECT
+CATALOG, PAGES, FONT_REGULAR, FONT_BOLD, PAGE_TOTAL = 1, 2, 3, 4, 5
+FIRST_PAGE_OBJECT = 6
+
+# Advance widths (1/1000 em) of the standard Helvetica fonts for characters 32-126
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+GENDERS = {
+    'male': 'Male',
+    'female': 'Female',
+    'other': 'Other',
+    'prefer_not_to_say': 'Prefer not to say'
+}
+
+PLAN_TYPES = {
+    'general': 'General Recovery',
+    'nutrition': 'Nutrition Plan',
+    'sports': 'Sports Recovery'
+}
+
+PRIORITIES = {1: 'High Priority', 2: 'Medium Priority'}
+
+
+def text_width(text, size, bold=False):
+    """
+    Width of a string in millimetres when set in Helvetica at the given point size
+    """
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    units = sum(widths[ord(c) - 32] if 32 <= ord(c) <= 126 else 556 for c in text)
+    return units * size / 1000 / MM
+
+
+def wrap_text(text, width, size, bold=False):
+    """
+    Split text into lines no wider than width millimetres, breaking on spaces
+    and splitting words that do not fit on a line of their own
+    """
+    lines = []
+    for paragraph in (text or '').splitlines() or ['']:
+        line = ''
+        for word in paragraph.split():
+            candidate = f'{line} {word}' if line else word
+            if text_width(candidate, size, bold) <= width:
+                line = candidate
+                continue
+
+            if line:
+                lines.append(line)
+            # Hard-break words longer than a whole line
+            while text_width(word, size, bold) > width and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and text_width(word[:cut], size, bold) > width:
+                    cut -= 1
+                lines.append(word[:cut])
+                word = word[cut:]
+            line = word
+        lines.append(line)
+    return lines
+
+
+def _escape(text):
+    encoded = str(text).encode('cp1252', errors='replace')
+    return encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def _color(rgb):
+    return ' '.join(f'{c / 255:.3f}' for c in rgb)
+
+
+class PDFStream:
+    """
+    Minimal PDF writer that emits each page as soon as it is finished.
+
+    Only the current page's drawing operations and the byte offsets of written
+    objects are kept in memory, so output size does not bound memory use. The
+    total page count is drawn through a form XObject written after the last
+    page, which is how "Page i of N" footers work without buffering the document.
+    """
+
+    def __init__(self):
+        self.offset = 0
+        self.offsets = {}
+        self.page_ids = []
+        self.next_id = FIRST_PAGE_OBJECT
+        self.ops = []
+        self.pending = []
+        self.page_number = 0
+        self.page_open = False
+        self.footer = None
+
+        self._write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+
+    def _write(self, data):
+        self.offset += len(data)
+        self.pending.append(data)
+
+    def _object(self, object_id, body, stream=None):
+        self.offsets[object_id] = self.offset
+        self._write(f'{object_id} 0 obj\n'.encode('ascii'))
+        if stream is None:
+            self._write(body + b'\nendobj\n')
+        else:
+            self._write(body + b'\nstream\n' + stream + b'\nendstream\nendobj\n')
+
+    def drain(self):
+        """
+        Return and forget the bytes produced since the last call
+        """
+        data = b''.join(self.pending)
+        self.pending = []
+        return data
+
+    # Drawing, in millimetres from the top-left corner like jsPDF
+
+    def text(self, x, y, text, size=11, bold=False, color=DARK, align='left'):
+        if align != 'left':
+            width = text_width(text, size, bold)
+            x -= width if align == 'right' else width / 2
+        font = 'F2' if bold else 'F1'
+        self.ops.append(b'BT /%s %g Tf %s rg %.2f %.2f Td (%s) Tj ET' % (
+            font.encode('ascii'), size, _color(color).encode('ascii'),
+            x * MM, (PAGE_HEIGHT - y) * MM, _escape(text)))
+
+    def line(self, x1, y1, x2, y2, color=RULE, width=0.2):
+        self.ops.append(b'%s RG %.2f w %.2f %.2f m %.2f %.2f l S' % (
+            _color(color).encode('ascii'), width * MM,
+            x1 * MM, (PAGE_HEIGHT - y1) * MM, x2 * MM, (PAGE_HEIGHT - y2) * MM))
+
+    def page_total(self, x, y):
+        """
+        Draw the document's final page count at (x, y)
+        """
+        self.ops.append(b'q 1 0 0 1 %.2f %.2f cm /Total Do Q' % (x * MM, (PAGE_HEIGHT - y) * MM))
+
+    # Pages
+
+    def new_page(self):
+        if self.page_open:
+            self.end_page()
+        self.page_number += 1
+        self.page_open = True
+        self.ops = []
+
+    def end_page(self):
+        if self.footer:
+            self.footer(self)
+
+        content_id, page_id = self.next_id, self.next_id + 1
+        self.next_id += 2
+
+        content = zlib.compress(b'\n'.join(self.ops))
+        self._object(content_id, b'<< /Length %d /Filter /FlateDecode >>' % len(content), content)
+        self._object(page_id, (
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Contents %d 0 R '
+            b'/Resources << /Font << /F1 %d 0 R /F2 %d 0 R >> /XObject << /Total %d 0 R >> >> >>'
+        ) % (PAGES, PAGE_WIDTH * MM, PAGE_HEIGHT * MM, content_id, FONT_REGULAR, FONT_BOLD, PAGE_TOTAL))
+
+        self.page_ids.append(page_id)
+        self.page_open = False
+        self.ops = []
+
+    def close(self, total_size=8, total_color=MUTED):
+        """
+        Finish the last page and write the shared objects, page tree and cross-reference table
+        """
+        if not self.page_open and not self.page_ids:
+            self.new_page()
+        if self.page_open:
+            self.end_page()
+
+        for object_id, base_font in ((FONT_REGULAR, b'Helvetica'), (FONT_BOLD, b'Helvetica-Bold')):
+            self._object(object_id, b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % base_font)
+
+        total = b'BT /F1 %g Tf %s rg 0 0 Td (%d) Tj ET' % (total_size, _color(total_color).encode('ascii'), len(self.page_ids))
+        self._object(PAGE_TOTAL, (
+            b'<< /Type /XObject /Subtype /Form /BBox [0 -10 100 20] '
+            b'/Resources << /Font << /F1 %d 0 R >> >> /Length %d >>'
+        ) % (FONT_REGULAR, len(total)), total)
+
+        kids = b' '.join(b'%d 0 R' % page_id for page_id in self.page_ids)
+        self._object(PAGES, b'<< /Type /Pages /Kids [%s] /Count %d >>' % (kids, len(self.page_ids)))
+        self._object(CATALOG, b'<< /Type /Catalog /Pages %d 0 R >>' % PAGES)
+
+        xref_offset = self.offset
+        size = self.next_id
+        rows = [b'xref\n0 %d\n' % size, b'0000000000 65535 f \n']
+        for object_id in range(1, size):
+            rows.append(b'%010d 00000 n \n' % self.offsets[object_id])
+        self._write(b''.join(rows))
+        self._write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, CATALOG, xref_offset))
+
+
+class ReportLayout:
+    """
+    Flows the report sections down the page, starting new pages as needed
+    """
+
+    def __init__(self, pdf, generated_date):
+        self.pdf = pdf
+        self.generated_date = generated_date
+        self.y = 20
+        pdf.footer = self.footer
+        pdf.new_page()
+
+    def ensure_space(self, height, limit=BOTTOM):
+        if self.y + height > limit:
+            self.pdf.new_page()
+            self.y = 20
+
+    def footer(self, pdf):
+        label = f'Page {pdf.page_number} of '
+        pdf.text(LEFT, FOOTER_Y, label, size=8, color=MUTED)
+        pdf.page_total(LEFT + text_width(label, 8), FOOTER_Y)
+        pdf.text(CENTER, FOOTER_Y, 'Generated by MediTrack - Medical Recovery Planner', size=8, color=MUTED, align='center')
+        pdf.text(RIGHT, FOOTER_Y, self.generated_date, size=8, color=MUTED, align='right')
+
+    def header(self, title):
+        self.pdf.text(CENTER, 20, title, size=22, color=PRIMARY, align='center')
+        self.pdf.text(CENTER, 28, f'Generated on: {self.generated_date}', size=12, color=MUTED, align='center')
+        self.pdf.line(LEFT, 32, RIGHT, 32, color=PRIMARY, width=0.5)
+        self.y = 40
+
+    def patient_info(self, user):
+        pdf = self.pdf
+        pdf.text(LEFT, self.y, 'Patient Information', size=16, color=PRIMARY)
+        self.y += 8
+
+        name = f"{user.first_name or ''} {user.last_name or ''}".strip() or 'Name not provided'
+        pdf.text(LEFT, self.y, f'Name: {name}')
+        self.y += 6
+        pdf.text(LEFT, self.y, f'Email: {user.email}')
+        self.y += 6
+
+        if user.age:
+            pdf.text(LEFT, self.y, f'Age: {user.age} years')
+        if user.gender:
+            pdf.text(CENTER, self.y, f'Gender: {GENDERS.get(user.gender, user.gender)}')
+        self.y += 6
+
+        if user.weight:
+            pdf.text(LEFT, self.y, f'Weight: {user.weight} kg')
+        if user.height:
+            pdf.text(CENTER, self.y, f'Height: {user.height} cm')
+        self.y += 6
+
+        bmi = user.calculate_bmi()
+        if bmi:
+            pdf.text(LEFT, self.y, f'BMI: {bmi}')
+        self.y += 6
+
+        pdf.line(LEFT, self.y + 2, RIGHT, self.y + 2)
+        self.y += 12
+
+    def trends(self, symptom_trends, rolling_window_days):
+        pdf = self.pdf
+        self.ensure_space(30)
+        pdf.text(LEFT, self.y, 'Symptom Trends', size=16, color=PRIMARY)
+        self.y += 8
+
+        columns = ((20, 'Symptom'), (85, 'Entries'), (105, f'{rolling_window_days}-day avg'),
+                   (130, 'Week over week'), (160, 'Trend'), (178, 'Flares'))
+        for x, label in columns:
+            pdf.text(x, self.y, label, size=10, bold=True, color=HEADER_GREY)
+        self.y += 5
+        pdf.line(LEFT, self.y, RIGHT, self.y)
+        self.y += 5
+
+        for trend in symptom_trends:
+            self.ensure_space(6)
+            delta = trend['week_over_week']['delta']
+            pdf.text(20, self.y, wrap_text(trend['symptom'], 62, 9)[0], size=9)
+            pdf.text(85, self.y, str(trend['entries']), size=9)
+            pdf.text(105, self.y, f"{trend['rolling_average']:.1f}/10", size=9)
+            pdf.text(130, self.y, '-' if delta is None else f'{delta:+.1f}', size=9)
+            pdf.text(160, self.y, (trend['trend'] or '-').capitalize(), size=9)
+            pdf.text(178, self.y, str(trend['flare_count']), size=9)
+            self.y += 6
+
+        self.section_end()
+
+    def journal_heading(self):
+        pdf = self.pdf
+        self.ensure_space(20)
+        pdf.text(LEFT, self.y, 'Medical Journal Entries', size=16, color=PRIMARY)
+        self.y += 8
+        self.journal_columns()
+
+    def journal_columns(self):
+        pdf = self.pdf
+        for x, label in ((20, 'Date'), (50, 'Symptom'), (120, 'Severity'), (140, 'Description')):
+            pdf.text(x, self.y, label, size=10, bold=True, color=HEADER_GREY)
+        self.y += 5
+        pdf.line(LEFT, self.y, RIGHT, self.y)
+        self.y += 5
+
+    def journal_entry(self, entry, first):
+        pdf = self.pdf
+        symptom_lines = wrap_text(entry.symptom, JOURNAL_SYMPTOM_WIDTH, 9)
+        lines = wrap_text(entry.description or 'No description provided', JOURNAL_DESCRIPTION_WIDTH, 9)
+        line_count = max(len(symptom_lines), len(lines))
+        row_height = line_count * 5
+
+        # Rows that fit on a page are kept together; taller rows start on any page
+        # with room for a line and continue on the next pages
+        page_room = BOTTOM - 20 - 10
+        needed = row_height if row_height <= page_room else 5
+        if self.y + needed > BOTTOM:
+            self.journal_page_break()
+        elif not first:
+            pdf.line(LEFT, self.y - 1, RIGHT, self.y - 1, color=LIGHT_RULE, width=0.1)
+
+        pdf.text(20, self.y, entry.date_experienced.strftime('%b %d, %Y'), size=9)
+        pdf.text(120, self.y, f'{entry.severity}/10', size=9)
+        for i in range(line_count):
+            if self.y + 5 > BOTTOM:
+                self.journal_page_break()
+            if i < len(symptom_lines):
+                pdf.text(50, self.y, symptom_lines[i], size=9)
+            if i < len(lines):
+                pdf.text(140, self.y, lines[i], size=9)
+            self.y += 5
+
+        self.y += 2
+
+    def journal_page_break(self):
+        self.pdf.new_page()
+        self.y = 20
+        self.journal_columns()
+
+    def section_end(self):
+        self.y += 5
+        self.pdf.line(LEFT, self.y, RIGHT, self.y)
+        self.y += 8
+
+    def plans_heading(self):
+        self.ensure_space(20, limit=250)
+        self.pdf.text(LEFT, self.y, 'Recovery Plans', size=16, color=PRIMARY)
+        self.y += 10
+
+    def plan(self, plan, first):
+        pdf = self.pdf
+        if not first:
+            pdf.line(LEFT, self.y, RIGHT, self.y)
+            self.y += 8
+
+        self.ensure_space(12, limit=250)
+        plan_type = PLAN_TYPES.get(plan.plan_type, plan.plan_type or 'General')
+        for line in wrap_text(f'{plan.title} ({plan_type})', 170, 12, bold=True):
+            pdf.text(LEFT, self.y, line, size=12, bold=True, color=PRIMARY)
+            self.y += 6
+
+        for line in wrap_text(plan.description, 170, 10):
+            self.ensure_space(5)
+            pdf.text(LEFT, self.y, line, size=10)
+            self.y += 5
+        self.y += 5
+
+        if plan.recommendations:
+            self.ensure_space(10)
+            pdf.text(LEFT, self.y, 'Recommendations:', size=11, bold=True)
+            self.y += 5
+
+            for rec in plan.recommendations:
+                self.ensure_space(9, limit=260)
+                priority = PRIORITIES.get(rec.priority, 'Low Priority')
+                for line in wrap_text(f'{rec.title} ({priority})', 165, 9, bold=True):
+                    pdf.text(25, self.y, line, size=9, bold=True)
+                    self.y += 5
+
+                for line in wrap_text(rec.description, 165, 9):
+                    self.ensure_space(4)
+                    pdf.text(25, self.y, line, size=9)
+                    self.y += 4
+                self.y += 4
+
+
+def render_report(title, user, journal_entries, recovery_plans, generated_date, symptom_trends=None):
+    """
+    Generate the report PDF as a sequence of byte chunks, one or more per finished page.
+
+    journal_entries and recovery_plans may be lazy iterables (e.g. a query using
+    yield_per); they are consumed once, in order, while pages are produced.
+    symptom_trends is a symptom_trends.symptom_trends() result, shown before the journal.
+    """
+    pdf = PDFStream()
+    layout = ReportLayout(pdf, generated_date)
+
+    layout.header(title)
+    layout.patient_info(user)
+    if symptom_trends and symptom_trends['symptoms']:
+        layout.trends(symptom_trends['symptoms'], symptom_trends['rolling_window_days'])
+    yield pdf.drain()
+
+    first = True
+    for entry in journal_entries:
+        if first:
+            layout.journal_heading()
+        layout.journal_entry(entry, first)
+        first = False
+        if pdf.pending:
+            yield pdf.drain()
+    if not first:
+        layout.section_end()
+
+    first = True
+    for plan in recovery_plans:
+        if first:
+            layout.plans_heading()
+        layout.plan(plan, first)
+        first = False
+        if pdf.pending:
+            yield pdf.drain()
+
+    pdf.close()
+    yield pdf.drain()
@@ -0,0 +1,290 @@
+"""
+Library of vetted plans reused for near-identical requests instead of calling the model.
+
+Every generated plan is offered to the library as a template keyed on its plan type
+and the normalized symptoms, severity bands and context (activities, allergies) it
+was generated for. Only vetted templates are served. Lookups go through an in-process
+MinHash LSH index, and candidates are confirmed by their exact Jaccard similarity.
+
+    python plan_library.py list [--unvetted] [--plan-type TYPE]
+    python plan_library.py vet ID [ID ...]
+    python plan_library.py retire ID [ID ...]
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app import app, db
+from models import PlanTemplate
+from prompt_builder import summarize_symptoms
+
+PLAN_LIBRARY_ENABLED = os.environ.get("PLAN_LIBRARY_ENABLED", "1") == "1"
+
+# Minimum Jaccard similarity between feature sets for a template to be served
+PLAN_LIBRARY_THRESHOLD = float(os.environ.get("PLAN_LIBRARY_THRESHOLD", 0.8))
+
+# Serve new templates without manual vetting (only sensible with a curated model setup)
+PLAN_LIBRARY_AUTO_VET = os.environ.get("PLAN_LIBRARY_AUTO_VET", "0") == "1"
+
+# Seconds before the index picks up templates vetted or retired by other processes
+PLAN_LIBRARY_REFRESH = float(os.environ.get("PLAN_LIBRARY_REFRESH", 60))
+
+# 16 bands of 4 rows find pairs above ~0.5 similarity with high probability
+NUM_PERMUTATIONS = 64
+ROWS_PER_BAND = 4
+
+_PRIME = (1 << 61) - 1
+_permutation_rng = random.Random(1729)
+PERMUTATIONS = [(_permutation_rng.randrange(1, _PRIME), _permutation_rng.randrange(0, _PRIME))
+                for _ in range(NUM_PERMUTATIONS)]
+
+
+def normalize(text):
+    # Letters and digits of any script are kept, so non-Latin symptoms keep their own features
+    return re.sub(r'[\W_]+', ' ', (text or '').casefold()).strip()
+
+
+def severity_band(severity):
+    if severity <= 3:
+        return 'mild'
+    if severity <= 6:
+        return 'moderate'
+    return 'severe'
+
+
+def plan_features(journal_entries, context=()):
+    """
+    Feature set describing a request: each symptom, its words and its latest severity band
+    """
+    features = set(context)
+    for summary in summarize_symptoms(journal_entries):
+        name = normalize(summary.name)
+        if not name:
+            continue
+        features.add(f"symptom:{name}")
+        features.add(f"severity:{name}:{severity_band(summary.latest_severity)}")
+        features.update(f"word:{word}" for word in name.split())
+    return frozenset(features)
+
+
+def feature_key(features):
+    return hashlib.sha256(json.dumps(sorted(features)).encode('utf-8')).hexdigest()
+
+
+def minhash(features):
+    hashes = [int.from_bytes(hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'big')
+              for feature in features]
+    return tuple(min((a * value + b) % _PRIME for value in hashes) for a, b in PERMUTATIONS)
+
+
+def jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+class PlanIndex:
+    """
+    MinHash LSH index over the vetted templates, reloaded from the database
+    every PLAN_LIBRARY_REFRESH seconds
+    """
+
+    def __init__(self, refresh=PLAN_LIBRARY_REFRESH):
+        self.refresh = refresh
+        self._buckets = {}
+        self._templates = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        rows = db.session.execute(
+            db.select(PlanTemplate.id, PlanTemplate.plan_type, PlanTemplate.features, PlanTemplate.required)
+            .where(PlanTemplate.vetted.is_(True))
+        ).all()
+
+        self._buckets = {}
+        self._templates = {}
+        for template_id, plan_type, features, required in rows:
+            self._add(template_id, plan_type, frozenset(json.loads(features)), frozenset(json.loads(required or '[]')))
+        self._loaded_at = time.monotonic()
+
+    def _add(self, template_id, plan_type, features, required):
+        self._templates[template_id] = (plan_type, features, required)
+        for band, key in enumerate(self._band_keys(minhash(features))):
+            self._buckets.setdefault((plan_type, band, key), set()).add(template_id)
+
+    def _band_keys(self, signature):
+        return [signature[start:start + ROWS_PER_BAND] for start in range(0, NUM_PERMUTATIONS, ROWS_PER_BAND)]
+
+    def add(self, template_id, plan_type, features, required=frozenset()):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._add(template_id, plan_type, features, required)
+
+    def find(self, plan_type, features, required=frozenset(), threshold=PLAN_LIBRARY_THRESHOLD):
+        """
+        (similarity, template ID) of the most similar vetted template, or None
+        """
+        with self._lock:
+            if self._loaded_at is None or time.monotonic() - self._loaded_at > self.refresh:
+                self._load()
+
+            candidates = set()
+            for band, key in enumerate(self._band_keys(minhash(features))):
+                candidates |= self._buckets.get((plan_type, band, key), set())
+
+            best = None
+            for template_id in candidates:
+                _, template_features, template_required = self._templates[template_id]
+                if template_required != required:
+                    continue
+                similarity = jaccard(features, template_features)
+                if similarity >= threshold and (best is None or similarity > best[0]):
+                    best = (similarity, template_id)
+            return best
+
+
+plan_index = PlanIndex()
+
+
+def find_template(plan_type, journal_entries, context=(), required=()):
+    """
+    Plan data from the closest vetted template for this request, personalized with
+    the user's symptom history, or None when nothing is similar enough.
+    `required` features (e.g. food allergies) must match the template exactly.
+    """
+    if not PLAN_LIBRARY_ENABLED or not journal_entries:
+        return None
+
+    features = plan_features(journal_entries, tuple(context) + tuple(required))
+    if not features:
+        return None
+
+    match = plan_index.find(plan_type, features, frozenset(required))
+    if match is None:
+        return None
+
+    similarity, template_id = match
+    template = db.session.get(PlanTemplate, template_id)
+    if template is None or not template.vetted:
+        # Retired since the index was loaded
+        return None
+
+    # Counted in the transaction that saves the plan
+    db.session.execute(
+        update(PlanTemplate).where(PlanTemplate.id == template_id)
+        .values(uses=PlanTemplate.uses + 1, last_used_at=datetime.utcnow()))
+
+    logging.info(f"Serving {plan_type} plan template {template_id} (similarity {similarity:.2f})")
+    return personalize(template, journal_entries)
+
+
+def personalize(template, journal_entries):
+    """
+    Template content with a short summary of the user's own symptom history appended
+    """
+    summaries = summarize_symptoms(journal_entries)
+    details = []
+    for summary in summaries[:5]:
+        severities = [severity for _, severity in summary.points]
+        low, high = min(severities), max(severities)
+        detail = f"{summary.name} (severity {low}/10" if low == high else f"{summary.name} (severity {low}-{high}/10"
+        trend = summary.trend()
+        detail += f", {trend})" if trend else ")"
+        details.append(detail)
+
+    description = template.description or ''
+    if details:
+        description = f"{description}\n\nBased on your journal: {'; '.join(details)}.".strip()
+
+    return {
+        'title': template.title,
+        'description': description,
+        'recommendations': json.loads(template.recommendations)
+    }
+
+
+def record_plan(plan_type, journal_entries, plan_data, plan_id, context=(), required=()):
+    """
+    Offer a freshly generated plan to the library. A template with the same signature
+    only has its source count bumped. Failures are logged and never affect the caller.
+    """
+    if not PLAN_LIBRARY_ENABLED or not journal_entries:
+        return
+
+    features = plan_features(journal_entries, tuple(context) + tuple(required))
+    if not features:
+        # Nothing to match later requests on
+        return
+
+    key = feature_key(features)
+
+    try:
+        with db.session.begin_nested():
+            bumped = db.session.execute(
+                update(PlanTemplate)
+                .where(PlanTemplate.plan_type == plan_type, PlanTemplate.feature_key == key)
+                .values(sources=PlanTemplate.sources + 1)
+            ).rowcount
+
+            if not bumped:
+                template = PlanTemplate(
+                    plan_type=plan_type,
+                    feature_key=key,
+                    features=json.dumps(sorted(features)),
+                    required=json.dumps(sorted(required)),
+                    title=plan_data['title'],
+                    description=plan_data['description'],
+                    recommendations=json.dumps(plan_data['recommendations']),
+                    source_plan_id=plan_id,
+                    vetted=PLAN_LIBRARY_AUTO_VET)
+                db.session.add(template)
+                db.session.flush()
+                if template.vetted:
+                    plan_index.add(template.id, plan_type, features, frozenset(required))
+        db.session.commit()
+    except Exception as e:
+        logging.error(f"Error recording plan template: {str(e)}")
+        db.session.rollback()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review the plan template library")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    list_command = commands.add_parser('list', help='List templates, most used first')
+    list_command.add_argument('--unvetted', action='store_true', help='Only templates waiting for review')
+    list_command.add_argument('--plan-type')
+
+    for name, help_text in (('vet', 'Allow templates to be served'), ('retire', 'Stop serving templates')):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument('ids', nargs='+', type=int)
+
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.command == 'list':
+            query = PlanTemplate.query
+            if args.unvetted:
+                query = query.filter(PlanTemplate.vetted.is_(False))
+            if args.plan_type:
+                query = query.filter(PlanTemplate.plan_type == args.plan_type)
+            for template in query.order_by(PlanTemplate.uses.desc(), PlanTemplate.sources.desc()):
+                print(json.dumps(template.serialize()))
+        else:
+            updated = db.session.execute(
+                update(PlanTemplate).where(PlanTemplate.id.in_(args.ids)).values(vetted=args.command == 'vet')
+            ).rowcount
+            db.session.commit()
+            print(f"{'Vetted' if args.command == 'vet' else 'Retired'} {updated} template(s)")
+
+
+if __name__ == '__main__':
+    main()
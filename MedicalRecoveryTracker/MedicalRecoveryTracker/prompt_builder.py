@@ -0,0 +1,167 @@
+import os
+from collections import OrderedDict
+
+from rate_limiter import estimate_tokens
+
+# Token budget for the symptom history section of a prompt
+SYMPTOM_TOKEN_BUDGET = int(os.environ.get("SYMPTOM_TOKEN_BUDGET", 1500))
+
+# Most recent notes quoted per symptom, and their maximum length
+MAX_NOTES_PER_SYMPTOM = 3
+MAX_NOTE_CHARS = 160
+
+# Change in severity per 30 days treated as a trend rather than noise
+TREND_THRESHOLD = 0.5
+
+
+def count_tokens(text):
+    """
+    Token estimate used for budgeting, consistent with the rate limiter's
+    """
+    return estimate_tokens(text)
+
+
+class SymptomSummary:
+    """
+    All journal entries for one symptom, collapsed into a few numbers
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.points = []
+        self.notes = []
+
+    def add(self, entry):
+        self.points.append((entry.date_experienced, entry.severity))
+        if entry.description and entry.description.strip():
+            self.notes.append((entry.date_experienced, entry.description.strip()))
+
+    @property
+    def first_date(self):
+        return min(day for day, _ in self.points)
+
+    @property
+    def last_date(self):
+        return max(day for day, _ in self.points)
+
+    @property
+    def latest_severity(self):
+        return max(self.points)[1]
+
+    def trend(self):
+        """
+        'improving', 'worsening' or 'stable' from the least-squares slope of severity over time
+        """
+        if len(self.points) < 2:
+            return None
+        start = self.first_date
+        xs = [(day - start).days for day, _ in self.points]
+        ys = [severity for _, severity in self.points]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        spread = sum((x - mean_x) ** 2 for x in xs)
+        if not spread:
+            return 'stable'
+
+        monthly_change = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread * 30
+        if monthly_change <= -TREND_THRESHOLD:
+            return 'improving'
+        if monthly_change >= TREND_THRESHOLD:
+            return 'worsening'
+        return 'stable'
+
+    def line(self, notes=MAX_NOTES_PER_SYMPTOM):
+        """
+        One dense line, quoting up to `notes` of the most recent distinct notes
+        """
+        severities = [severity for _, severity in self.points]
+        if len(self.points) == 1:
+            text = f"- {self.name}: {self.first_date:%Y-%m-%d}, severity {severities[0]}/10"
+        else:
+            text = (f"- {self.name}: {len(self.points)} entries {self.first_date:%Y-%m-%d} to {self.last_date:%Y-%m-%d}, "
+                    f"severity {min(severities)}-{max(severities)}/10, latest {self.latest_severity}, {self.trend()}")
+
+        quoted = []
+        for _, note in sorted(self.notes, key=lambda item: item[0], reverse=True):
+            if len(quoted) >= notes:
+                break
+            note = " ".join(note.split())
+            if len(note) > MAX_NOTE_CHARS:
+                note = note[:MAX_NOTE_CHARS - 3].rstrip() + "..."
+            if note not in quoted:
+                quoted.append(note)
+        if quoted:
+            text += "; notes: " + " | ".join(f'"{note}"' for note in quoted)
+        return text
+
+
+def summarize_symptoms(journal_entries):
+    """
+    Group entries by symptom (ignoring case and spacing), most recent and most severe first
+    """
+    summaries = OrderedDict()
+    for entry in journal_entries:
+        key = " ".join(entry.symptom.split()).casefold()
+        summary = summaries.get(key)
+        if summary is None:
+            summary = summaries[key] = SymptomSummary(" ".join(entry.symptom.split()))
+        summary.add(entry)
+
+    return sorted(summaries.values(),
+                  key=lambda summary: (summary.last_date, summary.latest_severity), reverse=True)
+
+
+def symptom_section(journal_entries, budget=SYMPTOM_TOKEN_BUDGET):
+    """
+    Dense symptom history for a prompt that fits in `budget` tokens. Quoted notes
+    are cut first, then the least recent symptoms are left out and counted.
+    """
+    summaries = summarize_symptoms(journal_entries)
+    if not summaries:
+        return "No symptoms recorded"
+
+    for notes in range(MAX_NOTES_PER_SYMPTOM, -1, -1):
+        lines = [summary.line(notes) for summary in summaries]
+        if count_tokens("\n".join(lines)) <= budget:
+            return "\n".join(lines)
+
+    # Even without notes the history is too long: keep the most recent symptoms,
+    # leaving room for the line counting the rest
+    kept, used = [], count_tokens("- ...and 000 other symptoms (00000 entries) not listed")
+    for line in lines:
+        cost = count_tokens(line + "\n")
+        if used + cost > budget and kept:
+            break
+        kept.append(line)
+        used += cost
+
+    omitted = summaries[len(kept):]
+    if omitted:
+        entries = sum(len(summary.points) for summary in omitted)
+        kept.append(f"- ...and {len(omitted)} other symptoms ({entries} entries) not listed")
+    return "\n".join(kept)
+
+
+def allergy_section(allergies):
+    lines = []
+    for allergy in allergies:
+        line = f"- {allergy.food_item}"
+        if allergy.severity:
+            line += f" ({allergy.severity})"
+        if allergy.notes:
+            line += f": {' '.join(allergy.notes.split())}"
+        lines.append(line)
+    return "\n".join(lines) if lines else "No known food allergies"
+
+
+def activity_section(activities):
+    lines = []
+    for activity in activities:
+        details = ", ".join(value for value in (activity.frequency, activity.intensity) if value)
+        line = f"- {activity.name}"
+        if details:
+            line += f" ({details})"
+        if activity.notes:
+            line += f": {' '.join(activity.notes.split())}"
+        lines.append(line)
+    return "\n".join(lines) if lines else "No activities recorded"
@@ -0,0 +1,230 @@
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+import threading
+from contextlib import contextmanager
+
+
+class RateLimitExceeded(Exception):
+    """
+    Raised before calling the model when a request cannot be served within its budget
+    """
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class TokenBucketStore:
+    """
+    Token buckets kept in a local SQLite file so every worker process on the
+    host draws from the same budget. BEGIN IMMEDIATE serializes updates.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS buckets ("
+                "name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, requests):
+        """
+        Atomically take tokens from several buckets. requests is a list of
+        (name, capacity, refill_per_second, amount). Either every bucket is
+        charged or none is; returns the seconds to wait before retrying (0 on success).
+        """
+        conn = self._connect()
+        now = time.time()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            levels = []
+            wait = 0.0
+            for name, capacity, refill_rate, amount in requests:
+                row = conn.execute(
+                    "SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)
+                ).fetchone()
+                tokens = capacity if row is None else min(
+                    capacity, row[0] + (now - row[1]) * refill_rate)
+
+                # A request larger than the bucket can never fit, charge it against a full bucket
+                amount = min(amount, capacity)
+                if tokens < amount:
+                    wait = max(wait, (amount - tokens) / refill_rate)
+                levels.append((name, tokens, amount))
+
+            if wait == 0.0:
+                for name, tokens, amount in levels:
+                    self._store(conn, name, tokens - amount, now)
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def adjust(self, name, capacity, refill_rate, delta):
+        """
+        Return (or charge) tokens once the real usage of a call is known
+        """
+        conn = self._connect()
+        now = time.time()
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT tokens, updated_at FROM buckets WHERE name = ?", (name,)
+            ).fetchone()
+            tokens = capacity if row is None else min(
+                capacity, row[0] + (now - row[1]) * refill_rate)
+            self._store(conn, name, min(capacity, tokens + delta), now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def _store(conn, name, tokens, now):
+        conn.execute(
+            "INSERT INTO buckets (name, tokens, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+            (name, tokens, now)
+        )
+
+
+class RateLimiter:
+    """
+    Governs outbound model calls with per-model requests-per-minute and
+    tokens-per-minute budgets, a per-user requests-per-minute cap, a limit on
+    concurrent in-flight calls per process and a bounded wait queue.
+    Requests that cannot be served within max_wait seconds are shed up front.
+    """
+
+    def __init__(self, store, rpm=15, tpm=1000000, user_rpm=5, max_concurrent=8,
+                 max_waiters=32, max_wait=10.0):
+        self.store = store
+        self.rpm = rpm
+        self.tpm = tpm
+        self.user_rpm = user_rpm
+        self.max_wait = max_wait
+        self.max_waiters = max_waiters
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._waiters = 0
+        self._lock = threading.Lock()
+        self.shed = 0
+
+    def _buckets(self, model_name, tokens, user_key):
+        requests = []
+        if self.rpm:
+            requests.append((f"rpm:{model_name}", self.rpm, self.rpm / 60.0, 1))
+        if self.tpm:
+            requests.append((f"tpm:{model_name}", self.tpm, self.tpm / 60.0, tokens))
+        if self.user_rpm and user_key:
+            requests.append((f"user:{user_key}", self.user_rpm, self.user_rpm / 60.0, 1))
+        return requests
+
+    def _reject(self, message, retry_after=None):
+        with self._lock:
+            self.shed += 1
+        raise RateLimitExceeded(message, retry_after)
+
+    @contextmanager
+    def slot(self, model_name, tokens, user_key=None):
+        """
+        Wait for budget and a free concurrency slot, then run the call.
+        Raises RateLimitExceeded when the wait queue is full or the wait would be too long.
+        """
+        deadline = time.monotonic() + self.max_wait
+
+        with self._lock:
+            if self._waiters >= self.max_waiters:
+                queue_full = True
+            else:
+                queue_full = False
+                self._waiters += 1
+        if queue_full:
+            self._reject("Too many AI requests are already waiting. Please try again shortly.")
+
+        acquired = False
+        try:
+            requests = self._buckets(model_name, tokens, user_key)
+            while requests:
+                wait = self.store.take(requests)
+                if wait == 0.0:
+                    break
+
+                # Shed now rather than wait for a slot we will not get in time
+                if time.monotonic() + wait > deadline:
+                    self._reject(
+                        f"AI request budget exhausted. Please try again in {int(wait) + 1} seconds.",
+                        retry_after=int(wait) + 1)
+                time.sleep(wait)
+
+            acquired = self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+            if not acquired:
+                self._reject("All AI workers are busy. Please try again shortly.")
+        finally:
+            with self._lock:
+                self._waiters -= 1
+
+        try:
+            yield
+        finally:
+            self._slots.release()
+
+    def settle(self, model_name, estimated_tokens, actual_tokens):
+        """
+        Correct the tokens-per-minute bucket with the real token usage of a call
+        """
+        if not self.tpm or not actual_tokens:
+            return
+        try:
+            self.store.adjust(f"tpm:{model_name}", self.tpm, self.tpm / 60.0,
+                              estimated_tokens - actual_tokens)
+        except Exception as e:
+            logging.error(f"Rate limiter settle failed: {str(e)}")
+
+    def stats(self):
+        with self._lock:
+            return {'waiting': self._waiters, 'shed': self.shed}
+
+
+def estimate_tokens(text, max_output_tokens=0):
+    """
+    Rough token estimate (about four characters per token) plus the output allowance
+    """
+    return len(text) // 4 + max_output_tokens
+
+
+def create_rate_limiter():
+    """
+    Build the limiter from environment settings: AI_RATE_LIMIT_DB, AI_RPM, AI_TPM,
+    AI_USER_RPM, AI_MAX_CONCURRENT, AI_MAX_WAITERS and AI_MAX_WAIT (0 disables a budget)
+    """
+    path = os.environ.get("AI_RATE_LIMIT_DB",
+                          os.path.join(tempfile.gettempdir(), "meditrack_rate_limits.sqlite3"))
+
+    return RateLimiter(
+        TokenBucketStore(path),
+        rpm=int(os.environ.get("AI_RPM", 15)),
+        tpm=int(os.environ.get("AI_TPM", 1000000)),
+        user_rpm=int(os.environ.get("AI_USER_RPM", 5)),
+        max_concurrent=int(os.environ.get("AI_MAX_CONCURRENT", 8)),
+        max_waiters=int(os.environ.get("AI_MAX_WAITERS", 32)),
+        max_wait=float(os.environ.get("AI_MAX_WAIT", 10))
+    )
+
+
+rate_limiter = create_rate_limiter()
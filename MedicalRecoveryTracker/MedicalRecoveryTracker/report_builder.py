@@ -0,0 +1,357 @@
+import os
+import json
+import uuid
+import hashlib
+import logging
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from app import app, db
+from cache import MemoryBackend
+from models import User, MedicalJournal, RecoveryPlan, Report, DataVersion
+from jobs import executor
+from utils import create_pdf_report
+from symptom_trends import symptom_trends
+
+# Built reports live on disk under REPORT_DIR/<user_id>/<content_key>.{pdf,json}
+REPORT_DIR = os.environ.get("REPORT_DIR", os.path.join(tempfile.gettempdir(), "meditrack_reports"))
+
+# report_id -> file metadata of completed reports, so repeat downloads skip the database
+report_files = MemoryBackend(max_entries=4096)
+
+# A report still 'running' this long after it was claimed lost its worker (e.g. the process was killed)
+REPORT_STALE_SECONDS = int(os.environ.get("REPORT_STALE_SECONDS", 300))
+
+# Finished reports are deleted, with their files, once newer data or a new day supersedes
+# them, or after REPORT_RETENTION_DAYS whatever happens
+REPORT_RETENTION_DAYS = float(os.environ.get("REPORT_RETENTION_DAYS", 30))
+
+
+def content_key(user, journal_ids, plan_ids, title, generated_date):
+    """
+    Address of a report's content: the same user, selection, data versions,
+    profile and date always produce the same key
+    """
+    journal_version, plan_version = DataVersion.for_user(user.id)
+    profile = [user.first_name, user.last_name, user.email, user.age, user.gender, user.weight, user.height]
+
+    material = json.dumps([user.id, sorted(journal_ids), sorted(plan_ids),
+                           journal_version, plan_version, profile, title, generated_date])
+    return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+
+def artifact_path(user_id, key, extension):
+    return os.path.join(REPORT_DIR, str(user_id), f"{key}.{extension}")
+
+
+def request_report(user, journal_ids, plan_ids, title):
+    """
+    Return the Report for this selection, queueing a build unless an identical
+    report has already been built (or is being built)
+    """
+    generated_date = datetime.now().strftime('%Y-%m-%d')
+    key = content_key(user, journal_ids, plan_ids, title, generated_date)
+
+    report = Report.query.filter_by(user_id=user.id, content_key=key).first()
+    if report is not None:
+        if requeue_report_if_stale(report):
+            return report
+        built = report.status == 'completed' and os.path.exists(artifact_path(user.id, key, 'pdf'))
+        if report.status == 'failed' or (report.status == 'completed' and not built):
+            _rebuild(report)
+        return report
+
+    report = Report(id=uuid.uuid4().hex,
+                    user_id=user.id,
+                    content_key=key,
+                    title=title,
+                    journal_ids=json.dumps(sorted(journal_ids)),
+                    plan_ids=json.dumps(sorted(plan_ids)),
+                    generated_date=generated_date,
+                    status='pending')
+    db.session.add(report)
+
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # An identical request won the race; share its report
+        db.session.rollback()
+        return Report.query.filter_by(user_id=user.id, content_key=key).first()
+
+    executor.submit(build_report, report.id)
+    return report
+
+
+def _rebuild(report):
+    report.status = 'pending'
+    report.error = None
+    db.session.commit()
+    report_files.delete(report.id)
+    executor.submit(build_report, report.id)
+
+
+def completed_report_file(report_id):
+    """
+    File metadata for a completed report, from memory when possible.
+    Returns (info, report): info is None while the report is not built yet.
+    """
+    info = report_files.get(report_id)
+    if info is not None and os.path.exists(info['pdf_path']):
+        return info, None
+
+    report = db.session.get(Report, report_id)
+    if report is None or report.status != 'completed':
+        return None, report
+
+    info = remember(report)
+    if not os.path.exists(info['pdf_path']):
+        # Artifacts were cleaned up behind our back; build them again
+        report_files.delete(report.id)
+        _rebuild(report)
+        return None, report
+
+    return info, report
+
+
+def remember(report):
+    info = {
+        'user_id': report.user_id,
+        'pdf_path': artifact_path(report.user_id, report.content_key, 'pdf'),
+        'json_path': artifact_path(report.user_id, report.content_key, 'json'),
+        'etag': report.content_key,
+        'filename': f"{report.title}_{report.generated_date}.pdf"
+    }
+    report_files.set(report.id, info)
+    return info
+
+
+def build_report(report_id):
+    """
+    Build a pending report's PDF and JSON payload inside its own application context
+    """
+    with app.app_context():
+        try:
+            # Atomically claim the report so it is only built once across workers
+            claimed = db.session.execute(
+                update(Report)
+                .where(Report.id == report_id, Report.status == 'pending')
+                .values(status='running', updated_at=datetime.utcnow())
+            ).rowcount
+            db.session.commit()
+
+            if not claimed:
+                return
+
+            report = db.session.get(Report, report_id)
+            user = db.session.get(User, report.user_id)
+
+            try:
+                report.pdf_size = _write_artifacts(report, user)
+                report.status = 'completed'
+                db.session.commit()
+                remember(report)
+            except Exception as e:
+                logging.error(f"Report {report_id} failed: {str(e)}")
+                db.session.rollback()
+
+                report = db.session.get(Report, report_id)
+                report.status = 'failed'
+                report.error = str(e)
+                db.session.commit()
+                return
+
+            try:
+                # Older reports of this user were just superseded
+                prune_reports(report.user_id)
+            except Exception as e:
+                logging.error(f"Pruning reports of user {report.user_id} failed: {str(e)}")
+                db.session.rollback()
+        finally:
+            db.session.remove()
+
+
+def prune_reports(user_id=None):
+    """
+    Delete finished reports, rows and files, whose content key is no longer what the
+    same request would produce today, or that are older than REPORT_RETENTION_DAYS.
+    Returns how many were deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=REPORT_RETENTION_DAYS)
+    today = datetime.now().strftime('%Y-%m-%d')
+
+    query = Report.query.filter(Report.status.in_(('completed', 'failed')))
+    if user_id is not None:
+        query = query.filter(Report.user_id == user_id)
+
+    users = {}
+    removed = 0
+    for report in query.all():
+        if report.user_id not in users:
+            users[report.user_id] = db.session.get(User, report.user_id)
+        user = users[report.user_id]
+
+        if user is not None and report.created_at >= cutoff:
+            current_key = content_key(user, json.loads(report.journal_ids or '[]'),
+                                      json.loads(report.plan_ids or '[]'), report.title, today)
+            if current_key == report.content_key:
+                continue
+
+        for extension in ('pdf', 'json'):
+            try:
+                os.remove(artifact_path(report.user_id, report.content_key, extension))
+            except FileNotFoundError:
+                pass
+        report_files.delete(report.id)
+        # Other workers may be pruning the same report
+        db.session.execute(delete(Report).where(Report.id == report.id))
+        removed += 1
+
+    db.session.commit()
+    return removed
+
+
+def release_stale_reports(report_id=None):
+    """
+    Put reports left 'running' by a dead worker back to 'pending', optionally only
+    the given report, returning how many were released
+    """
+    cutoff = datetime.utcnow() - timedelta(seconds=REPORT_STALE_SECONDS)
+    query = (update(Report)
+             .where(Report.status == 'running', Report.updated_at < cutoff)
+             .values(status='pending', updated_at=datetime.utcnow()))
+    if report_id is not None:
+        query = query.where(Report.id == report_id)
+
+    released = db.session.execute(query).rowcount
+    db.session.commit()
+    return released
+
+
+def requeue_report_if_stale(report):
+    """
+    Re-submit a report whose worker died mid-build, returning whether it was re-queued
+    """
+    if report.status != 'running' or not release_stale_reports(report.id):
+        return False
+
+    db.session.refresh(report)
+    report_files.delete(report.id)
+    executor.submit(build_report, report.id)
+    return True
+
+
+def resume_pending_reports():
+    """
+    Re-submit reports that were still pending when the process last stopped, and
+    reports whose worker died while building them
+    """
+    release_stale_reports()
+
+    pending_ids = db.session.execute(
+        db.select(Report.id).where(Report.status == 'pending')
+    ).scalars().all()
+
+    for report_id in pending_ids:
+        executor.submit(build_report, report_id)
+
+    return len(pending_ids)
+
+
+def _write_artifacts(report, user):
+    journal_ids = json.loads(report.journal_ids or '[]')
+    plan_ids = json.loads(report.plan_ids or '[]')
+
+    def journals():
+        if not journal_ids:
+            return []
+        return MedicalJournal.query.filter(
+            MedicalJournal.id.in_(journal_ids),
+            MedicalJournal.user_id == user.id
+        ).order_by(MedicalJournal.date_experienced.desc(), MedicalJournal.id.desc()).yield_per(200)
+
+    plans = []
+    if plan_ids:
+        plans = RecoveryPlan.query.options(selectinload(RecoveryPlan.recommendations)).filter(
+            RecoveryPlan.id.in_(plan_ids),
+            RecoveryPlan.user_id == user.id
+        ).order_by(RecoveryPlan.created_at.desc()).all()
+
+    # Trends cover the whole journal, as context for the selected entries
+    trends = symptom_trends(user.id) if journal_ids else None
+
+    pdf_path = artifact_path(user.id, report.content_key, 'pdf')
+    _write_atomic(pdf_path, create_pdf_report(user, journals(), plans,
+                                              title=report.title,
+                                              generated_date=report.generated_date,
+                                              symptom_trends=trends))
+
+    payload = report_payload(report, user, journals(), plans, trends)
+    _write_atomic(artifact_path(user.id, report.content_key, 'json'), [json.dumps(payload).encode('utf-8')])
+
+    return os.path.getsize(pdf_path)
+
+
+def _write_atomic(path, chunks):
+    """
+    Write chunks to path so readers only ever see a complete file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def report_payload(report, user, journals, plans, trends=None):
+    """
+    JSON-serializable report contents
+    """
+    return {
+        'success': True,
+        'title': report.title,
+        'user': {
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'email': user.email,
+            'age': user.age,
+            'gender': user.gender,
+            'weight': user.weight,
+            'height': user.height,
+            'bmi': user.calculate_bmi()
+        },
+        'journals': [journal.serialize() for journal in journals],
+        'plans': [{
+            'id': plan.id,
+            'title': plan.title,
+            'description': plan.description,
+            'plan_type': plan.plan_type,
+            'created_at': plan.created_at.strftime('%Y-%m-%d'),
+            'recommendations': [{
+                'title': rec.title,
+                'description': rec.description,
+                'type': rec.recommendation_type,
+                'priority': rec.priority
+            } for rec in plan.recommendations]
+        } for plan in plans],
+        'symptom_trends': trends['symptoms'] if trends else [],
+        'generated_date': report.generated_date
+    }
+
+
+with app.app_context():
+    resumed = resume_pending_reports()
+    if resumed:
+        logging.info(f"Resumed {resumed} pending reports")
+
+    pruned = prune_reports()
+    if pruned:
+        logging.info(f"Pruned {pruned} superseded or expired reports")
@@ -0,0 +1,211 @@
+import os
+import time
+import random
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from google.api_core import exceptions as google_exceptions
+
+# Errors worth another attempt: throttling, provider-side failures and timeouts
+RETRYABLE_ERRORS = (
+    google_exceptions.TooManyRequests,
+    google_exceptions.ResourceExhausted,
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+    ConnectionError,
+)
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of calling the model while the circuit breaker is open
+    """
+
+
+def is_retryable(error):
+    return isinstance(error, RETRYABLE_ERRORS)
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies used to pick the hedging threshold
+    """
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, pct):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and rejects calls for
+    recovery_timeout seconds, then lets a single trial call through (half-open)
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, recovery_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.recovery_timeout:
+                    raise CircuitOpenError("The AI service is temporarily unavailable.")
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+
+            if self.state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    raise CircuitOpenError("The AI service is temporarily unavailable.")
+                self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """
+        Finish a call whose outcome says nothing about provider health
+        """
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logging.warning("Gemini circuit breaker opened after repeated failures")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+class ResilientCaller:
+    """
+    Runs model calls with capped exponential-backoff retries on retryable
+    errors, optional hedging once a call outlives the recent p95 latency,
+    and a circuit breaker that fails fast during provider outages
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, hedging=False,
+                 hedge_percentile=95, breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="gemini-hedge") if hedging else None
+
+    def call(self, func):
+        """
+        Call func() under the retry, hedging and circuit breaker policy
+        """
+        self.breaker.before_call()
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                result = self._hedged(func) if self.hedging else self._timed(func)
+            except Exception as e:
+                if not is_retryable(e):
+                    # Bad requests and malformed output say nothing about provider health
+                    self.breaker.release()
+                    raise
+
+                if attempt == self.max_attempts:
+                    self.breaker.record_failure()
+                    raise
+
+                delay = self.backoff(attempt)
+                logging.warning(f"Retryable Gemini error ({type(e).__name__}), "
+                                f"attempt {attempt} of {self.max_attempts}, retrying in {delay:.2f}s")
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return result
+
+    def backoff(self, attempt):
+        """
+        Capped exponential backoff with full jitter
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+    def _timed(self, func):
+        start = time.perf_counter()
+        result = func()
+        self.latency.record(time.perf_counter() - start)
+        return result
+
+    def _hedged(self, func):
+        threshold = self.latency.percentile(self.hedge_percentile)
+        if threshold is None:
+            return self._timed(func)
+
+        first = self._executor.submit(self._timed, func)
+        done, _ = wait([first], timeout=threshold)
+        if done:
+            return first.result()
+
+        # The first attempt is slower than usual, race a second one against it
+        logging.info(f"Hedging Gemini call after {threshold * 1000:.0f} ms")
+        pending = {first, self._executor.submit(self._timed, func)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+def create_resilient_caller():
+    """
+    Build the caller from environment settings: AI_RETRY_ATTEMPTS, AI_RETRY_BASE_DELAY,
+    AI_RETRY_MAX_DELAY, AI_HEDGING, AI_BREAKER_THRESHOLD and AI_BREAKER_RECOVERY
+    """
+    return ResilientCaller(
+        max_attempts=int(os.environ.get("AI_RETRY_ATTEMPTS", 3)),
+        base_delay=float(os.environ.get("AI_RETRY_BASE_DELAY", 0.5)),
+        max_delay=float(os.environ.get("AI_RETRY_MAX_DELAY", 8)),
+        hedging=os.environ.get("AI_HEDGING", "0") == "1",
+        breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get("AI_BREAKER_THRESHOLD", 5)),
+            recovery_timeout=float(os.environ.get("AI_BREAKER_RECOVERY", 30))
+        )
+    )
+
+
+resilient_caller = create_resilient_caller()
@@ -1,11 +1,20 @@
-from flask import json, render_template, redirect, url_for, flash, request, jsonify, session
+from flask import json, render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context, abort, send_file
 from flask_login import login_user, logout_user, login_required, current_user
+from werkzeug.utils import secure_filename
 from datetime import datetime, date
 from app import app, db
-from models import User, MedicalJournal, AthleticActivity, FoodAllergy, RecoveryPlan, Recommendation
+from models import User, MedicalJournal, AthleticActivity, FoodAllergy, RecoveryPlan, Recommendation, GenerationJob, DataVersion, Report, UserSnapshot
 from forms import LoginForm, RegistrationForm, ProfileForm, MedicalJournalForm, AthleticActivityForm, FoodAllergyForm, AnonymousSymptomForm
-from ai_helper import generate_recovery_plan, generate_nutrition_plan, generate_sports_recovery_plan, generate_anonymous_recovery
-from utils import create_pdf_report
+from ai_helper import generate_anonymous_recovery, stream_anonymous_recovery
+from batch_generation import generate_anonymous_batch, BATCH_MAX_RECORDS, CLINIC_API_KEYS
+from jobs import enqueue_job, requeue_if_stale
+from report_builder import request_report, completed_report_file, requeue_report_if_stale
+from instrumentation import render_metrics, METRICS_TOKEN
+from page_cache import cached_page
+from journal_stats import journal_chart_data, RESOLUTIONS
+from symptom_trends import symptom_trends, ROLLING_WINDOW_DAYS
+from pagination import keyset_paginate, PER_PAGE
+from rate_limiter import RateLimitExceeded
 from sqlalchemy import asc
 
 
@@ -31,13 +40,18 @@ def anonymous_symptom():
                 severity=form.severity.data,
                 description=form.description.data,
                 age=form.age.data,
-                gender=form.gender.data)
+                gender=form.gender.data,
+                client_id=request.remote_addr)
 
             if not recovery_data:
                 flash(
                     'Failed to generate recovery suggestions. Please try again.',
                     'danger')
 
+        except RateLimitExceeded as e:
+            # Shed before calling the AI service, tell the user when to retry
+            flash(str(e), 'warning')
+
         except Exception as e:
             # Display a user-friendly error message
             error_msg = str(e)
@@ -53,6 +67,71 @@ def anonymous_symptom():
                            recovery_data=recovery_data)
 
 
+@app.route('/anonymous-symptom/stream', methods=['POST'])
+def anonymous_symptom_stream():
+    """Stream recovery suggestions to the browser as server-sent events, one recommendation at a time"""
+    form = AnonymousSymptomForm()
+
+    if not form.validate_on_submit():
+        return jsonify({'success': False, 'errors': form.errors}), 400
+
+    events = stream_anonymous_recovery(
+        symptom=form.symptom.data,
+        severity=form.severity.data,
+        description=form.description.data,
+        age=form.age.data,
+        gender=form.gender.data,
+        client_id=request.remote_addr)
+
+    def generate():
+        try:
+            for event in events:
+                if event[0] == 'field':
+                    yield _sse('field', {'name': event[1], 'value': event[2]})
+                elif event[0] == 'recommendation':
+                    yield _sse('recommendation', {'index': event[1], 'recommendation': event[2]})
+                else:
+                    yield _sse('done', {'count': len(event[1].get('recommendations', []))})
+        except RateLimitExceeded as e:
+            yield _sse('error', {'message': str(e), 'retry_after': e.retry_after})
+        except Exception as e:
+            # Parser and provider messages are not meant for users
+            app.logger.error(f"Error streaming recovery suggestions: {str(e)}")
+            yield _sse('error', {'message': 'Our AI service is temporarily unavailable. Please try again later.'})
+
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def _sse(event, data):
+    """Format a single server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/anonymous-symptom/batch', methods=['POST'])
+def anonymous_symptom_batch():
+    """Generate suggestions for a batch of anonymous symptom records, streamed back as NDJSON"""
+    if request.headers.get('X-API-Key') not in CLINIC_API_KEYS:
+        return jsonify({'success': False, 'message': 'A valid API key is required.'}), 401
+
+    payload = request.get_json(silent=True)
+    records = payload.get('records') if isinstance(payload, dict) else payload
+
+    if not isinstance(records, list) or not records:
+        return jsonify({'success': False, 'message': 'Expected a JSON list of records.'}), 400
+    if len(records) > BATCH_MAX_RECORDS:
+        return jsonify({'success': False,
+                        'message': f'At most {BATCH_MAX_RECORDS} records can be submitted at once.'}), 413
+
+    # Clinics share the global model budget but not the per-visitor limit
+    lines = generate_anonymous_batch(records)
+
+    return Response(stream_with_context(json.dumps(line) + '\n' for line in lines),
+                    mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
@@ -102,6 +181,7 @@ def register():
 
 @app.route('/dashboard')
 @login_required
+@cached_page
 def dashboard():
     # Get recent journal entries
     recent_journals = MedicalJournal.query.filter_by(
@@ -113,9 +193,14 @@ def dashboard():
         user_id=current_user.id).order_by(
             RecoveryPlan.created_at.desc()).limit(3).all()
 
+    # Get trend statistics for the most recently recorded symptoms
+    trends = symptom_trends(current_user.id)['symptoms'][:5]
+
     return render_template('dashboard.html',
                            recent_journals=recent_journals,
-                           recovery_plans=recovery_plans)
+                           recovery_plans=recovery_plans,
+                           symptom_trends=trends,
+                           rolling_window_days=ROLLING_WINDOW_DAYS)
 
 
 @app.route('/profile', methods=['GET', 'POST'])
@@ -124,14 +209,17 @@ def profile():
     form = ProfileForm(obj=current_user)
 
     if form.validate_on_submit():
-        current_user.first_name = form.first_name.data
-        current_user.last_name = form.last_name.data
-        current_user.age = form.age.data
-        current_user.gender = form.gender.data
-        current_user.weight = form.weight.data
-        current_user.height = form.height.data
+        # current_user is a cached snapshot; update the row itself
+        user = db.session.get(User, current_user.id)
+        user.first_name = form.first_name.data
+        user.last_name = form.last_name.data
+        user.age = form.age.data
+        user.gender = form.gender.data
+        user.weight = form.weight.data
+        user.height = form.height.data
 
         db.session.commit()
+        UserSnapshot.forget(user.id)
         flash('Profile updated successfully!', 'success')
         return redirect(url_for('profile'))
 
@@ -169,6 +257,7 @@ def add_activity():
                                     notes=form.notes.data)
 
         db.session.add(activity)
+        DataVersion.bump(current_user.id, profile=True)
         db.session.commit()
 
         flash('Activity added successfully!', 'success')
@@ -186,6 +275,7 @@ def delete_activity(id):
         return redirect(url_for('profile'))
 
     db.session.delete(activity)
+    DataVersion.bump(current_user.id, profile=True)
     db.session.commit()
 
     flash('Activity deleted successfully!', 'success')
@@ -204,6 +294,7 @@ def add_allergy():
                               notes=form.notes.data)
 
         db.session.add(allergy)
+        DataVersion.bump(current_user.id, profile=True)
         db.session.commit()
 
         flash('Food allergy added successfully!', 'success')
@@ -221,6 +312,7 @@ def delete_allergy(id):
         return redirect(url_for('profile'))
 
     db.session.delete(allergy)
+    DataVersion.bump(current_user.id, profile=True)
     db.session.commit()
 
     flash('Allergy deleted successfully!', 'success')
@@ -241,14 +333,14 @@ def journal():
             date_experienced=form.date_experienced.data)
 
         db.session.add(journal_entry)
+        DataVersion.bump(current_user.id, journal=True)
         db.session.commit()
 
         flash('Journal entry added successfully!', 'success')
         return redirect(url_for('journal'))
 
-    # Get all journal entries for the current user
-    entries = MedicalJournal.query.filter_by(user_id=current_user.id).order_by(
-        MedicalJournal.date_experienced.desc()).all()
+    # Get one page of the user's journal entries
+    entries = _journal_page('cursor')
 
     return render_template('journal.html', form=form, entries=entries)
 
@@ -256,57 +348,30 @@ def journal():
 @app.route('/journal/data')
 @login_required
 def journal_data():
-    # This route will return JSON data for the chart
-    entries = MedicalJournal.query.filter_by(user_id=current_user.id).order_by(
-        MedicalJournal.date_experienced.asc()).all()
-
-    data = {'labels': [], 'datasets': []}
-
-    # Group by symptom
-    symptoms = set([entry.symptom for entry in entries])
-    symptom_data = {
-        symptom: {
-            'dates': [],
-            'severities': []
-        }
-        for symptom in symptoms
-    }
-
-    for entry in entries:
-        date_str = entry.date_experienced.strftime('%Y-%m-%d')
-        symptom_data[entry.symptom]['dates'].append(date_str)
-        symptom_data[entry.symptom]['severities'].append(entry.severity)
-
-    # Prepare datasets for Chart.js
-    colors = ['#4e73df', '#1cc88a', '#36b9cc', '#f6c23e', '#e74a3b']
-    color_index = 0
-
-    for symptom, data_points in symptom_data.items():
-        color = colors[color_index % len(colors)]
-        color_index += 1
-
-        dataset = {
-            'label': symptom,
-            'data': data_points['severities'],
-            'backgroundColor': color,
-            'borderColor': color,
-            'borderWidth': 2,
-            'fill': False,
-            'tension': 0.3,
-            'dates': data_points['dates']
-        }
-
-        data['datasets'].append(dataset)
-
-        # Add dates to labels if not already there
-        for date_str in data_points['dates']:
-            if date_str not in data['labels']:
-                data['labels'].append(date_str)
-
-    # Sort labels (dates) chronologically
-    data['labels'].sort()
+    # This route will return JSON data for the chart, aggregated in the database
+    resolution = request.args.get('resolution', 'daily')
+    if resolution not in RESOLUTIONS:
+        return jsonify({'success': False, 'message': f"Resolution must be one of: {', '.join(RESOLUTIONS)}"}), 400
+
+    try:
+        start = _parse_date(request.args.get('start'))
+        end = _parse_date(request.args.get('end'))
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must use the YYYY-MM-DD format.'}), 400
+
+    return jsonify(journal_chart_data(current_user.id, start, end, resolution))
+
+
+@app.route('/journal/trends')
+@login_required
+def journal_trends():
+    """Rolling averages, severity slopes, flares and week-over-week deltas per symptom, cached until the journal changes"""
+    return jsonify(symptom_trends(current_user.id))
 
-    return jsonify(data)
+
+def _parse_date(value):
+    """Parse an optional YYYY-MM-DD query parameter"""
+    return datetime.strptime(value, '%Y-%m-%d').date() if value else None
 
 
 @app.route('/journal/delete/<int:id>', methods=['POST'])
@@ -319,6 +384,7 @@ def delete_journal(id):
         return redirect(url_for('journal'))
 
     db.session.delete(entry)
+    DataVersion.bump(current_user.id, journal=True)
     db.session.commit()
 
     flash('Journal entry deleted successfully!', 'success')
@@ -329,13 +395,10 @@ def delete_journal(id):
 @login_required
 def preventative_actions():
     # Get the user's journal entries to analyze
-    entries = MedicalJournal.query.filter_by(user_id=current_user.id).order_by(
-        MedicalJournal.date_experienced.desc()).all()
+    entries = _journal_page('journal_cursor')
 
     # Get existing recovery plans
-    recovery_plans = RecoveryPlan.query.filter_by(
-        user_id=current_user.id,
-        plan_type='general').order_by(RecoveryPlan.created_at.desc()).all()
+    recovery_plans = _plan_page('plan_cursor', plan_type='general')
 
     return render_template('preventative_actions.html',
                            entries=entries,
@@ -354,54 +417,15 @@ def create_recovery_plan():
             'warning')
         return redirect(url_for('preventative_actions'))
 
-    # Get the selected journal entries
-    selected_entries = MedicalJournal.query.filter(
-        MedicalJournal.id.in_(symptom_ids),
-        MedicalJournal.user_id == current_user.id).all()
-
-    # Generate a recovery plan using AI
-    plan_data = generate_recovery_plan(current_user, selected_entries)
-
-    if plan_data:
-        # Create a new recovery plan
-        #model = db.Model(
-        #    user_id=current_user.id,
-         #   title=plan_data['title'],
-          #  description=plan_data['description'],
-           # plan_type='general',
-            #ai_generated=True
-            #)
-        
-        plan = RecoveryPlan(
-            user_id=current_user.id,
-            title=plan_data['title'],
-            description=plan_data['description'],
-            plan_type='general',
-            ai_generated=True)
-
-        db.session.add(plan)
-        db.session.flush()  # Get the plan ID before committing
-
-        # Add recommendations
-        for rec in plan_data['recommendations']:
-            recommendation = Recommendation(recovery_plan_id=plan.id,
-                                            title=rec['title'],
-                                            description=rec['description'],
-                                            recommendation_type=rec['type'],
-                                            priority=rec['priority'])
-            db.session.add(recommendation)
+    # Queue the plan for background generation
+    job = enqueue_job(current_user.id, 'general', {'symptom_ids': symptom_ids})
 
-        db.session.commit()
-
-        flash('Recovery plan generated successfully!', 'success')
-    else:
-        flash('Failed to generate recovery plan. Please try again.', 'danger')
-
-    return redirect(url_for('preventative_actions'))
+    return _job_accepted(job, 'preventative_actions')
 
 
 @app.route('/view_plan/<int:id>')
 @login_required
+@cached_page
 def view_plan(id):
     plan = RecoveryPlan.query.get_or_404(id)
 
@@ -420,6 +444,7 @@ def view_plan(id):
 
 @app.route('/nutrition')
 @login_required
+@cached_page
 def nutrition():
     # Get the user's food allergies
     allergies = FoodAllergy.query.filter_by(user_id=current_user.id).all()
@@ -430,9 +455,7 @@ def nutrition():
             MedicalJournal.date_experienced.desc()).limit(10).all()
 
     # Get existing nutrition plans
-    nutrition_plans = RecoveryPlan.query.filter_by(
-        user_id=current_user.id,
-        plan_type='nutrition').order_by(RecoveryPlan.created_at.desc()).all()
+    nutrition_plans = _plan_page('cursor', plan_type='nutrition')
 
     return render_template('nutrition.html',
                            allergies=allergies,
@@ -452,49 +475,15 @@ def create_nutrition_plan():
             'warning')
         return redirect(url_for('nutrition'))
 
-    # Get the selected journal entries
-    selected_entries = MedicalJournal.query.filter(
-        MedicalJournal.id.in_(symptom_ids),
-        MedicalJournal.user_id == current_user.id).all()
-
-    # Get the user's food allergies
-    allergies = FoodAllergy.query.filter_by(user_id=current_user.id).all()
+    # Queue the plan for background generation
+    job = enqueue_job(current_user.id, 'nutrition', {'symptom_ids': symptom_ids})
 
-    # Generate a nutrition plan using AI
-    plan_data = generate_nutrition_plan(current_user, selected_entries,
-                                        allergies)
-
-    if plan_data:
-        # Create a new nutrition plan
-        plan = RecoveryPlan(user_id=current_user.id,
-                            title=plan_data['title'],
-                            description=plan_data['description'],
-                            plan_type='nutrition',
-                            ai_generated=True)
-
-        db.session.add(plan)
-        db.session.flush()  # Get the plan ID before committing
-
-        # Add recommendations
-        for rec in plan_data['recommendations']:
-            recommendation = Recommendation(recovery_plan_id=plan.id,
-                                            title=rec['title'],
-                                            description=rec['description'],
-                                            recommendation_type='nutrition',
-                                            priority=rec['priority'])
-            db.session.add(recommendation)
-
-        db.session.commit()
-
-        flash('Nutrition plan generated successfully!', 'success')
-    else:
-        flash('Failed to generate nutrition plan. Please try again.', 'danger')
-
-    return redirect(url_for('nutrition'))
+    return _job_accepted(job, 'nutrition')
 
 
 @app.route('/sports_recovery')
 @login_required
+@cached_page
 def sports_recovery():
     # Get the user's athletic activities
     activities = AthleticActivity.query.filter_by(
@@ -506,9 +495,7 @@ def sports_recovery():
             MedicalJournal.date_experienced.desc()).limit(10).all()
 
     # Get existing sports recovery plans
-    sports_plans = RecoveryPlan.query.filter_by(
-        user_id=current_user.id,
-        plan_type='sports').order_by(RecoveryPlan.created_at.desc()).all()
+    sports_plans = _plan_page('cursor', plan_type='sports')
 
     return render_template('sports_recovery.html',
                            activities=activities,
@@ -535,63 +522,124 @@ def create_sports_plan():
             'warning')
         return redirect(url_for('sports_recovery'))
 
-    # Get the selected journal entries
-    selected_entries = MedicalJournal.query.filter(
-        MedicalJournal.id.in_(symptom_ids),
-        MedicalJournal.user_id == current_user.id).all()
-
-    # Get the selected activities
-    selected_activities = AthleticActivity.query.filter(
-        AthleticActivity.id.in_(activity_ids),
-        AthleticActivity.user_id == current_user.id).all()
-
-    # Generate a sports recovery plan using AI
-    plan_data = generate_sports_recovery_plan(current_user, selected_entries,
-                                              selected_activities)
-
-    if plan_data:
-        # Create a new sports recovery plan
-        plan = RecoveryPlan(user_id=current_user.id,
-                            title=plan_data['title'],
-                            description=plan_data['description'],
-                            plan_type='sports',
-                            ai_generated=True)
-
-        db.session.add(plan)
-        db.session.flush()  # Get the plan ID before committing
-
-        # Add recommendations
-        for rec in plan_data['recommendations']:
-            recommendation = Recommendation(recovery_plan_id=plan.id,
-                                            title=rec['title'],
-                                            description=rec['description'],
-                                            recommendation_type='sports',
-                                            priority=rec['priority'])
-            db.session.add(recommendation)
+    # Queue the plan for background generation
+    job = enqueue_job(current_user.id, 'sports', {
+        'symptom_ids': symptom_ids,
+        'activity_ids': activity_ids
+    })
 
-        db.session.commit()
+    return _job_accepted(job, 'sports_recovery')
 
-        flash('Sports recovery plan generated successfully!', 'success')
-    else:
-        flash('Failed to generate sports recovery plan. Please try again.',
-              'danger')
 
-    return redirect(url_for('sports_recovery'))
+def _job_accepted(job, endpoint):
+    """Respond to a queued generation job with its id (XHR) or redirect back with a status banner"""
+    if request.headers.get('X-Requested-With') == 'XMLHttpRequest' or request.accept_mimetypes.best == 'application/json':
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'status_url': url_for('job_status', id=job.id)
+        }), 202
+
+    return redirect(url_for(endpoint, job=job.id))
+
+
+@app.route('/jobs/<id>')
+@login_required
+def job_status(id):
+    job = GenerationJob.query.get_or_404(id)
+
+    if job.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Job not found.'}), 404
+
+    # Restart a job whose worker died, so the page is not left polling forever
+    requeue_if_stale(job)
+
+    data = job.serialize()
+    if job.recovery_plan_id:
+        data['plan_url'] = url_for('view_plan', id=job.recovery_plan_id)
+
+    return jsonify(data)
 
 
 @app.route('/reports')
 @login_required
 def reports():
-    # Get all journal entries
-    entries = MedicalJournal.query.filter_by(user_id=current_user.id).order_by(
-        MedicalJournal.date_experienced.desc()).all()
-
-    # Get all recovery plans
-    plans = RecoveryPlan.query.filter_by(user_id=current_user.id).order_by(
-        RecoveryPlan.created_at.desc()).all()
+    # Get one page each of journal entries and recovery plans
+    entries = _journal_page('journal_cursor')
+    plans = _plan_page('plan_cursor')
 
     return render_template('reports.html', entries=entries, plans=plans)
 
+
+def _journal_page(cursor_param):
+    """Keyset page of the current user's journal entries, newest first; a bad cursor restarts at the first page"""
+    query = MedicalJournal.query.filter_by(user_id=current_user.id)
+    cursor = request.args.get(cursor_param)
+    try:
+        return keyset_paginate(query, MedicalJournal.date_experienced, MedicalJournal.id, cursor)
+    except ValueError:
+        return keyset_paginate(query, MedicalJournal.date_experienced, MedicalJournal.id)
+
+
+def _plan_page(cursor_param, plan_type=None):
+    """Keyset page of the current user's recovery plans, newest first, optionally of one type"""
+    query = RecoveryPlan.query.filter_by(user_id=current_user.id)
+    if plan_type:
+        query = query.filter_by(plan_type=plan_type)
+    cursor = request.args.get(cursor_param)
+    try:
+        return keyset_paginate(query, RecoveryPlan.created_at, RecoveryPlan.id, cursor)
+    except ValueError:
+        return keyset_paginate(query, RecoveryPlan.created_at, RecoveryPlan.id)
+
+
+@app.route('/api/journal')
+@login_required
+def api_journal():
+    """JSON listing of journal entries, paged with ?cursor= and ?per_page="""
+    try:
+        page = keyset_paginate(MedicalJournal.query.filter_by(user_id=current_user.id),
+                               MedicalJournal.date_experienced, MedicalJournal.id,
+                               request.args.get('cursor'),
+                               request.args.get('per_page', PER_PAGE, type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'items': [entry.serialize() for entry in page],
+        'next_cursor': page.next_cursor
+    })
+
+
+@app.route('/api/plans')
+@login_required
+def api_plans():
+    """JSON listing of recovery plans, optionally filtered by ?plan_type=, paged with ?cursor= and ?per_page="""
+    query = RecoveryPlan.query.filter_by(user_id=current_user.id)
+    if request.args.get('plan_type'):
+        query = query.filter_by(plan_type=request.args['plan_type'])
+
+    try:
+        page = keyset_paginate(query, RecoveryPlan.created_at, RecoveryPlan.id,
+                               request.args.get('cursor'),
+                               request.args.get('per_page', PER_PAGE, type=int))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    return jsonify({
+        'success': True,
+        'items': [{
+            'id': plan.id,
+            'title': plan.title,
+            'description': plan.description,
+            'plan_type': plan.plan_type,
+            'created_at': plan.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'url': url_for('view_plan', id=plan.id)
+        } for plan in page],
+        'next_cursor': page.next_cursor
+    })
+
 @app.route('/generate_report', methods=['POST'])
 @login_required
 def generate_report():
@@ -599,7 +647,13 @@ def generate_report():
         # Get selected journal IDs and plan IDs
         journal_ids = request.form.getlist('journal_ids')
         plan_ids = request.form.getlist('plan_ids')
-        report_title = request.form.get('report_title', 'Medical Report')
+        report_title = request.form.get('report_title', '').strip() or 'Medical Report'
+
+        if len(report_title) > Report.title.type.length:
+            return jsonify({
+                'success': False,
+                'message': f'Report title must be at most {Report.title.type.length} characters.'
+            })
 
         if not journal_ids and not plan_ids:
             # Return a JSON response with an error message if no journals or plans are selected
@@ -608,45 +662,31 @@ def generate_report():
                 'message': 'Please select at least one journal entry or recovery plan for the report.'
             })
 
-        # Get selected journal entries
-        selected_journals = MedicalJournal.query.filter(
-            MedicalJournal.id.in_(journal_ids),
-            MedicalJournal.user_id == current_user.id).order_by(
-                MedicalJournal.date_experienced.desc()).all()
+        # Keep only IDs that belong to the current user
+        selected_journal_ids = []
+        if journal_ids:
+            selected_journal_ids = db.session.execute(
+                db.select(MedicalJournal.id).where(
+                    MedicalJournal.id.in_(journal_ids),
+                    MedicalJournal.user_id == current_user.id)).scalars().all()
 
-        # Get selected plans with their recommendations
-        selected_plans = []
+        selected_plan_ids = []
         if plan_ids:
-            plans = RecoveryPlan.query.filter(
-                RecoveryPlan.id.in_(plan_ids),
-                RecoveryPlan.user_id == current_user.id).all()
-
-            for plan in plans:
-                recommendations = Recommendation.query.filter_by(
-                    recovery_plan_id=plan.id).order_by(
-                        Recommendation.priority.asc()).all()
-                
-                plan_data = {
-                    'plan': plan,
-                    'recommendations': recommendations
-                }
-                selected_plans.append(plan_data)
-
-        # Store report data in session for client-side PDF generation
-        # Store IDs instead of actual objects to avoid serialization issues
-        report_data = {
-            'title': report_title,
-            'journal_ids': [j.id for j in selected_journals],
-            'plan_ids': [p['plan'].id for p in selected_plans],
-            'generated_date': datetime.now().strftime('%Y-%m-%d')
-        }
-
-        # Store the data in session
-        session['report_data'] = report_data
+            selected_plan_ids = db.session.execute(
+                db.select(RecoveryPlan.id).where(
+                    RecoveryPlan.id.in_(plan_ids),
+                    RecoveryPlan.user_id == current_user.id)).scalars().all()
+
+        # Reuse an identical report if one was already built, otherwise build it in the background
+        report = request_report(current_user, selected_journal_ids, selected_plan_ids, report_title)
 
         return jsonify({
             'success': True,
-            'message': 'Report data prepared successfully!'
+            'message': 'Report data prepared successfully!',
+            'report': report.serialize(),
+            'status_url': url_for('report_status', report_id=report.id),
+            'pdf_url': url_for('report_pdf', report_id=report.id),
+            'data_url': url_for('report_data', report_id=report.id)
         })
     except Exception as e:
         app.logger.error(f"Error preparing report: {str(e)}")
@@ -656,87 +696,74 @@ def generate_report():
         })
 
 
-@app.route('/get_report_data')
+@app.route('/reports/<report_id>/status')
 @login_required
-def get_report_data():
-    try:
-        report_data = session.get('report_data')
-
-        if not report_data:
-            return jsonify({'success': False, 'message': 'No report data found!'})
-
-        # Fetch journal entries from database using stored IDs
-        journals = []
-        if 'journal_ids' in report_data and report_data['journal_ids']:
-            journals = MedicalJournal.query.filter(
-                MedicalJournal.id.in_(report_data['journal_ids']),
-                MedicalJournal.user_id == current_user.id
-            ).all()
-
-        # Fetch plans and recommendations from database using stored IDs
-        plans_data = []
-        if 'plan_ids' in report_data and report_data['plan_ids']:
-            plans = RecoveryPlan.query.filter(
-                RecoveryPlan.id.in_(report_data['plan_ids']),
-                RecoveryPlan.user_id == current_user.id
-            ).all()
-            
-            for plan in plans:
-                recommendations = Recommendation.query.filter_by(
-                    recovery_plan_id=plan.id
-                ).order_by(Recommendation.priority.asc()).all()
-                
-                plans_data.append({
-                    'plan': plan,
-                    'recommendations': recommendations
-                })
-
-        # Convert data to JSON-serializable format
-        processed_data = {
-            'success': True,
-            'title': report_data['title'],
-            'user': {
-                'first_name': current_user.first_name,
-                'last_name': current_user.last_name,
-                'email': current_user.email,
-                'age': current_user.age,
-                'gender': current_user.gender,
-                'weight': current_user.weight,
-                'height': current_user.height,
-                'bmi': current_user.calculate_bmi()
-            },
-            'journals': [journal.serialize() for journal in journals],
-            'plans': [],
-            'generated_date': report_data['generated_date']
-        }
-
-        # Process plan data
-        for plan_data in plans_data:
-            plan = {
-                'id': plan_data['plan'].id,
-                'title': plan_data['plan'].title,
-                'description': plan_data['plan'].description,
-                'plan_type': plan_data['plan'].plan_type,
-                'created_at': plan_data['plan'].created_at.strftime('%Y-%m-%d'),
-                'recommendations': []
-            }
-
-            for rec in plan_data['recommendations']:
-                plan['recommendations'].append({
-                    'title': rec.title,
-                    'description': rec.description,
-                    'type': rec.recommendation_type,
-                    'priority': rec.priority
-                })
-
-            processed_data['plans'].append(plan)
-
-        # Clear session data
-        session.pop('report_data', None)
-
-        return jsonify(processed_data)
-    except Exception as e:
-        # Log the error
-        app.logger.error(f"Error generating report data: {str(e)}")
-        # Return a proper JSON response even in case of errors
-        return jsonify({'success': False, 'message': f"Error generating report: {str(e)}"})
+def report_status(report_id):
+    report = db.session.get(Report, report_id)
+
+    if report is None or report.user_id != current_user.id:
+        return jsonify({'success': False, 'message': 'Report not found.'}), 404
+
+    # Restart a report whose worker died, so the page is not left polling forever
+    requeue_report_if_stale(report)
+
+    data = report.serialize()
+    if report.status == 'completed':
+        data['pdf_url'] = url_for('report_pdf', report_id=report.id)
+        data['data_url'] = url_for('report_data', report_id=report.id)
+
+    return jsonify(data)
+
+
+def _send_report_file(report_id, kind):
+    """
+    Serve a built report artifact with ETag and Range support. Completed reports
+    are resolved from memory, so repeat downloads do not touch the database.
+    """
+    info, report = completed_report_file(report_id)
+
+    if info is None:
+        if report is None or report.user_id != current_user.id:
+            abort(404)
+        # Not built yet; tell the client where to poll
+        return jsonify({
+            'success': False,
+            'message': 'Report is still being generated.',
+            'status': report.status,
+            'status_url': url_for('report_status', report_id=report.id)
+        }), 202
+
+    if info['user_id'] != current_user.id:
+        abort(404)
+
+    if kind == 'pdf':
+        response = send_file(info['pdf_path'], mimetype='application/pdf', as_attachment=True,
+                             download_name=secure_filename(info['filename']) or 'report.pdf',
+                             conditional=True, etag=info['etag'])
+    else:
+        response = send_file(info['json_path'], mimetype='application/json',
+                             conditional=True, etag=info['etag'])
+
+    # Reports contain medical data: browsers may revalidate them but shared caches must not store them
+    response.cache_control.private = True
+    return response
+
+
+@app.route('/reports/<report_id>.pdf')
+@login_required
+def report_pdf(report_id):
+    return _send_report_file(report_id, 'pdf')
+
+
+@app.route('/reports/<report_id>.json')
+@login_required
+def report_data(report_id):
+    return _send_report_file(report_id, 'json')
+
+
+@app.route('/metrics')
+def metrics():
+    """Per-request timing histograms in the Prometheus text format"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        abort(401)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
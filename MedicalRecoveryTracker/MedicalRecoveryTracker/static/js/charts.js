@@ -63,9 +63,9 @@ function createSymptomChart(ctx, data) {
   // Process datasets to ensure they have the correct format
   const datasets = data.datasets.map((dataset, index) => {
     // Calculate positions for all dates
+    const valuesByDate = new Map(dataset.dates.map((date, i) => [date, dataset.data[i]]));
     const positions = data.labels.map(label => {
-      const dateIndex = dataset.dates.indexOf(label);
-      return dateIndex !== -1 ? dataset.data[dateIndex] : null;
+      return valuesByDate.has(label) ? valuesByDate.get(label) : null;
     });
     
     return {
@@ -19,6 +19,9 @@ document.addEventListener('DOMContentLoaded', function() {
   
   // Setup symptom severity display
   setupSeverityDisplay();
+  
+  // Poll any background plan generation job
+  pollJobStatus();
 });
 
 // Function to initialize Bootstrap tooltips
@@ -161,6 +164,60 @@ function setupSeverityDisplay() {
   });
 }
 
+// Function to poll a background generation job until it finishes
+function pollJobStatus() {
+  const statusElement = document.getElementById('jobStatus');
+  
+  if (!statusElement) {
+    return;
+  }
+  
+  const statusUrl = statusElement.getAttribute('data-job-status-url');
+  const messageElement = statusElement.querySelector('.job-status-message');
+  const spinner = statusElement.querySelector('.spinner-border');
+  
+  function showResult(alertClass, message) {
+    statusElement.classList.remove('alert-info');
+    statusElement.classList.add(alertClass);
+    messageElement.textContent = message;
+    if (spinner) {
+      spinner.remove();
+    }
+  }
+  
+  function check() {
+    fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+      .then(response => {
+        if (response.status >= 500) {
+          throw new Error(`Job status returned ${response.status}`);
+        }
+        // A missing job or a non-JSON page (e.g. the login form) will never turn into a result
+        const contentType = response.headers.get('Content-Type') || '';
+        if (response.status === 404 || !contentType.includes('application/json')) {
+          return null;
+        }
+        return response.json();
+      })
+      .then(job => {
+        if (!job) {
+          showResult('alert-warning', 'Could not find the requested plan job.');
+        } else if (job.status === 'completed') {
+          showResult('alert-success', 'Your plan is ready! Opening it now...');
+          window.location.href = job.plan_url;
+        } else if (job.status === 'failed') {
+          showResult('alert-danger', job.error || 'Failed to generate plan. Please try again.');
+        } else if (job.status) {
+          setTimeout(check, 2000);
+        } else {
+          showResult('alert-warning', 'Could not find the requested plan job.');
+        }
+      })
+      .catch(() => setTimeout(check, 5000));
+  }
+  
+  check();
+}
+
 // Function to confirm deletion
 function confirmDelete(event, itemType) {
   if (!confirm(`Are you sure you want to delete this ${itemType}? This action cannot be undone.`)) {
@@ -0,0 +1,108 @@
+import json
+
+from structured_output import InvalidResponseError, extract_json
+
+
+class RecommendationStreamParser:
+    """
+    Incremental parser for a streamed plan document of the form
+    {"title": ..., "description": ..., "recommendations": [{...}, ...]}
+
+    Text is fed in chunks as the model produces it. Each call to feed() returns
+    the events that became complete: ('field', name, value) for top-level
+    string fields and ('recommendation', index, item) for every finished
+    recommendation object. Every character is scanned exactly once.
+    """
+
+    ARRAY_KEY = "recommendations"
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.string_start = None
+        self.expect_key = False
+        self.current_key = None
+        self.in_array = False
+        self.item_start = None
+        self.item_count = 0
+        self.finished = False
+
+    def feed(self, text):
+        self.buffer += text
+        events = []
+
+        while self.pos < len(self.buffer) and not self.finished:
+            char = self.buffer[self.pos]
+
+            if not self.started:
+                # Skip markdown fences or prose before the document
+                if char == '{':
+                    self.started = True
+                    self.depth = 1
+                    self.expect_key = True
+                self.pos += 1
+                continue
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == '\\':
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 1:
+                        events.extend(self._top_level_string(self.buffer[self.string_start:self.pos + 1]))
+                self.pos += 1
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = self.pos
+            elif char in '{[':
+                if char == '{' and self.in_array and self.depth == 2:
+                    self.item_start = self.pos
+                if char == '[' and self.depth == 1 and self.current_key == self.ARRAY_KEY:
+                    self.in_array = True
+                self.depth += 1
+            elif char in '}]':
+                self.depth -= 1
+                if char == '}' and self.in_array and self.depth == 2 and self.item_start is not None:
+                    events.extend(self._finish_item(self.buffer[self.item_start:self.pos + 1]))
+                    self.item_start = None
+                elif char == ']' and self.depth == 1:
+                    self.in_array = False
+                elif self.depth == 0:
+                    self.finished = True
+            elif char == ',' and self.depth == 1:
+                self.expect_key = True
+
+            self.pos += 1
+
+        return events
+
+    def _top_level_string(self, literal):
+        # Models often put raw newlines or tabs in strings; extract_json accepts them too
+        value = json.loads(literal, strict=False)
+        if self.expect_key:
+            self.current_key = value
+            self.expect_key = False
+            return []
+        return [('field', self.current_key, value)]
+
+    def _finish_item(self, literal):
+        try:
+            item = extract_json(literal)
+        except InvalidResponseError:
+            # Leave malformed items for the full-document parse to report
+            return []
+        index = self.item_count
+        self.item_count += 1
+        return [('recommendation', index, item)]
+
+    @property
+    def text(self):
+        return self.buffer
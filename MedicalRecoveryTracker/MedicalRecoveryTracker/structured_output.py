@@ -0,0 +1,240 @@
+import json
+
+# Bare words models borrow from Python
+LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+CLOSERS = {"{": "}", "[": "]"}
+
+
+class InvalidResponseError(ValueError):
+    """
+    Raised when the model returns something that is not the requested JSON structure
+    """
+
+
+def extract_json(text):
+    """
+    Parse the outermost JSON object in a model response. Markdown fences and prose
+    around it are ignored; trailing commas, comments, Python literals, raw newlines
+    in strings and output cut off mid-document are repaired.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise InvalidResponseError("The AI model response contains no JSON object")
+
+    # Well-formed responses (the usual case in JSON mode) parse without repair
+    end = text.rfind("}")
+    if end > start:
+        try:
+            return json.loads(text[start:end + 1])
+        except json.JSONDecodeError:
+            pass
+
+    try:
+        return json.loads(repair_json(text, start), strict=False)
+    except json.JSONDecodeError as e:
+        raise InvalidResponseError(f"The AI model returned invalid JSON: {str(e)}") from e
+
+
+def repair_json(text, start=0):
+    """
+    Copy the JSON object starting at text[start] in one pass, stopping where it closes
+    and fixing the defects extract_json tolerates on the way
+    """
+    out = []
+    # Open containers as [closing character, position in out of its last comma]
+    stack = []
+    in_string = False
+    escape = False
+    i = start
+    length = len(text)
+
+    while i < length:
+        char = text[i]
+
+        if in_string:
+            out.append(char)
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+            i += 1
+            continue
+
+        if char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append([CLOSERS[char], None])
+        elif char in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(stack.pop()[0])
+            if not stack:
+                return "".join(out)
+            i += 1
+            continue
+        elif char == "," and stack:
+            stack[-1][1] = len(out)
+        elif char == "/" and text.startswith("//", i):
+            newline = text.find("\n", i)
+            i = length if newline == -1 else newline
+            continue
+        elif char == "/" and text.startswith("/*", i):
+            close = text.find("*/", i + 2)
+            i = length if close == -1 else close + 2
+            continue
+        elif char.isalpha():
+            word_end = i
+            while word_end < length and text[word_end].isalpha():
+                word_end += 1
+            word = text[i:word_end]
+            out.append(LITERALS.get(word, word))
+            i = word_end
+            continue
+
+        out.append(char)
+        i += 1
+
+    # The response was cut off: close the open string, then prefer dropping the
+    # list item being written (an unfinished recommendation) over keeping it half
+    # done, and keeping a half-written value over dropping the member it belongs to
+    if in_string:
+        if escape:
+            out.pop()
+        out.append('"')
+    arrays = [level for level in reversed(range(len(stack))) if stack[level][0] == "]"]
+    objects = [level for level in reversed(range(len(stack))) if stack[level][0] == "}"]
+
+    candidates = [_close(out[:stack[level][1]], stack[:level + 1]) for level in arrays if stack[level][1] is not None]
+    candidates.append(_close(out, stack))
+    candidates += [_close(out[:stack[level][1]], stack[:level + 1]) for level in objects if stack[level][1] is not None]
+
+    for candidate in candidates:
+        try:
+            json.loads(candidate, strict=False)
+            return candidate
+        except json.JSONDecodeError:
+            continue
+    return candidates[0]
+
+
+def _close(out, stack):
+    out = list(out)
+    _drop_trailing_comma(out)
+    for closer, _ in reversed(stack):
+        out.append(closer)
+        _drop_trailing_comma(out)
+    return "".join(out)
+
+
+def _drop_trailing_comma(out):
+    end = len(out)
+    while end and out[end - 1].isspace():
+        end -= 1
+    if end and out[end - 1] == ",":
+        del out[end - 1]
+
+
+class Schema:
+    """
+    Validator compiled once from a spec such as
+    {"title": str, "items": [{"name": str, "rank": int, "note?": str}]}.
+    Keys ending in "?" are optional; str, int, dict and list check types, a dict
+    describes an object and a one-element list a list of that item. Integers
+    sent as numeric strings or whole floats are converted in place.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._check = _compile(spec, "")
+
+    def validate(self, value):
+        return self._check(value)
+
+
+def validate(result, schema):
+    """
+    Check (and normalize) a parsed response against a compiled Schema
+    """
+    return schema.validate(result)
+
+
+def _compile(spec, path):
+    if isinstance(spec, dict):
+        return _compile_object(spec, path)
+    if isinstance(spec, list):
+        return _compile_list(spec[0], path)
+    if spec is str:
+        return _compile_str(path)
+    if spec is int:
+        return _compile_int(path)
+    if spec in (dict, list):
+        return _compile_type(spec, path)
+    raise TypeError(f"Unsupported schema spec at {path or 'top level'}: {spec!r}")
+
+
+def _compile_object(spec, path):
+    fields = []
+    for name, field_spec in spec.items():
+        key = name[:-1] if name.endswith("?") else name
+        field_path = f"{path}.{key}" if path else key
+        fields.append((key, name.endswith("?"), field_path, _compile(field_spec, field_path)))
+
+    def check(value):
+        if not isinstance(value, dict):
+            raise InvalidResponseError(f"The AI model response {_where(path)}is not a JSON object")
+        for key, optional, field_path, check_field in fields:
+            if key in value:
+                value[key] = check_field(value[key])
+            elif not optional:
+                raise InvalidResponseError(f"The AI model response is missing: {field_path}")
+        return value
+    return check
+
+
+def _compile_list(item_spec, path):
+    check_item = _compile(item_spec, f"{path}[]")
+
+    def check(value):
+        if not isinstance(value, list):
+            raise InvalidResponseError(f"The AI model response {_where(path)}is not a list")
+        for index, item in enumerate(value):
+            value[index] = check_item(item)
+        return value
+    return check
+
+
+def _compile_str(path):
+    def check(value):
+        if not isinstance(value, str):
+            raise InvalidResponseError(f"The AI model response {_where(path)}is not a string")
+        return value
+    return check
+
+
+def _compile_int(path):
+    def check(value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            return value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value.strip().isdigit():
+            return int(value.strip())
+        raise InvalidResponseError(f"The AI model response {_where(path)}is not an integer")
+    return check
+
+
+def _compile_type(expected, path):
+    def check(value):
+        if not isinstance(value, expected):
+            kind = "JSON object" if expected is dict else "list"
+            raise InvalidResponseError(f"The AI model response {_where(path)}is not a {kind}")
+        return value
+    return check
+
+
+def _where(path):
+    return f"field {path} " if path else ""
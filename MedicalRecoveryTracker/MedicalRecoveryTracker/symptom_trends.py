@@ -0,0 +1,245 @@
+"""
+Per-symptom trend statistics over a user's whole journal, computed with NumPy.
+
+The journal is loaded once as columnar arrays (symptom code, day, severity) and
+every statistic is computed for all symptoms at once with grouped reductions, so
+histories of hundreds of thousands of entries are analyzed in milliseconds.
+Results are cached until the user's journal changes.
+
+Symptoms are grouped ignoring case and spacing, as in the prompts. Week-over-week
+figures compare the seven days up to the latest entry in the journal with the
+seven days before, so they depend on nothing but the journal itself.
+"""
+import os
+from datetime import date
+
+import numpy as np
+from sqlalchemy import select
+
+from app import db
+from cache import MemoryBackend
+from models import MedicalJournal, DataVersion
+from prompt_builder import TREND_THRESHOLD
+
+# Trailing window (days) of the rolling average severity
+ROLLING_WINDOW_DAYS = int(os.environ.get("TRENDS_ROLLING_DAYS", 7))
+WEEK_DAYS = 7
+
+# A flare is a day averaging at least FLARE_MIN_SEVERITY and FLARE_MIN_RISE points above
+# the symptom's average over the FLARE_BASELINE_DAYS before it
+FLARE_BASELINE_DAYS = int(os.environ.get("TRENDS_FLARE_BASELINE_DAYS", 28))
+FLARE_MIN_RISE = float(os.environ.get("TRENDS_FLARE_MIN_RISE", 2))
+FLARE_MIN_SEVERITY = float(os.environ.get("TRENDS_FLARE_MIN_SEVERITY", 6))
+MAX_FLARES_LISTED = 10
+
+# Trends per (user, journal version); a new version makes old entries unreachable
+trends_cache = MemoryBackend(max_entries=1024)
+
+
+class JournalArrays:
+    """
+    A user's journal as parallel arrays sorted by symptom, day and severity
+    """
+
+    def __init__(self, names, codes, days, severities):
+        self.names = names            # display name per symptom code
+        self.codes = codes            # int64 symptom code per entry
+        self.days = days              # int64 proleptic ordinal of date_experienced
+        self.severities = severities  # float64
+
+
+def load_journal_arrays(user_id):
+    """
+    The user's journal entries as JournalArrays, or None when the journal is empty
+    """
+    rows = db.session.execute(
+        select(MedicalJournal.symptom, MedicalJournal.date_experienced, MedicalJournal.severity)
+        .where(MedicalJournal.user_id == user_id)
+    ).all()
+    if not rows:
+        return None
+
+    symptoms, dates, severities = zip(*rows)
+    keys = np.array([" ".join(symptom.split()).casefold() for symptom in symptoms])
+    _, codes = np.unique(keys, return_inverse=True)
+    days = np.fromiter((day.toordinal() for day in dates), dtype=np.int64, count=len(dates))
+    severities = np.asarray(severities, dtype=np.float64)
+
+    order = np.lexsort((severities, days, codes))
+    codes, days, severities = codes[order], days[order], severities[order]
+
+    # Display each symptom as spelled in its most recent entry
+    last = np.r_[np.flatnonzero(np.diff(codes)), len(codes) - 1]
+    names = [" ".join(symptoms[order[index]].split()) for index in last]
+    return JournalArrays(names, codes.astype(np.int64), days, severities)
+
+
+def symptom_trends(user_id):
+    """
+    Trend statistics for every symptom in the user's journal, cached until the journal changes
+    """
+    journal_version, _ = DataVersion.for_user(user_id)
+    key = (user_id, journal_version)
+
+    data = trends_cache.get(key)
+    if data is None:
+        data = compute_trends(load_journal_arrays(user_id))
+        trends_cache.set(key, data)
+    return data
+
+
+def compute_trends(journal):
+    """
+    Statistics per symptom, most recently recorded (then most severe) first
+    """
+    result = {
+        'as_of': None,
+        'rolling_window_days': ROLLING_WINDOW_DAYS,
+        'symptoms': []
+    }
+    if journal is None:
+        return result
+
+    codes, days, severities = journal.codes, journal.days, journal.severities
+    symptom_count = len(journal.names)
+    as_of = int(days.max())
+    result['as_of'] = date.fromordinal(as_of).isoformat()
+
+    # Per-symptom reductions; entries are sorted, so groups are contiguous
+    starts = np.r_[0, np.flatnonzero(np.diff(codes)) + 1]
+    ends = np.r_[starts[1:], len(codes)]
+    counts = np.bincount(codes, minlength=symptom_count)
+    totals = np.bincount(codes, weights=severities, minlength=symptom_count)
+    first_days = days[starts]
+    last_days = days[ends - 1]
+    latest = severities[ends - 1]
+
+    slopes = _slopes(codes, days - first_days[codes], severities, counts, totals, symptom_count)
+    this_week = _period_means(codes, days, severities, as_of - WEEK_DAYS, as_of, symptom_count)
+    previous_week = _period_means(codes, days, severities, as_of - 2 * WEEK_DAYS, as_of - WEEK_DAYS, symptom_count)
+    daily = _daily_series(codes, days, severities)
+
+    # Where each symptom's days start in the daily series
+    daily_starts = np.searchsorted(daily['codes'], np.arange(symptom_count + 1))
+    rolling = np.round(daily['rolling'], 2)
+
+    # ISO labels for every day in the journal's range, formatted once
+    first_day = int(days.min())
+    labels = np.array([date.fromordinal(day).isoformat() for day in range(first_day, as_of + 1)])
+
+    symptoms = []
+    for code in range(symptom_count):
+        lo, hi = daily_starts[code], daily_starts[code + 1]
+        flare_days = np.flatnonzero(daily['flares'][lo:hi]) + lo
+        slope = slopes[code]
+
+        symptoms.append({
+            'symptom': journal.names[code],
+            'entries': int(counts[code]),
+            'first_date': date.fromordinal(int(first_days[code])).isoformat(),
+            'last_date': date.fromordinal(int(last_days[code])).isoformat(),
+            'latest_severity': int(latest[code]),
+            'average_severity': round(float(totals[code] / counts[code]), 2),
+            'rolling_average': float(rolling[hi - 1]),
+            'slope_per_30_days': None if np.isnan(slope) else round(float(slope), 3),
+            'trend': _trend(slope, counts[code]),
+            'week_over_week': _week_over_week(this_week[code], previous_week[code]),
+            'flare_count': len(flare_days),
+            'flares': [{
+                'date': date.fromordinal(int(daily['days'][index])).isoformat(),
+                'severity': round(float(daily['means'][index]), 2),
+                'baseline': round(float(daily['baselines'][index]), 2)
+            } for index in flare_days[::-1][:MAX_FLARES_LISTED]],
+            'rolling': {
+                'dates': labels[daily['days'][lo:hi] - first_day].tolist(),
+                'averages': rolling[lo:hi].tolist()
+            }
+        })
+
+    symptoms.sort(key=lambda item: (item['last_date'], item['latest_severity']), reverse=True)
+    result['symptoms'] = symptoms
+    return result
+
+
+def _slopes(codes, offsets, severities, counts, totals, symptom_count):
+    """
+    Least-squares change in severity per 30 days for each symptom (NaN with fewer than two entries)
+    """
+    x = offsets.astype(np.float64)
+    sum_x = np.bincount(codes, weights=x, minlength=symptom_count)
+    sum_xx = np.bincount(codes, weights=x * x, minlength=symptom_count)
+    sum_xy = np.bincount(codes, weights=x * severities, minlength=symptom_count)
+
+    spread = counts * sum_xx - sum_x ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slopes = np.where(spread > 0, (counts * sum_xy - sum_x * totals) / spread * 30, 0.0)
+    slopes[counts < 2] = np.nan
+    return slopes
+
+
+def _trend(slope, count):
+    if count < 2:
+        return None
+    if slope <= -TREND_THRESHOLD:
+        return 'improving'
+    if slope >= TREND_THRESHOLD:
+        return 'worsening'
+    return 'stable'
+
+
+def _period_means(codes, days, severities, after, until, symptom_count):
+    """
+    Mean severity per symptom of entries with after < day <= until (NaN when there are none)
+    """
+    mask = (days > after) & (days <= until)
+    counts = np.bincount(codes[mask], minlength=symptom_count)
+    totals = np.bincount(codes[mask], weights=severities[mask], minlength=symptom_count)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return totals / counts
+
+
+def _week_over_week(this_week, previous_week):
+    return {
+        'this_week': None if np.isnan(this_week) else round(float(this_week), 2),
+        'previous_week': None if np.isnan(previous_week) else round(float(previous_week), 2),
+        'delta': None if np.isnan(this_week) or np.isnan(previous_week) else round(float(this_week - previous_week), 2)
+    }
+
+
+def _daily_series(codes, days, severities):
+    """
+    Mean severity per symptom and day, with the trailing rolling average, the flare
+    baseline and flare flags, as arrays sorted by symptom then day
+    """
+    first_day = int(days.min())
+    # Wide enough that no window reaches into the previous symptom's days
+    span = int(days.max()) - first_day + max(ROLLING_WINDOW_DAYS, FLARE_BASELINE_DAYS) + 1
+
+    keys, inverse = np.unique(codes * span + (days - first_day), return_inverse=True)
+    day_totals = np.bincount(inverse, weights=severities)
+    day_counts = np.bincount(inverse).astype(np.float64)
+    cumulative_totals = np.r_[0.0, np.cumsum(day_totals)]
+    cumulative_counts = np.r_[0.0, np.cumsum(day_counts)]
+
+    def window(oldest, newest):
+        # Totals and counts of entries from `oldest` to `newest` days before each day
+        lo = np.searchsorted(keys, keys - oldest, side='left')
+        hi = np.searchsorted(keys, keys - newest, side='right')
+        return cumulative_totals[hi] - cumulative_totals[lo], cumulative_counts[hi] - cumulative_counts[lo]
+
+    rolling_totals, rolling_counts = window(ROLLING_WINDOW_DAYS - 1, 0)
+    baseline_totals, baseline_counts = window(FLARE_BASELINE_DAYS, 1)
+
+    means = day_totals / day_counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        baselines = baseline_totals / baseline_counts
+    flares = (baseline_counts > 0) & (means >= FLARE_MIN_SEVERITY) & (means - baselines >= FLARE_MIN_RISE)
+
+    return {
+        'codes': keys // span,
+        'days': keys % span + first_day,
+        'means': means,
+        'rolling': rolling_totals / rolling_counts,
+        'baselines': baselines,
+        'flares': flares
+    }
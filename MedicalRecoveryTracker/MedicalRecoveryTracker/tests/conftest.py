@@ -0,0 +1,45 @@
+import os
+import sys
+import tempfile
+
+# The app reads its settings from the environment at import time, so configure
+# throwaway SQLite primary and replica databases before anything imports it
+TEST_DIR = tempfile.mkdtemp(prefix="meditrack-tests-")
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(TEST_DIR, "primary.db")
+os.environ["DATABASE_REPLICA_URL"] = "sqlite:///" + os.path.join(TEST_DIR, "replica.db")
+os.environ["AI_RATE_LIMIT_DB"] = os.path.join(TEST_DIR, "rate_limits.db")
+os.environ["REPORT_DIR"] = os.path.join(TEST_DIR, "reports")
+os.environ["AI_BACKEND"] = "fake"
+os.environ.setdefault("SESSION_SECRET", "tests")
+os.environ.setdefault("OPENAI_API_KEY", "unused-by-tests")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+# Models import the app, so the app must be imported first; then register the routes, as main.py does
+import main  # noqa: E402,F401
+
+
+@pytest.fixture
+def database():
+    """
+    Empty primary and replica schemas inside an application context, with the
+    in-process caches (keyed by user ID and data version) cleared
+    """
+    from app import app, db
+    from models import user_snapshots
+    from page_cache import page_cache, fragment_cache
+    from journal_stats import chart_cache
+    from symptom_trends import trends_cache
+    from report_builder import report_files
+
+    with app.app_context():
+        for engine in db.engines.values():
+            db.metadata.drop_all(engine)
+            db.metadata.create_all(engine)
+        for cache in (user_snapshots, page_cache, fragment_cache, chart_cache, trends_cache, report_files):
+            cache.clear()
+
+        yield db
+        db.session.remove()
@@ -0,0 +1,85 @@
+import time
+from contextlib import contextmanager
+
+from flask import session
+from sqlalchemy import insert, select
+
+from app import app, db
+from db_routing import REPLICA_BIND, DATABASE_REPLICA_STICKY
+from models import User
+
+
+def add_user(engine, email):
+    with engine.begin() as connection:
+        connection.execute(insert(User), {'email': email, 'password_hash': 'x'})
+
+
+@contextmanager
+def request_context(method):
+    # A fresh application context per request, as when serving, so g and the session start empty
+    with app.app_context(), app.test_request_context('/', method=method):
+        yield
+        db.session.remove()
+
+
+def emails():
+    return set(db.session.scalars(select(User.email)))
+
+
+def seed(database):
+    # The stand-ins do not replicate, so each row shows which database answered
+    add_user(database.engine, 'primary@example.com')
+    add_user(database.engines[REPLICA_BIND], 'replica@example.com')
+
+
+def test_get_reads_from_replica(database):
+    seed(database)
+    with request_context('GET'):
+        assert emails() == {'replica@example.com'}
+
+
+def test_other_methods_read_from_primary(database):
+    seed(database)
+    for method in ('POST', 'PUT', 'DELETE'):
+        with request_context(method):
+            assert emails() == {'primary@example.com'}
+
+
+def test_reads_outside_requests_use_primary(database):
+    seed(database)
+    assert emails() == {'primary@example.com'}
+
+
+def test_writes_go_to_primary_and_pin_the_request(database):
+    seed(database)
+    with request_context('GET'):
+        assert emails() == {'replica@example.com'}
+
+        db.session.add(User(email='written@example.com', password_hash='x'))
+        db.session.flush()
+        # The rest of the request sees its own write
+        assert emails() == {'primary@example.com', 'written@example.com'}
+        db.session.commit()
+
+    with database.engines[REPLICA_BIND].connect() as connection:
+        assert 'written@example.com' not in set(connection.scalars(select(User.email)))
+
+
+def test_recent_writers_stick_to_primary(database):
+    seed(database)
+    with request_context('GET'):
+        session['_primary_until'] = time.time() + DATABASE_REPLICA_STICKY
+        assert emails() == {'primary@example.com'}
+
+    with request_context('GET'):
+        session['_primary_until'] = time.time() - 1
+        assert emails() == {'replica@example.com'}
+
+
+def test_mutation_starts_stickiness_window(database):
+    client = app.test_client()
+    before = time.time()
+    client.post('/login')
+
+    with client.session_transaction() as client_session:
+        assert client_session['_primary_until'] >= before + DATABASE_REPLICA_STICKY
@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+
+import pytest
+
+import gemini_client
+from gemini_client import GeminiClient
+from rate_limiter import RateLimitExceeded
+from resilience import CircuitBreaker
+
+
+@contextmanager
+def shed_slot(*args, **kwargs):
+    raise RateLimitExceeded("All AI workers are busy. Please try again shortly.")
+    yield
+
+
+def test_rate_limited_stream_gives_back_half_open_trial(monkeypatch):
+    # Open the breaker; with no recovery timeout the next call is the half-open trial
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0.0)
+    breaker.record_failure()
+    monkeypatch.setattr(gemini_client.resilient_caller, "breaker", breaker)
+    monkeypatch.setattr(gemini_client.rate_limiter, "slot", shed_slot)
+
+    with pytest.raises(RateLimitExceeded):
+        list(GeminiClient().stream_structured("Plan for {symptom}", use_cache=False, symptom="knee pain"))
+
+    # The trial never reached the model, so the next call may still take it
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from sqlalchemy import insert
+
+from models import User, RecoveryPlan, DataVersion
+
+
+def test_insert_many_keeps_given_created_at(database):
+    user = User(email="history@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    database.session.add(user)
+    database.session.flush()
+
+    imported = datetime(2024, 3, 1, 9, 30)
+    imported_id, new_id = RecoveryPlan.insert_many([
+        {'user_id': user.id, 'title': "Imported", 'created_at': imported, 'recommendations': []},
+        {'user_id': user.id, 'title': "New", 'recommendations': []},
+    ])
+    database.session.commit()
+
+    assert database.session.get(RecoveryPlan, imported_id).created_at == imported
+    assert database.session.get(RecoveryPlan, new_id).created_at > imported
+
+
+def test_bump_creates_then_increments_versions(database):
+    user = User(email="versions@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    database.session.add(user)
+    database.session.commit()
+
+    DataVersion.bump(user.id, journal=True)
+    database.session.commit()
+    assert DataVersion.versions(user.id) == (1, 0, 0)
+
+    DataVersion.bump(user.id, journal=True, plans=True, profile=True)
+    database.session.commit()
+    database.session.expire_all()
+    assert DataVersion.versions(user.id) == (2, 1, 1)
+
+
+def test_bump_after_another_transaction_created_the_row(database):
+    user = User(email="race@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    database.session.add(user)
+    database.session.commit()
+
+    # A concurrent first write committed the row after this transaction last looked
+    assert DataVersion.versions(user.id) == (0, 0, 0)
+    with database.engine.begin() as connection:
+        connection.execute(insert(DataVersion), {'user_id': user.id, 'journal_version': 1, 'plan_version': 0})
+
+    DataVersion.bump(user.id, plans=True)
+    database.session.commit()
+    database.session.expire_all()
+    assert DataVersion.versions(user.id) == (1, 1, 0)
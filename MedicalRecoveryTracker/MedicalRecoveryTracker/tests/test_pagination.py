@@ -0,0 +1,54 @@
+import json
+import base64
+from datetime import date, datetime
+
+import pytest
+
+from app import app
+from models import User, MedicalJournal, RecoveryPlan
+from pagination import encode_cursor, decode_cursor
+
+
+def raw_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def test_cursor_round_trip():
+    day = date(2026, 3, 1)
+    assert decode_cursor(encode_cursor(day, 42), MedicalJournal.date_experienced) == (day, 42)
+
+    moment = datetime(2026, 3, 1, 9, 30, 15)
+    assert decode_cursor(encode_cursor(moment, 7), RecoveryPlan.created_at) == (moment, 7)
+
+
+@pytest.mark.parametrize('cursor', [
+    'WzEsMl0',  # [1, 2]
+    raw_cursor(['2026-03-01']),
+    raw_cursor(['2026-03-01', 1, 2]),
+    raw_cursor({'sort': '2026-03-01', 'id': 1}),
+    raw_cursor(['2026-03-01', '1']),
+    raw_cursor(['2026-03-01', True]),
+    raw_cursor(['yesterday', 1]),
+    raw_cursor(None),
+    'not base64!',
+    '',
+])
+def test_malformed_cursors_raise_value_error(cursor):
+    with pytest.raises(ValueError, match='Invalid page cursor'):
+        decode_cursor(cursor, MedicalJournal.date_experienced)
+
+
+def test_listing_with_malformed_cursor_is_a_client_error(database, monkeypatch):
+    user = User(email="cursor@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    database.session.add(user)
+    database.session.commit()
+
+    monkeypatch.setitem(app.config, 'WTF_CSRF_ENABLED', False)
+    client = app.test_client()
+    # Signing in also keeps the client's reads on the primary, where the user was written
+    client.post('/login', data={'email': user.email, 'password': 'password'})
+
+    # HTML listings fall back to the first page, the API rejects the cursor
+    assert client.get('/journal?cursor=WzEsMl0').status_code == 200
+    assert client.get('/api/journal?cursor=WzEsMl0').status_code == 400
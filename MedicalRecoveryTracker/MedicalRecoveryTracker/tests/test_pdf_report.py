@@ -0,0 +1,41 @@
+from datetime import date
+
+from models import MedicalJournal
+from pdf_report import (BOTTOM, JOURNAL_SYMPTOM_WIDTH, PDFStream, ReportLayout, text_width)
+
+
+class RecordingPDF(PDFStream):
+    """
+    PDFStream remembering every text it draws as (page, x, y, text)
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.texts = []
+
+    def text(self, x, y, text, *args, **kwargs):
+        self.texts.append((self.page_number, x, y, text))
+        return super().text(x, y, text, *args, **kwargs)
+
+
+def test_long_journal_rows_continue_across_pages():
+    pdf = RecordingPDF()
+    layout = ReportLayout(pdf, '2026-03-01')
+    layout.journal_heading()
+
+    words = [f'word{number}' for number in range(1500)]
+    entry = MedicalJournal(symptom='Sharp stabbing pain radiating from the lower back down the left leg ' * 2,
+                           severity=7, date_experienced=date(2026, 3, 1), description=' '.join(words))
+    layout.journal_entry(entry, first=True)
+
+    cells = [(page, x, y, text) for page, x, y, text in pdf.texts if x in (50, 140) and y >= 30]
+    assert len({page for page, *_ in cells}) > 1
+    assert all(y <= BOTTOM for _, _, y, _ in cells)
+
+    # Every word is printed, and the symptom stays inside its column
+    assert ' '.join(text for _, x, _, text in cells if x == 140).split() == words
+    assert all(text_width(text, 9) <= JOURNAL_SYMPTOM_WIDTH for _, x, _, text in cells if x == 50)
+
+    # Each continuation page repeats the column headings
+    for page in range(2, pdf.page_number + 1):
+        assert (page, 140, 20, 'Description') in pdf.texts
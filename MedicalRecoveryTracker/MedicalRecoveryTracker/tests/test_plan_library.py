@@ -0,0 +1,27 @@
+from datetime import date
+
+from models import MedicalJournal
+from plan_library import normalize, plan_features, find_template, record_plan
+
+
+def entry(symptom, severity=5):
+    return MedicalJournal(user_id=1, symptom=symptom, severity=severity, date_experienced=date(2026, 1, 1))
+
+
+def test_normalize_keeps_letters_of_any_script():
+    assert normalize("頭痛") == "頭痛"
+    assert normalize("Douleur à l'épaule") == "douleur à l épaule"
+    assert normalize("  Knee_pain!! ") == "knee pain"
+
+
+def test_unrelated_non_latin_symptoms_have_distinct_features():
+    assert plan_features([entry("頭痛")]) != plan_features([entry("腹痛")])
+
+
+def test_request_without_features_skips_the_library(database):
+    # Only punctuation is left of this symptom, so there is nothing to match on
+    entries = [entry("???")]
+    assert plan_features(entries) == frozenset()
+
+    assert find_template('general', entries) is None
+    record_plan('general', entries, {'title': "Plan", 'description': "", 'recommendations': []}, plan_id=1)
@@ -0,0 +1,110 @@
+import os
+import json
+import uuid
+from datetime import date, datetime, timedelta
+
+from db_utils import assert_max_queries, capture_queries
+from models import User, MedicalJournal, RecoveryPlan, Report, DataVersion
+from report_builder import (REPORT_RETENTION_DAYS, _write_artifacts, artifact_path, build_report, content_key,
+                            prune_reports)
+
+# Plans with recommendations, journal entries and trends, whatever the number of plans
+REPORT_QUERY_LIMIT = 6
+
+
+def make_report(db, plan_count):
+    user = User(email=f"report-{plan_count}@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    db.session.add(user)
+    db.session.flush()
+
+    start = date(2026, 1, 1)
+    entries = [MedicalJournal(user_id=user.id, symptom="Knee pain", severity=3 + day % 5,
+                              date_experienced=start + timedelta(days=day)) for day in range(10)]
+    db.session.add_all(entries)
+
+    plan_ids = RecoveryPlan.insert_many([{
+        'user_id': user.id,
+        'title': f"Plan {number}",
+        'description': "Rest and rehabilitation",
+        'recommendations': [{'title': f"Step {step}", 'description': "Do it", 'priority': step}
+                            for step in range(1, 4)]
+    } for number in range(plan_count)])
+    db.session.flush()
+
+    report = Report(id=f"report{plan_count}", user_id=user.id, content_key=f"key{plan_count}",
+                    title="Medical Report", generated_date="2026-02-01",
+                    journal_ids=json.dumps([entry.id for entry in entries]),
+                    plan_ids=json.dumps(plan_ids))
+    db.session.add(report)
+    db.session.commit()
+
+    # Load what the builder receives outside the measured block
+    report = db.session.get(Report, report.id)
+    user = db.session.get(User, user.id)
+    user.email, report.title
+    return report, user
+
+
+def test_report_queries_do_not_grow_with_plans(database):
+    report, user = make_report(database, 5)
+    with capture_queries(database.engine) as few_plans:
+        _write_artifacts(report, user)
+
+    report, user = make_report(database, 50)
+    with assert_max_queries(database.engine, REPORT_QUERY_LIMIT) as many_plans:
+        _write_artifacts(report, user)
+
+    assert many_plans.count == few_plans.count
+
+
+def pending_report(db, user, journal_ids):
+    today = datetime.now().strftime('%Y-%m-%d')
+    report = Report(id=uuid.uuid4().hex, user_id=user.id, title="Medical Report", generated_date=today,
+                    content_key=content_key(user, journal_ids, [], "Medical Report", today),
+                    journal_ids=json.dumps(journal_ids), plan_ids='[]', status='pending')
+    db.session.add(report)
+    db.session.commit()
+    return report.id
+
+
+def add_entry(db, user):
+    entry = MedicalJournal(user_id=user.id, symptom="Knee pain", severity=4, date_experienced=date(2026, 1, 1))
+    db.session.add(entry)
+    DataVersion.bump(user.id, journal=True)
+    db.session.commit()
+    return entry.id
+
+
+def artifacts(report):
+    return [artifact_path(report.user_id, report.content_key, extension) for extension in ('pdf', 'json')]
+
+
+def test_superseded_and_expired_reports_are_pruned(database):
+    user = User(email="prune@example.com", first_name="Ada", last_name="Lovelace")
+    user.set_password("password")
+    database.session.add(user)
+    database.session.commit()
+
+    old_id = pending_report(database, user, [add_entry(database, user)])
+    build_report(old_id)
+    old_files = artifacts(database.session.get(Report, old_id))
+    assert all(os.path.exists(path) for path in old_files)
+
+    # New data supersedes the first report; building the next one removes it
+    new_id = pending_report(database, user, [add_entry(database, user)])
+    build_report(new_id)
+    database.session.expire_all()
+    assert database.session.get(Report, old_id) is None
+    assert not any(os.path.exists(path) for path in old_files)
+
+    current = database.session.get(Report, new_id)
+    assert current.status == 'completed'
+    assert prune_reports() == 0
+
+    current.created_at = datetime.utcnow() - timedelta(days=REPORT_RETENTION_DAYS + 1)
+    database.session.commit()
+    new_files = artifacts(current)
+    assert prune_reports() == 1
+    assert database.session.get(Report, new_id) is None
+    assert not any(os.path.exists(path) for path in new_files)
@@ -0,0 +1,14 @@
+from stream_parser import RecommendationStreamParser
+
+
+def test_raw_control_characters_in_strings_are_accepted():
+    parser = RecommendationStreamParser()
+    events = parser.feed('{"title": "Rest\nand ice", "description": "Day one:\tice')
+    events += parser.feed('", "recommendations": [{"title": "Ice\nit", "priority": 1}]}')
+
+    assert events == [
+        ('field', 'title', 'Rest\nand ice'),
+        ('field', 'description', 'Day one:\tice'),
+        ('recommendation', 0, {'title': 'Ice\nit', 'priority': 1}),
+    ]
+    assert parser.finished
@@ -3,65 +3,28 @@ import logging
 import json
 from datetime import datetime
 
-def create_pdf_report(user, journal_entries, recovery_plans):
+from pdf_report import render_report
+
+def create_pdf_report(user, journal_entries, recovery_plans, title='Medical Report', generated_date=None,
+                      symptom_trends=None):
     """
-    This function is a placeholder for server-side PDF generation, but since 
-    we're using client-side PDF generation with jsPDF in this application, 
-    this function is not actually used.
-    
-    PDF generation is handled by pdf_generator.js on the client side.
+    Render a medical report as a PDF, returning an iterator of byte chunks that
+    can be streamed straight into a response.
+
+    Pages are laid out and emitted one at a time by pdf_report, so journal_entries
+    can be a lazy query (e.g. using yield_per) and memory stays bounded however
+    long the report is. recovery_plans should be loaded with
+    selectinload(RecoveryPlan.recommendations) so walking plan.recommendations
+    does not issue a query per plan.
     """
+    # Log the report generation attempt
+    logging.info(f"PDF report generation requested for user {user.id}")
+
+    generated_date = generated_date or datetime.now().strftime('%Y-%m-%d')
+
     try:
-        # Log the report generation attempt
-        logging.info(f"PDF report generation requested for user {user.id}")
-        
-        # Prepare a response object
-        response = {
-            'user': {
-                'name': f"{user.first_name} {user.last_name}",
-                'email': user.email,
-                'age': user.age,
-                'gender': user.gender,
-                'weight': user.weight,
-                'height': user.height,
-                'bmi': user.calculate_bmi()
-            },
-            'journal_entries': [],
-            'recovery_plans': [],
-            'generated_on': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        }
-        
-        # Add journal entries
-        for entry in journal_entries:
-            response['journal_entries'].append({
-                'symptom': entry.symptom,
-                'description': entry.description,
-                'severity': entry.severity,
-                'date': entry.date_experienced.strftime('%Y-%m-%d')
-            })
-        
-        # Add recovery plans
-        for plan in recovery_plans:
-            plan_data = {
-                'title': plan.title,
-                'description': plan.description,
-                'type': plan.plan_type,
-                'recommendations': []
-            }
-            
-            # Add recommendations
-            for rec in plan.recommendations:
-                plan_data['recommendations'].append({
-                    'title': rec.title,
-                    'description': rec.description,
-                    'type': rec.recommendation_type,
-                    'priority': rec.priority
-                })
-            
-            response['recovery_plans'].append(plan_data)
-        
-        return response
-    
+        yield from render_report(title, user, journal_entries, recovery_plans, generated_date, symptom_trends)
     except Exception as e:
+        # Headers are already sent once streaming starts, so the error can only be logged
         logging.error(f"Error creating PDF report: {str(e)}")
-        return None
+        raise